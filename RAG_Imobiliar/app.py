@@ -2,14 +2,23 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import folium
+from folium.plugins import HeatMap
 from streamlit_folium import st_folium
 from datetime import datetime
 import json
+import os
+import time
 
 # import project modules (retrieval, pricing, LLM explanation)
-from retrieval import get_comparables
-from pricing_model import compute_fair_price, load_comparables, evaluate_property
-from explanation_module import generate_explanation_local
+from retrieval import get_comparables, RETRIEVAL_MODE, VALUATION_SOFT_FILTERS
+from pricing_model import estimate
+from explanation_module import stream_explanation_sync, DISCLAIMER
+from property_store import gather_properties
+import metrics
+from map_layers import MapLayerService, bbox_around, quantile_colors, viewport_from_folium
+from valuation_service import request_json
+from market_stats import load_market_stats
+from response_cache import get_response_cache
 
 # State variables for Streamlit (persist between reruns)
 # query_ran: used to detect if user pressed the button
@@ -35,6 +44,45 @@ def build_final_output(target_title, listed_price, target_sqm, comparables, esti
     }
     return output
 
+# Map layers: catalogue points + grid index are built once per server process,
+# viewport queries are cached per (rounded bbox, zoom)
+MAP_LAYERS = ["Comparabile", "Catalog (clustere)", "Cartiere (heatmap)"]
+
+@st.cache_resource
+def load_map_layers():
+    return MapLayerService.load()
+
+@st.cache_data(max_entries=256)
+def catalogue_markers(bbox, zoom):
+    return load_map_layers().viewport(bbox, zoom)
+
+@st.cache_data(max_entries=256)
+def catalogue_heat(bbox, zoom):
+    return load_map_layers().heat_points(bbox, zoom)
+
+# Precomputed market statistics (neighborhood x type x size band), loaded once;
+# None when the store was built before market_stats existed
+@st.cache_resource
+def load_market():
+    return load_market_stats()
+
+# Prometheus endpoint (/metrics), started once per server process if requested
+@st.cache_resource
+def start_metrics_server(port):
+    metrics.enable()
+    return metrics.start_http_server(port)
+
+if os.environ.get("RAG_METRICS_PORT"):
+    start_metrics_server(int(os.environ["RAG_METRICS_PORT"]))
+
+# Full responses (comparables + estimation) shared by all sessions and server
+# processes, keyed by the normalized inputs and the index version stamp
+response_cache = get_response_cache()
+
+# When set, retrieval + pricing run in a shared valuation_service.py process
+# (model and index loaded once there) and this app only renders the results
+VALUATION_SERVICE_URL = os.environ.get("VALUATION_SERVICE_URL")
+
 # UI LAYOUT
 st.set_page_config(layout="wide", page_title="RAG Imobiliar — Demo")
 st.title("RAG Imobiliar — Estimare pret corect (demo)")
@@ -61,6 +109,20 @@ with st.sidebar:
     # Button that triggers full pipeline (retrieval → pricing → explanation → map)
     run_button = st.button("Calculeaza preț corect")
 
+    st.markdown("---")
+    # Per-stage timings for the current request (this session only)
+    debug_panel = st.checkbox("Debug: timpi pe etape", value=False)
+
+# Market overview for the current filters: O(1) lookups, no retrieval needed
+market = load_market()
+if market is not None:
+    with st.expander("Piata: pret/mp pe clase de suprafata"):
+        overview = market.overview(neighborhood or None, property_type)
+        if overview.empty:
+            st.write("Nu exista anunturi pentru selectia curenta.")
+        else:
+            st.dataframe(overview)
+
 # Handle button click
 if run_button:
     # Save inputs in session state so page does not reset on rerun
@@ -94,8 +156,38 @@ if st.session_state["query_ran"]:
     # Show query for debugging / transparency
     st.info(f"Rulez: {query_text}")
 
+    # Collects the stage timings of this run: always with RAG_METRICS=1, otherwise only
+    # for the session that ticked the debug box (other sessions are not instrumented)
+    request_trace = metrics.trace("app.request", force=debug_panel, query=query_text).start()
+
+    # Same inputs on the same index -> same comparables and estimation
+    cache_inputs = {
+        "query": query_text,
+        "k": inp["k"],
+        "property_type": inp["property_type"],
+        "neighborhood": inp["neighborhood"],
+        "size_sqm": inp["size_input"],
+        "price_eur": inp["listed_price_input"],
+        "mode": RETRIEVAL_MODE,
+    }
+    cached = response_cache.get(cache_inputs)
+
     # Retrieves top-k comparables after vector search + ranking
-    comparables = get_comparables(query_text, k=inp["k"])
+    remote = None
+    with metrics.span("app.retrieval"):
+        if cached is not None:
+            comparables = cached["comparables"]
+        elif VALUATION_SERVICE_URL:
+            remote = request_json(VALUATION_SERVICE_URL, "/valuate", {
+                "query": query_text,
+                "k": inp["k"],
+                "size_sqm": inp["size_input"],
+                "price_eur": inp["listed_price_input"],
+            })
+            comparables = remote["comparables"]
+        else:
+            # The listed price is what we are checking, not a budget: rerank on it only
+            comparables = get_comparables(query_text, k=inp["k"], soft_filters=VALUATION_SOFT_FILTERS)
 
     # Show comparables table
     df_comps = pd.DataFrame(comparables)
@@ -119,11 +211,31 @@ if st.session_state["query_ran"]:
         })
 
     # Compute fair price estimation (weighted PPSQM)
-    estimation = compute_fair_price(
-        comps_for_pricing,
-        target_price=inp["listed_price_input"],
-        target_sqm=inp["size_input"]
-    )
+    with metrics.span("app.pricing"):
+        if cached is not None:
+            estimation = cached["estimation"]
+        elif remote is not None:
+            estimation = remote["estimation"]
+        else:
+            # Same rule as valuation_service / valuate_portfolio: baseline from the market
+            # statistics below MIN_COMPARABLES, otherwise the weighted PPSQM with the
+            # interval from the real price dispersion of the market cell
+            estimation = estimate(
+                comps_for_pricing, market,
+                property_type=inp["property_type"],
+                neighborhood=inp["neighborhood"] or None,
+                target_sqm=inp["size_input"],
+                target_price=inp["listed_price_input"],
+            )
+
+    if estimation is None:
+        # No comparables and no market statistics for this cell
+        st.warning("Nu exista comparabile sau statistici de piata pentru datele introduse.")
+        request_trace.stop()
+        st.stop()
+
+    if cached is None:
+        response_cache.set(cache_inputs, {"comparables": comparables, "estimation": estimation})
 
     # Pricing UI Section
     st.subheader("Estimare preț corect")
@@ -131,12 +243,17 @@ if st.session_state["query_ran"]:
     col1.metric("Preț corect (EUR)", f"{estimation['fair_price']:.0f}")
     col2.metric("Preț corect (€/mp)", f"{estimation['fair_ppsqm']:.0f}")
     col3.markdown(
-        f"**Interval ±5%:** {estimation['confidence_interval']['lower']:.0f} — {estimation['confidence_interval']['upper']:.0f}"
+        f"**Interval:** {estimation['confidence_interval']['lower']:.0f} — {estimation['confidence_interval']['upper']:.0f}"
     )
+    if estimation.get("market"):
+        st.caption(f"Estimare din statisticile pietei ({estimation['market']['count']} anunturi, "
+                   f"celula {estimation['market']['level']})")
     st.markdown(f"**Verdict:** `{estimation['verdict']}`")
+    if cached is not None:
+        st.caption("Rezultat din cache (aceleasi date, aceeasi versiune a indexului)")
 
     # EXPLANATION (LLM or rule-based)
-    explanation = generate_explanation_local({
+    explanation_input = {
         "estimation": {
             "fair_price": estimation['fair_price'],
             "fair_ppsqm": estimation['fair_ppsqm'],
@@ -147,58 +264,83 @@ if st.session_state["query_ran"]:
         "comparables_used": comps_for_pricing,
         "title": inp["title_input"],
         "listed_price_eur": inp["listed_price_input"]
-    })
+    }
 
+    # Tokens are shown as the LLM generates them; falls back to a rule-based
+    # text if the Ollama server is missing or too slow
     st.subheader("Explicație")
-    st.write(explanation["explanation_text"])
-    st.caption(explanation["disclaimer"])
+    with metrics.span("app.explanation"):
+        st.write_stream(stream_explanation_sync(explanation_input))
+    st.caption(DISCLAIMER)
 
     # MAP SECTION (Folium)
     st.subheader("Hartă")
+    map_layer = st.radio("Strat hartă", MAP_LAYERS, horizontal=True)
+
+    # Gather only the comparables' rows from the columnar store (no full CSV parse)
+    with metrics.span("app.properties_load"):
+        df_coords = gather_properties(
+            [c["id"] for c in comparables],
+            ["id", "lat", "lon", "price_eur", "price_per_sqm"]
+        )
+    map_start = time.perf_counter()
 
-    # Load the full dataset to extract coords of comparables
-    df_all = pd.read_csv("properties_clean.csv")
-    df_coords = df_all.set_index("id").loc[[c["id"] for c in comparables]].reset_index()
+    # Viewport after the last pan/zoom (st_folium keeps it under its key), so the
+    # catalogue layers only send the points inside it
+    bbox, zoom = viewport_from_folium(st.session_state.get("map_state"))
 
-    # Determine map center based on average coordinates of comparables
-    if not df_coords.empty:
+    if bbox is not None:
+        center_lat, center_lon = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    elif not df_coords.empty:
+        # Determine map center based on average coordinates of comparables
         center_lat = df_coords["lat"].mean()
         center_lon = df_coords["lon"].mean()
     else:
         # fallback: Bucharest center
         center_lat, center_lon = 44.4268, 26.1025
+    if zoom is None:
+        zoom = 13
+        bbox = tuple(round(float(x), 3) for x in bbox_around(center_lat, center_lon, zoom))
 
     # Create Folium map
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=13)
-
-    # Compute quantiles for price-per-sqm coloring
-    pps = df_coords["price_per_sqm"].fillna(0)
-    if not pps.empty:
-        q1 = pps.quantile(0.25)
-        q2 = pps.quantile(0.5)
-        q3 = pps.quantile(0.75)
-    else:
-        q1 = q2 = q3 = 0
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom)
 
-    # Function to color markers by price segment
-    def color_by_pps(v):
-        if v <= q1: return "green"
-        if v <= q2: return "lightgreen"
-        if v <= q3: return "orange"
-        return "red"
+    # Catalogue layers: server-side clusters / heat cells for the current viewport
+    if map_layer == MAP_LAYERS[1]:
+        markers = catalogue_markers(bbox, zoom)
+        for lat, lon, count, pp, color in zip(
+            markers["lat"].tolist(), markers["lon"].tolist(), markers["count"].tolist(),
+            markers["price_per_sqm"].tolist(), markers["color"].tolist()
+        ):
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=3 + 2 * np.log2(count),
+                color=color,
+                weight=1,
+                fill=True,
+                fill_opacity=0.5,
+                popup=f"{count} anunțuri — {int(pp)} €/mp (medie)"
+            ).add_to(m)
+    elif map_layer == MAP_LAYERS[2]:
+        HeatMap(catalogue_heat(bbox, zoom), radius=18, blur=15).add_to(m)
 
-    # Add markers to map
-    for _, r in df_coords.iterrows():
+    # Comparables, colored by price-per-sqm quartile (vectorized)
+    colors = quantile_colors(df_coords["price_per_sqm"].fillna(0))
+    for prop_id, lat, lon, price, pp, color in zip(
+        df_coords["id"].tolist(), df_coords["lat"].tolist(), df_coords["lon"].tolist(),
+        df_coords["price_eur"].tolist(), df_coords["price_per_sqm"].tolist(), colors
+    ):
         folium.CircleMarker(
-            location=[r["lat"], r["lon"]],
+            location=[lat, lon],
             radius=6,
-            color=color_by_pps(r["price_per_sqm"]),
+            color=color,
             fill=True,
             fill_opacity=0.8,
-            popup=f"ID:{int(r['id'])} {int(r['price_eur'])} EUR — {int(r['price_per_sqm'])} €/mp"
+            popup=f"ID:{int(prop_id)} {int(price)} EUR — {int(pp)} €/mp"
         ).add_to(m)
 
-    st_folium(m, width=800)
+    st_folium(m, width=800, key="map_state", returned_objects=["bounds", "zoom"])
+    metrics.observe("app.map", time.perf_counter() - map_start)
 
     # JSON export
     final_json = build_final_output(
@@ -221,6 +363,18 @@ if st.session_state["query_ran"]:
         mime="application/json"
     )
 
+    request_trace.stop()
+
+    # Debug panel: per-stage breakdown for this request
+    if debug_panel and request_trace.spans:
+        with st.expander("Debug: timpi pe etape", expanded=True):
+            st.caption(f"Total cerere: {request_trace.total_ms:.1f} ms")
+            st.dataframe(pd.DataFrame(request_trace.spans))
+            cache_stats = response_cache.stats()
+            st.caption(f"Cache raspunsuri: {cache_stats['size']} intrari, "
+                       f"hit rate {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, "
+                       f"{cache_stats['misses']} misses)")
+
 else:
     # Initial state before pressing the button
     st.info("Completeaza filtrele in sidebar si apasa 'Calculeaza preț corect'.")
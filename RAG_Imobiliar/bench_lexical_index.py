@@ -0,0 +1,107 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from bench_suite import build_queries
+from bench_utils import Timer, print_report
+from property_store import STORE_PATH, load_properties
+
+# REGASIRE DENSE / HYBRID / LEXICALA (lexical_index.py)
+#
+#   python bench_lexical_index.py --queries 500
+#
+# Pe indexul offline din bench_service (HashingEmbedder + BM25 peste acelasi
+# index_text): marimea si timpul de constructie al indexului BM25, latenta unei
+# cautari BM25 simple si, pentru fiecare mod din retrieval.py, ms/interogare si
+# cat din top-k respecta ce cere interogarea (camere, cartier, parcare). Jumatate
+# din interogari cer "cu parcare", care nu e filtru in where-clause: doar termenul
+# lexical il poate gasi.
+
+MODES = ("dense", "hybrid", "lexical")
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def build_cases(df, n_queries, seed=0):
+    """(interogare, camere, cartier, cere_parcare) pentru anunturi alese din catalog."""
+    queries = build_queries(df, n_queries, seed=seed)
+    rng = np.random.default_rng(seed)
+    sample = df.iloc[rng.choice(len(df), size=min(n_queries, len(df)), replace=False)]
+    cases = []
+    for i, (query, rooms, nb) in enumerate(zip(queries, sample["rooms"], sample["neighborhood"].astype(str))):
+        wants_parking = i % 2 == 0
+        if wants_parking:
+            query = query.replace(" buget", " cu parcare buget")
+        cases.append((query, rooms, nb, wants_parking))
+    return cases
+
+
+def match_rates(results, cases, df):
+    """Procentul din comparabile cu aceleasi camere / acelasi cartier / parcare (cand e ceruta)."""
+    by_id = df.set_index("id")
+    rooms_ok, nb_ok, parking_ok, parking_total, total = 0, 0, 0, 0, 0
+    for comparables, (_, rooms, nb, wants_parking) in zip(results, cases):
+        rows = by_id.loc[[c["id"] for c in comparables]]
+        total += len(rows)
+        rooms_ok += int((rows["rooms"] == rooms).sum())
+        nb_ok += int((rows["neighborhood"].astype(str) == nb).sum())
+        if wants_parking:
+            parking_total += len(rows)
+            parking_ok += int((rows["parking"].astype(str).str.lower() == "yes").sum())
+    return {
+        "rooms": rooms_ok / max(total, 1),
+        "neighborhood": nb_ok / max(total, 1),
+        "parking": parking_ok / max(parking_total, 1),
+    }
+
+
+def run_benchmark(n_queries=500, k=10, store_path=STORE_PATH):
+    import retrieval
+    from bench_service import build_offline_context
+    from lexical_index import LEXICAL_DIR
+
+    df = load_properties(path=store_path)
+    cases = build_cases(df, n_queries)
+    queries = [case[0] for case in cases]
+
+    with tempfile.TemporaryDirectory(prefix="bench_lexical_") as workdir:
+        with Timer() as t_build:
+            context = build_offline_context(workdir, store_path)
+        lexical = context.lexical_index
+
+        with Timer() as t_search:
+            for q in queries:
+                lexical.search(q, k)
+
+        results = {
+            "n_docs": len(lexical),
+            "n_terms": len(lexical.terms),
+            "n_postings": len(lexical.docs),
+            "disk_bytes": directory_size(os.path.join(workdir, LEXICAL_DIR)),
+            "offline_build_s": t_build.elapsed,
+            "bm25_search_us_per_query": t_search.elapsed / len(queries) * 1e6,
+        }
+        for mode in MODES:
+            # Prima trecere umple cache-urile (filtre, embedding-uri), a doua e masurata
+            retrieval.get_comparables_many(queries, k=k, context=context, verbose=False, mode=mode)
+            with Timer() as t_mode:
+                ranked = retrieval.get_comparables_many(queries, k=k, context=context, verbose=False, mode=mode)
+            results[mode] = {
+                "ms_per_query": t_mode.elapsed / len(queries) * 1000,
+                "match_rate": match_rates(ranked, cases, df),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pentru regasirea hybrid / lexicala (BM25)")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print_report("Index lexical (BM25)", run_benchmark(args.queries, args.k, args.store))
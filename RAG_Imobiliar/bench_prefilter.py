@@ -0,0 +1,104 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import Timer, print_report
+from property_store import load_properties
+import retrieval
+
+# Compara cautarea cu pre-filtrare (where-clause Chroma) cu varianta veche
+# (top-50 fara filtre + reranking) pe setul de 2000 de anunturi inclus in repo.
+# Recall@k: cate din top-k "adevarate" (cele mai bune dupa final_score dintre
+# anunturile care respecta filtrele extrase) apar in rezultat.
+
+TYPE_WORDS = {"apartment": "apartament", "house": "casa", "land": "teren"}
+
+# Filtrele care definesc un "match adevarat"; bugetul ramane criteriu soft
+HARD_FILTERS = ["property_type", "neighborhood", "rooms"]
+
+
+def build_queries(df, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = df.iloc[rng.choice(len(df), size=min(n_queries, len(df)), replace=False)]
+    queries = []
+    for _, row in sample.iterrows():
+        parts = [TYPE_WORDS[str(row["property_type"])]]
+        if pd.notna(row["rooms"]):
+            parts.append(f"{int(row['rooms'])} camere")
+        parts.append(str(row["neighborhood"]).lower())
+        parts.append(f"buget {int(row['price_eur'])} euro")
+        queries.append(" ".join(parts))
+    return queries
+
+
+def matches(metadata, filters):
+    for key in HARD_FILTERS:
+        if key not in filters:
+            continue
+        value = metadata.get(key)
+        if key == "neighborhood":
+            if str(value).lower() != filters[key].lower():
+                return False
+        elif value != filters[key]:
+            return False
+    return True
+
+
+def ground_truth(context, all_ids, all_embs, all_meta, query, k):
+    filters = retrieval.extract_filters(query)
+    keep = [i for i, m in enumerate(all_meta) if matches(m, filters)]
+    if not keep:
+        return set()
+    q_emb = context.encode_queries([query])
+    ranked = retrieval.rerank_batch(
+        q_emb, all_ids[keep][None, :], all_embs[keep][None, :, :], [filters],
+        k=k, table=context.rerank_table
+    )[0]
+    return {x["id"] for x in ranked}
+
+
+def run_benchmark(n_queries=200, k=10):
+    context = retrieval.get_context()
+    everything = context.collection.get(include=["embeddings", "metadatas"])
+    all_ids = np.asarray(everything["ids"], dtype=np.int64)
+    all_embs = np.asarray(everything["embeddings"], dtype=np.float32)
+    all_meta = everything["metadatas"]
+
+    queries = build_queries(load_properties(["property_type", "neighborhood", "rooms", "price_eur"]), n_queries)
+    truth = [ground_truth(context, all_ids, all_embs, all_meta, q, k) for q in queries]
+
+    # Incalzim cache-ul de embedding-uri, ca sa masuram doar cautarea
+    context.encode_queries(queries)
+
+    results = {}
+    for name, prefilter in [("post_filter", False), ("pre_filter", True)]:
+        latencies = []
+        recalls = []
+        for query, gt in zip(queries, truth):
+            with Timer() as t:
+                res = retrieval.get_comparables(query, k=k, prefilter=prefilter)
+            latencies.append(t.elapsed * 1000)
+            if gt:
+                recalls.append(len({x["id"] for x in res} & gt) / len(gt))
+
+        latencies = np.array(latencies)
+        results[name] = {
+            "recall_at_k": float(np.mean(recalls)) if recalls else None,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+            "latency_ms_mean": float(latencies.mean()),
+        }
+
+    results["n_queries"] = len(queries)
+    results["k"] = k
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall si latenta: pre-filtrare vs post-filtrare")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print_report("Pre-filter vs post-filter", run_benchmark(args.queries, args.k))
@@ -0,0 +1,100 @@
+import argparse
+import filecmp
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from bench_utils import Timer, make_synthetic_raw, peak_rss_mb, print_report
+import data_preprocessing
+
+# Compara pipeline-ul pe chunk-uri din data_preprocessing.py cu varianta
+# veche (tot fisierul in memorie + apply pe randuri): randuri/s si memorie maxima
+
+
+def legacy_preprocess(input_path, output_path):
+    # Copie a scriptului vechi, pastrata doar ca referinta pentru benchmark
+    df = pd.read_csv(input_path)
+    df = df.drop_duplicates(subset=["id"])
+    df = df.dropna(subset=data_preprocessing.essential_cols)
+    for col in data_preprocessing.num_cols:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df[(df["price_eur"] > 5000) & (df["price_eur"] < 2_000_000)]
+    df = df[(df["size_sqm"] > 10) & (df["size_sqm"] < 2000)]
+    df["price_per_sqm"] = df["price_eur"] / df["size_sqm"]
+    df["age"] = data_preprocessing.current_year - df["year_built"]
+    df["is_new_build"] = df["year_built"].apply(lambda y: 1 if y and y >= 2015 else 0)
+    df["distance_score"] = (
+        (20 - df["dist_to_metro_min"].clip(0, 20)) * 0.6 +
+        (15 - df["dist_to_park_min"].clip(0, 15)) * 0.4
+    )
+    df["text_for_embedding"] = df.apply(
+        lambda row: (
+            f"{row['property_type']} in {row['neighborhood']}, "
+            f"{row['city']}, {row['size_sqm']} mp, "
+            f"{row['rooms']} camere, construit in {row['year_built']}. "
+            f"Detalii: {row['description']}"
+        ),
+        axis=1
+    )
+    df.to_csv(output_path, index=False)
+    return len(df)
+
+
+def run_one(variant, input_path, output_path, chunksize):
+    n_raw = sum(len(c) for c in pd.read_csv(input_path, usecols=["id"], chunksize=500_000))
+    with Timer() as t:
+        if variant == "legacy":
+            n_out = legacy_preprocess(input_path, output_path)
+        else:
+            n_out = data_preprocessing.preprocess(
+                input_path, output_path, chunksize=chunksize,
+                store_path=output_path + ".store"
+            )
+    return {
+        "rows_in": n_raw,
+        "rows_out": n_out,
+        "seconds": t.elapsed,
+        "rows_per_s": n_raw / t.elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_in_subprocess(variant, input_path, output_path, chunksize):
+    # Proces separat pentru fiecare varianta, ca memoria maxima sa fie masurata curat
+    code = (
+        "import json, bench_preprocessing as b; "
+        f"print(json.dumps(b.run_one({variant!r}, {input_path!r}, {output_path!r}, {chunksize})))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(n_rows=200_000, chunksize=data_preprocessing.CHUNK_SIZE, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="bench_pp_")
+    raw_path = os.path.join(workdir, "raw.csv")
+    make_synthetic_raw(n_rows, raw_path)
+
+    legacy_out = os.path.join(workdir, "clean_legacy.csv")
+    chunked_out = os.path.join(workdir, "clean_chunked.csv")
+
+    results = {
+        "legacy": run_in_subprocess("legacy", raw_path, legacy_out, chunksize),
+        "chunked": run_in_subprocess("chunked", raw_path, chunked_out, chunksize),
+    }
+
+    results["identical_output"] = filecmp.cmp(legacy_out, chunked_out, shallow=False)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark data_preprocessing.py")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunksize", type=int, default=data_preprocessing.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print_report(f"Preprocessing, {args.rows} randuri", run_benchmark(args.rows, args.chunksize))
@@ -0,0 +1,82 @@
+import argparse
+
+import numpy as np
+
+from bench_utils import Timer, print_report
+import pricing_model
+
+# Throughput pentru compute_fair_price_batch fata de apeluri repetate
+# compute_fair_price, pe date sintetice, plus verificarea ca rezultatele coincid
+# (acelasi verdict; sumele pot diferi cu o unitate de rotunjire, 0.01)
+
+TOLERANCE = 0.01 + 1e-9
+
+
+def _values(estimation):
+    interval = estimation["confidence_interval"]
+    return [estimation["fair_price"], estimation["fair_ppsqm"], interval["lower"], interval["upper"],
+            estimation["target_sqm"]]
+
+
+def same_estimation(ref, est, tol=TOLERANCE):
+    """Acelasi verdict si aceleasi valori, pana la o unitate de rotunjire."""
+    return ref["verdict"] == est["verdict"] and np.allclose(_values(ref), _values(est), rtol=0, atol=tol)
+
+
+def make_targets(n_targets, k, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(0.1, 1.2, (n_targets, k))
+    ppsqm = rng.integers(500, 3000, (n_targets, k)).astype(np.float64)
+    sizes = rng.integers(30, 200, (n_targets, k)).astype(np.float64)
+    # Numar variabil de comparabile per tinta
+    counts = rng.integers(3, k + 1, n_targets)
+    mask = np.arange(k)[None, :] < counts[:, None]
+    target_sqm = np.where(rng.random(n_targets) < 0.2, np.nan, rng.integers(30, 150, n_targets))
+    target_price = np.where(rng.random(n_targets) < 0.1, np.nan, rng.integers(20_000, 300_000, n_targets))
+    return scores, ppsqm, sizes, mask, target_sqm, target_price
+
+
+def run_benchmark(n_targets=200_000, k=10, n_loop=20_000):
+    scores, ppsqm, sizes, mask, target_sqm, target_price = make_targets(n_targets, k)
+
+    with Timer() as t_batch:
+        batch = pricing_model.compute_fair_price_batch(
+            scores, ppsqm, target_sqm, target_price, sizes_sqm=sizes, mask=mask
+        )
+    estimations = pricing_model.batch_to_estimations(batch)
+
+    # Bucla veche, pe un esantion (e prea lenta pentru tot setul)
+    n_loop = min(n_loop, n_targets)
+    mismatches = 0
+    with Timer() as t_loop:
+        for t in range(n_loop):
+            comps = [
+                {"final_score": s, "price_per_sqm": p, "size_sqm": z}
+                for s, p, z in zip(scores[t, mask[t]], ppsqm[t, mask[t]], sizes[t, mask[t]])
+            ]
+            ref = pricing_model.compute_fair_price(
+                comps,
+                target_price=None if np.isnan(target_price[t]) else target_price[t],
+                target_sqm=None if np.isnan(target_sqm[t]) else target_sqm[t],
+            )
+            if not same_estimation(ref, estimations[t]):
+                mismatches += 1
+
+    return {
+        "n_targets": n_targets,
+        "k": k,
+        "batch_targets_per_s": n_targets / t_batch.elapsed,
+        "loop_targets_per_s": n_loop / t_loop.elapsed,
+        "speedup": (n_targets / t_batch.elapsed) / (n_loop / t_loop.elapsed),
+        "checked_against_loop": n_loop,
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pricing vectorizat")
+    parser.add_argument("--targets", type=int, default=200_000)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print_report("Batch pricing", run_benchmark(args.targets, args.k))
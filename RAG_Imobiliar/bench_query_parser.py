@@ -0,0 +1,172 @@
+import argparse
+import re
+
+import numpy as np
+
+from bench_utils import Timer, print_report
+from query_parser import QueryParser, get_parser
+
+# Throughput si acuratete pentru query_parser.QueryParser fata de vechiul
+# extract_filters (substring + regex), pe un corpus de interogari realiste generate
+# din vocabularul store-ului: cu/fara diacritice, sinonime de tip, suprafete
+# minime/maxime, bugete in mai multe formate (120.000, 120k, 1,2 mil).
+# Fiecare interogare vine cu filtrele asteptate, deci numaram si campurile corecte.
+
+TYPE_WORDS = {
+    "apartment": ["apartament", "Apartament", "ap", "apartment"],
+    "house": ["casa", "casă", "vila", "vilă"],
+    "land": ["teren", "terenuri"],
+}
+ROOM_FORMATS = ["{n} camere", "{n} cam", "cu {n} camere"]
+SIZE_FORMATS = {
+    "size_min": ["minim {v} mp", "peste {v} mp", "cel puțin {v} m2"],
+    "size_max": ["maxim {v} mp", "sub {v} mp"],
+}
+PRICE_FORMATS = ["buget {v} euro", "până la {v} euro", "max {v} eur", "{v} €"]
+LARGE_VOCABULARY = 10_000
+DIACRITICS = str.maketrans({"s": "ș", "t": "ț", "a": "ă", "i": "î"})
+
+
+def legacy_extract_filters(user_query):
+    """extract_filters de dinainte de query_parser (pentru comparatie)."""
+    q = user_query.lower()
+    filters = {}
+    if "apartament" in q:
+        filters["property_type"] = "apartment"
+    elif "casa" in q or "vila" in q or "vilă" in q:
+        filters["property_type"] = "house"
+    elif "teren" in q:
+        filters["property_type"] = "land"
+    m = re.search(r"(\d+)\s*cam", q)
+    if m:
+        filters["rooms"] = int(m.group(1))
+    m = re.search(r"(\d{2,6})\s*euro", q)
+    if m:
+        filters["price_max"] = int(m.group(1))
+    neighborhoods = ["titan", "militari", "dristor", "berceni", "aviatiei", "pipera", "drumul taberei"]
+    for nb in neighborhoods:
+        if nb in q:
+            filters["neighborhood"] = nb.title()
+    return filters
+
+
+def _format_price(value, rng):
+    style = rng.integers(4)
+    if style == 0:
+        return str(value)
+    if style == 1:
+        return f"{value:,}".replace(",", ".")
+    if style == 2 and value % 1000 == 0:
+        return f"{value // 1000}k"
+    return str(value)
+
+
+def make_corpus(n_queries, neighborhoods, seed=0):
+    """Lista de (interogare, filtre asteptate)."""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(n_queries):
+        ptype = rng.choice(list(TYPE_WORDS))
+        parts = [rng.choice(TYPE_WORDS[ptype])]
+        expected = {"property_type": ptype}
+
+        if ptype != "land" and rng.random() < 0.7:
+            rooms = int(rng.integers(1, 5))
+            parts.append(rng.choice(ROOM_FORMATS).format(n=rooms))
+            expected["rooms"] = rooms
+
+        if rng.random() < 0.8:
+            nb = str(rng.choice(neighborhoods))
+            # O parte din utilizatori scriu cu diacritice sau cu litere mici
+            written = nb.lower() if rng.random() < 0.5 else nb
+            if rng.random() < 0.2:
+                written = written.translate(DIACRITICS)
+            parts.append(("in " if rng.random() < 0.5 else "") + written)
+            expected["neighborhood"] = nb
+
+        if rng.random() < 0.5:
+            key = rng.choice(list(SIZE_FORMATS))
+            size = int(rng.integers(3, 30)) * 5 if ptype != "land" else int(rng.integers(2, 20)) * 100
+            parts.append(rng.choice(SIZE_FORMATS[key]).format(v=size))
+            expected[key] = size
+
+        if rng.random() < 0.8:
+            price = int(rng.integers(30, 1500)) * 1000
+            parts.append(rng.choice(PRICE_FORMATS).format(v=_format_price(price, rng)))
+            expected["price_max"] = price
+
+        corpus.append((", ".join(parts) if rng.random() < 0.3 else " ".join(parts), expected))
+    return corpus
+
+
+def field_accuracy(parse, corpus, fields=("property_type", "rooms", "neighborhood", "size_min",
+                                          "size_max", "price_max")):
+    """Procentul de interogari la care fiecare camp a iesit exact ca cel asteptat."""
+    correct = dict.fromkeys(fields, 0)
+    exact = 0
+    for query, expected in corpus:
+        got = parse(query)
+        ok = True
+        for field in fields:
+            hit = got.get(field) == expected.get(field)
+            correct[field] += hit
+            ok &= hit
+        exact += ok
+    result = {field: correct[field] / len(corpus) for field in fields}
+    result["all_fields"] = exact / len(corpus)
+    return result
+
+
+def run_benchmark(n_queries=20_000, repeats=3):
+    neighborhoods = get_parser().neighborhoods
+    corpus = make_corpus(n_queries, neighborhoods)
+    queries = [q for q, _ in corpus]
+
+    with Timer() as t_legacy:
+        for _ in range(repeats):
+            for q in queries:
+                legacy_extract_filters(q)
+
+    # Fara cache: parser nou, cache de marime 0
+    uncached = QueryParser(neighborhoods, cache_size=0)
+    with Timer() as t_parser:
+        for _ in range(repeats):
+            for q in queries:
+                uncached.parse(q)
+
+    # Costul nu depinde de marimea vocabularului (trie, nu scanare a listei)
+    large = QueryParser(neighborhoods + [f"Cartier {i}" for i in range(LARGE_VOCABULARY)], cache_size=0)
+    with Timer() as t_large:
+        for _ in range(repeats):
+            for q in queries:
+                large.parse(q)
+
+    # Cu cache: prima trecere umple cache-ul, urmatoarele il folosesc
+    cached = QueryParser(neighborhoods, cache_size=len(queries))
+    for q in queries:
+        cached.parse(q)
+    with Timer() as t_cached:
+        for _ in range(repeats):
+            for q in queries:
+                cached.parse(q)
+
+    n = n_queries * repeats
+    return {
+        "n_queries": n_queries,
+        "n_neighborhoods": len(neighborhoods),
+        "legacy_queries_per_s": n / t_legacy.elapsed,
+        "parser_queries_per_s": n / t_parser.elapsed,
+        f"parser_{LARGE_VOCABULARY}_neighborhoods_queries_per_s": n / t_large.elapsed,
+        "parser_cached_queries_per_s": n / t_cached.elapsed,
+        "legacy_accuracy": field_accuracy(legacy_extract_filters, corpus),
+        "parser_accuracy": field_accuracy(uncached.parse, corpus),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pentru parser-ul de interogari")
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print_report("Parser interogari", run_benchmark(args.queries, args.repeats))
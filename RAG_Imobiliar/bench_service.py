@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from bench_suite import _latency_stats, build_queries
+from bench_utils import HashingEmbedder, print_report
+from property_store import STORE_PATH, load_properties
+
+# TEST DE INCARCARE PENTRU valuation_service.py
+#
+#   python bench_service.py --url http://127.0.0.1:8080 --concurrency 32 --requests 2000
+#   python bench_service.py --offline --concurrency 64   # serviciul pornit in proces
+#
+# Fiecare din cei --concurrency clienti tine o conexiune keep-alive si trimite cererile
+# una dupa alta (jumatate /valuate, jumatate /comparables, construite din catalog ca
+# in bench_suite). La final: QPS, latente p50/p95/p99, codurile de raspuns si marimea
+# medie a micro-batch-urilor raportata de /health. Cu --offline indexul e construit
+# din property_store cu HashingEmbedder (fara model, fara retea), ca in bench_suite,
+# impreuna cu indexul BM25 (regasire hybrid).
+
+
+class Connection:
+    """Client HTTP/1.1 keep-alive minimal peste asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def build_payloads(n_requests, store_path=STORE_PATH, k=10, seed=0):
+    """(ruta, corp) pentru fiecare cerere: alternativ /valuate (cu suprafata si pret) si /comparables."""
+    df = load_properties(path=store_path)
+    queries = build_queries(df, n_requests, seed=seed)
+    sample = df.iloc[np.random.default_rng(seed + 1).integers(0, len(df), size=len(queries))]
+    payloads = []
+    for i, (query, sqm, price) in enumerate(zip(queries, sample["size_sqm"], sample["price_eur"])):
+        if i % 2 == 0:
+            payloads.append(("/valuate", {"query": query, "k": k,
+                                          "size_sqm": float(sqm), "price_eur": float(price)}))
+        else:
+            payloads.append(("/comparables", {"query": query, "k": k}))
+    # Mai putine interogari distincte decat cereri: le repetam
+    return [payloads[i % len(payloads)] for i in range(n_requests)]
+
+
+async def run_load(host, port, payloads, concurrency):
+    latencies, statuses = [], Counter()
+    next_request = iter(payloads)
+
+    async def client():
+        connection = Connection(host, port)
+        try:
+            for path, payload in next_request:
+                start = time.perf_counter()
+                try:
+                    status, _ = await connection.request("POST", path, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    status = "conn_error"
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] += 1
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    health_conn = Connection(host, port)
+    _, health = await health_conn.request("GET", "/health")
+    health_conn.close()
+    health = json.loads(health)
+
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "qps": len(latencies) / elapsed,
+        "latency_ms": _latency_stats(latencies),
+        "status": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "mean_batch_size": health["mean_batch_size"],
+        "batches": health["batches"],
+    }
+
+
+def build_offline_context(workdir, store_path=STORE_PATH):
+    """RetrievalContext peste un index (vectorial + BM25) construit din store cu HashingEmbedder."""
+    import build_embeddings
+    import retrieval
+    from lexical_index import LEXICAL_DIR, build_lexical_index
+    from rerank_features import load_rerank_table
+    from spatial_index import load_spatial_index
+    from vector_index import VectorIndex, VectorIndexWriter
+
+    embedder = HashingEmbedder()
+    df = load_properties(path=store_path)
+    texts = build_embeddings.build_index_texts(df)
+    index_path = os.path.join(workdir, "matrix_index")
+    writer = VectorIndexWriter(index_path)
+    writer.append(df["id"].to_numpy(), embedder.encode(texts), build_embeddings.build_metadata_batch(df))
+    writer.close(features=df.set_index("id"))
+
+    return retrieval.RetrievalContext(
+        embedder, VectorIndex(index_path),
+        rerank_table=load_rerank_table(index_path),
+        spatial_index=load_spatial_index(store_path),
+        lexical_index=build_lexical_index(df["id"].to_numpy(), texts, os.path.join(workdir, LEXICAL_DIR)),
+    )
+
+
+async def run_offline(payloads, concurrency, store_path=STORE_PATH, **options):
+    from valuation_service import ValuationService
+
+    with tempfile.TemporaryDirectory(prefix="bench_service_") as workdir:
+        context = build_offline_context(workdir, store_path)
+        service = await ValuationService(context=context, port=0, **options).start()
+        try:
+            return await run_load(service.host, service.port, payloads, concurrency)
+        finally:
+            await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de incarcare pentru serviciul de evaluare")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--offline", action="store_true",
+                        help="porneste serviciul in proces, pe un index construit cu HashingEmbedder")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-batch", type=int, default=None, help="doar cu --offline")
+    parser.add_argument("--batch-wait-ms", type=float, default=None, help="doar cu --offline")
+    parser.add_argument("--output", default=None, help="scrie rezultatele si intr-un fisier JSON")
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.requests, store_path=args.store, k=args.k)
+    if args.offline:
+        options = {key: value for key, value in (("max_batch", args.max_batch),
+                                                  ("batch_wait_ms", args.batch_wait_ms)) if value is not None}
+        results = asyncio.run(run_offline(payloads, args.concurrency, store_path=args.store, **options))
+    else:
+        host, _, port = args.url.split("://")[-1].rstrip("/").partition(":")
+        results = asyncio.run(run_load(host, int(port or 80), payloads, args.concurrency))
+
+    print_report("Serviciu de evaluare", results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+
+from bench_utils import print_report
+
+# Masoara costul de pornire al modulului retrieval, fiecare masuratoare
+# intr-un proces Python nou (ca importurile sa nu fie deja in cache)
+
+PROBE = """
+import json, time
+from bench_utils import peak_rss_mb
+
+t0 = time.perf_counter()
+import retrieval
+t1 = time.perf_counter()
+import_rss = peak_rss_mb()
+
+result = {"import_s": t1 - t0, "import_peak_rss_mb": import_rss}
+
+if LOAD_CONTEXT:
+    retrieval.get_context()
+    t2 = time.perf_counter()
+    result["import_plus_load_s"] = t2 - t0
+    result["import_plus_load_peak_rss_mb"] = peak_rss_mb()
+
+print(json.dumps(result))
+"""
+
+
+def run_probe(load_context):
+    code = f"LOAD_CONTEXT = {load_context}\n" + PROBE
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(repeats=3):
+    lazy = [run_probe(False) for _ in range(repeats)]
+    eager = [run_probe(True) for _ in range(repeats)]
+
+    return {
+        # Dupa schimbare: `import retrieval` nu mai incarca nimic greu
+        "lazy_import": {
+            "import_s": min(r["import_s"] for r in lazy),
+            "peak_rss_mb": max(r["import_peak_rss_mb"] or 0 for r in lazy),
+        },
+        # Inainte: importul facea si incarcarea modelului, Chroma si CSV-ul,
+        # echivalent cu import + get_context()
+        "eager_equivalent": {
+            "import_s": min(r["import_plus_load_s"] for r in eager),
+            "peak_rss_mb": max(r["import_plus_load_peak_rss_mb"] or 0 for r in eager),
+        },
+    }
+
+
+if __name__ == "__main__":
+    print_report("Startup retrieval.py", run_benchmark())
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_utils import HashingEmbedder, Timer, dir_size_mb, make_synthetic_raw, peak_rss_mb, print_report
+
+# SUITA DE BENCHMARK PENTRU PIPELINE-UL RAG
+#
+#   python bench_suite.py                                 # 2k, 100k si 1M anunturi
+#   python bench_suite.py --sizes 2000 100000 --output bench_results.json
+#
+# Pentru fiecare marime de catalog (intr-un proces separat, ca memoria maxima sa fie
+# masurata curat): catalog sintetic in stilul properties_raw.csv, preprocesare,
+# construirea indexului (text de indexare, embedding-uri, metadate, index vectorial
+# + tabel de reranking), marimea pe disc, latenta interogarilor, costul reranking-ului,
+# cautarile in indexul spatial si throughput-ul pricing-ului batch. Embedding-urile vin de la HashingEmbedder
+# (determinist, fara retea sau GPU), deci cifrele se pot compara intre commit-uri;
+# Chroma nu e implicata, cautarea merge prin vector_index.VectorIndex.
+
+DEFAULT_SIZES = [2_000, 100_000, 1_000_000]
+N_QUERIES = 300
+PRICING_TARGETS = 200_000
+BUILD_BATCH = 50_000
+
+TYPE_WORDS = {"apartment": "apartament", "house": "casa", "land": "teren"}
+
+
+def _latency_stats(latencies_ms):
+    latencies_ms = np.asarray(latencies_ms)
+    return {
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p95": float(np.percentile(latencies_ms, 95)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+        "mean": float(latencies_ms.mean()),
+        "max": float(latencies_ms.max()),
+    }
+
+
+def build_queries(df, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = df.iloc[rng.choice(len(df), size=min(n_queries, len(df)), replace=False)]
+    queries = []
+    for ptype, rooms, nb, price in zip(sample["property_type"].astype(str), sample["rooms"],
+                                       sample["neighborhood"].astype(str), sample["price_eur"]):
+        parts = [TYPE_WORDS.get(ptype, ptype)]
+        if rooms == rooms:
+            parts.append(f"{int(rooms)} camere")
+        parts.append(nb.lower())
+        parts.append(f"buget {int(price)} euro")
+        queries.append(" ".join(parts))
+    return queries
+
+
+def run_size(n_rows, workdir, n_queries=N_QUERIES, k=10, n_results=50):
+    """Toate etapele pentru un catalog de n_rows anunturi; intoarce un dict serializabil JSON."""
+    import build_embeddings
+    import data_preprocessing
+    import pricing_model
+    import retrieval
+    from bench_pricing import make_targets
+    from property_store import load_properties
+    from rerank_features import load_rerank_table
+    from spatial_index import load_spatial_index
+    from vector_index import VectorIndex, VectorIndexWriter
+
+    os.makedirs(workdir, exist_ok=True)
+    raw_path = os.path.join(workdir, "raw.csv")
+    clean_path = os.path.join(workdir, "clean.csv")
+    store_path = os.path.join(workdir, "property_store")
+    index_path = os.path.join(workdir, "matrix_index")
+    result = {"n_rows_raw": n_rows}
+
+    with Timer() as t:
+        make_synthetic_raw(n_rows, raw_path)
+    result["generate_s"] = t.elapsed
+
+    # Preprocesare
+    with Timer() as t:
+        n_clean = data_preprocessing.preprocess(raw_path, clean_path, store_path=store_path)
+    result["preprocessing"] = {
+        "rows_out": n_clean,
+        "seconds": t.elapsed,
+        "rows_per_s": n_rows / t.elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    # Construirea indexului, pe bucati (memoria nu creste cu marimea catalogului)
+    embedder = HashingEmbedder()
+    df = load_properties(path=store_path)
+    build = {"index_text_s": 0.0, "encode_s": 0.0, "metadata_s": 0.0, "index_write_s": 0.0}
+    writer = VectorIndexWriter(index_path)
+    for start in range(0, len(df), BUILD_BATCH):
+        part = df.iloc[start:start + BUILD_BATCH]
+        with Timer() as t:
+            texts = build_embeddings.build_index_texts(part)
+        build["index_text_s"] += t.elapsed
+        with Timer() as t:
+            embeddings = embedder.encode(texts, batch_size=64)
+        build["encode_s"] += t.elapsed
+        with Timer() as t:
+            metadatas = build_embeddings.build_metadata_batch(part)
+        build["metadata_s"] += t.elapsed
+        with Timer() as t:
+            writer.append(part["id"].to_numpy(), embeddings, metadatas)
+        build["index_write_s"] += t.elapsed
+    with Timer() as t:
+        writer.close(features=df.set_index("id"))
+    build["index_write_s"] += t.elapsed
+    build["total_s"] = sum(build.values())
+    build["peak_rss_mb"] = peak_rss_mb()
+    result["index_build"] = build
+    del texts, embeddings, metadatas
+
+    result["disk_mb"] = {
+        "raw_csv": dir_size_mb(raw_path),
+        "clean_csv": dir_size_mb(clean_path),
+        "property_store": dir_size_mb(store_path),
+        "vector_index": dir_size_mb(index_path),
+    }
+
+    # Interogari (o cerere pe rand, ca in app.py)
+    index = VectorIndex(index_path)
+    context = retrieval.RetrievalContext(embedder, index, rerank_table=load_rerank_table(index_path))
+    queries = build_queries(df, n_queries)
+    latencies = []
+    for query in queries:
+        with Timer() as t:
+            retrieval.get_comparables(query, k=k, context=context)
+        latencies.append(t.elapsed * 1000)
+    result["query_latency_ms"] = _latency_stats(latencies)
+    result["query_latency_ms"]["n_queries"] = len(queries)
+    result["query_latency_ms"]["ivf"] = bool(index.use_ivf)
+
+    # Reranking izolat: aceiasi candidati, doar rerank_batch
+    q_embs = embedder.encode(queries)
+    filters_list = [retrieval.extract_filters(q) for q in queries]
+    raw = index.query(query_embeddings=q_embs, n_results=n_results, include=["embeddings"])
+    cand_ids, cand_embs = retrieval._pad_query_results(raw, q_embs.shape[1])
+    with Timer() as t:
+        retrieval.rerank_batch(q_embs, cand_ids, cand_embs, filters_list, k=k, table=context.rerank_table)
+    result["rerank"] = {
+        "candidates_per_query": n_results,
+        "us_per_query": t.elapsed / len(queries) * 1e6,
+    }
+
+    # Index spatial: k-nearest si raza in jurul unor anunturi din catalog
+    spatial = load_spatial_index(store_path)
+    points = df[["lat", "lon"]].dropna().sample(min(n_queries, len(df)), random_state=0).to_numpy()
+    with Timer() as t_knn:
+        for lat, lon in points:
+            spatial.nearest(lat, lon, 50)
+    with Timer() as t_radius:
+        for lat, lon in points:
+            spatial.radius(lat, lon, 500)
+    result["spatial"] = {
+        "knn50_us": t_knn.elapsed / max(len(points), 1) * 1e6,
+        "radius500m_us": t_radius.elapsed / max(len(points), 1) * 1e6,
+    }
+
+    # Pricing batch
+    n_targets = min(PRICING_TARGETS, max(n_clean, 1))
+    scores, ppsqm, sizes, mask, target_sqm, target_price = make_targets(n_targets, k)
+    with Timer() as t:
+        pricing_model.compute_fair_price_batch(scores, ppsqm, target_sqm, target_price,
+                                               sizes_sqm=sizes, mask=mask)
+    result["pricing_batch"] = {"n_targets": n_targets, "targets_per_s": n_targets / t.elapsed}
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_in_subprocess(n_rows, workdir, n_queries):
+    code = (
+        "import json, bench_suite as b; "
+        f"print(json.dumps(b.run_size({n_rows}, {os.path.abspath(workdir)!r}, {n_queries})))"
+    )
+    # Procesul copil importa bench_suite din directorul proiectului, indiferent de unde
+    # rulam; stderr ramane la terminal, ca o eroare sa-si arate traceback-ul
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=DEFAULT_SIZES, n_queries=N_QUERIES, workdir=None, keep=False):
+    root = workdir or tempfile.mkdtemp(prefix="bench_suite_")
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "embedder": "HashingEmbedder(dim=384)",
+        "results": {},
+    }
+    try:
+        for n_rows in sizes:
+            print(f"Catalog de {n_rows} anunturi...", flush=True)
+            size_dir = os.path.join(root, str(n_rows))
+            report["results"][str(n_rows)] = run_in_subprocess(n_rows, size_dir, n_queries)
+            if not keep:
+                shutil.rmtree(size_dir, ignore_errors=True)
+    finally:
+        if not keep and workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark complet: preprocesare, indexare, cautare, pricing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--queries", type=int, default=N_QUERIES)
+    parser.add_argument("--output", default="bench_results.json", help="fisierul JSON cu rezultatele")
+    parser.add_argument("--workdir", default=None, help="director pentru datele generate (implicit temporar)")
+    parser.add_argument("--keep", action="store_true", help="pastreaza datele generate")
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.queries, args.workdir, args.keep)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report("Rezultate", report)
+    print(f"\nSalvat in {args.output}")
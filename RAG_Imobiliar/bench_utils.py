@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Utilitare comune pentru scripturile bench_*.py
+
+
+def peak_rss_mb():
+    """Memoria maxima (RSS) a procesului curent, in MB; None daca nu se poate masura."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux raporteaza in KB, macOS in bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+class Timer:
+    """Context manager simplu: `with Timer() as t: ...` apoi `t.elapsed` (secunde)."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def print_report(title, results):
+    print(f"\n{title}")
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+
+
+def dir_size_mb(path):
+    """Dimensiunea pe disc a unui director (sau fisier), in MB."""
+    if os.path.isfile(path):
+        return os.path.getsize(path) / (1024 * 1024)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / (1024 * 1024)
+
+
+# EMBEDDER OFFLINE
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Inlocuitor determinist pentru SentenceTransformer (aceeasi metoda encode), fara
+    model, retea sau GPU: fiecare cuvant e trimis prin crc32 intr-una din `dim`
+    coordonate, cu semn +/-, iar vectorul e normalizat. Textele cu cuvinte comune
+    ajung apropiate, deci regasirea si reranking-ul au ce masura.
+    """
+
+    def __init__(self, dim=384, max_vocab=1_000_000):
+        self.dim = dim
+        self.max_vocab = max_vocab
+        self._buckets = {}
+
+    def _bucket(self, token):
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            bucket = (h % self.dim, 1.0 if (h >> 31) else -1.0)
+            if len(self._buckets) >= self.max_vocab:
+                self._buckets.clear()
+            self._buckets[token] = bucket
+        return bucket
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+
+        rows, cols, signs = [], [], []
+        for i, text in enumerate(texts):
+            for token in _TOKEN_RE.findall(str(text).lower()):
+                col, sign = self._bucket(token)
+                rows.append(i)
+                cols.append(col)
+                signs.append(sign)
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(out, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)),
+                  np.asarray(signs, dtype=np.float32))
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+# CATALOG SINTETIC (aceleasi coloane ca properties_raw.csv)
+
+NEIGHBORHOODS = ["Titan", "Militari", "Dristor", "Berceni", "Aviatiei",
+                 "Pipera", "Drumul Taberei", "Colentina"]
+PROPERTY_TYPES = ["apartment", "house", "land"]
+
+
+def make_synthetic_raw(n_rows, path, seed=0, duplicate_rate=0.01, chunksize=200_000):
+    """Scrie un CSV sintetic cu n_rows anunturi, in stilul properties_raw.csv."""
+    rng = np.random.default_rng(seed)
+    header = True
+
+    for start in range(0, n_rows, chunksize):
+        n = min(chunksize, n_rows - start)
+        ids = np.arange(start + 1, start + n + 1)
+        # Cateva id-uri duplicate, ca deduplicarea sa aiba de lucru
+        dup = rng.random(n) < duplicate_rate
+        ids[dup] = rng.integers(1, start + n + 1, dup.sum())
+
+        ptype = rng.choice(PROPERTY_TYPES, n)
+        nb = rng.choice(NEIGHBORHOODS, n)
+        is_land = ptype == "land"
+        is_apartment = ptype == "apartment"
+        size = np.where(is_land, rng.integers(200, 1000, n), rng.integers(35, 160, n))
+        ppsqm = rng.normal(1500, 400, n).clip(500, 4000)
+        price = (size * ppsqm).astype(np.int64)
+        rooms = np.where(is_land, np.nan, rng.integers(1, 5, n).astype(float))
+        year = np.where(is_land, np.nan, rng.integers(1960, 2024, n).astype(float))
+        max_floor = np.where(is_apartment, 10.0, np.nan)
+        floor = np.where(is_apartment, rng.integers(0, 11, n).astype(float), np.nan)
+
+        chunk = pd.DataFrame({
+            "id": ids,
+            "title": [f"{t.title()} {int(r) if r == r else ''} camere {b}" for t, r, b in zip(ptype, rooms, nb)],
+            "property_type": ptype,
+            "price_eur": price,
+            "city": "Bucuresti",
+            "neighborhood": nb,
+            "lat": rng.uniform(44.40, 44.45, n),
+            "lon": rng.uniform(26.05, 26.20, n),
+            "size_sqm": size,
+            "rooms": rooms,
+            "year_built": year,
+            "floor": floor,
+            "max_floor": max_floor,
+            "parking": rng.choice(["yes", "no"], n),
+            "heating": np.where(is_land, None, rng.choice(["central", "district"], n)),
+            "dist_to_metro_min": rng.integers(3, 21, n),
+            "dist_to_park_min": rng.integers(2, 16, n),
+            "description": [f"Proprietate in zona {b}, suprafata {s} mp, pret {p} EUR."
+                            for b, s, p in zip(nb, size, price)],
+            "source_url": [f"https://example.com/listing/{i}" for i in ids],
+        })
+        chunk.to_csv(path, index=False, mode="w" if header else "a", header=header)
+        header = False
+
+    return path
@@ -0,0 +1,177 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from bench_utils import NEIGHBORHOODS, PROPERTY_TYPES, Timer, dir_size_mb, print_report
+from vector_index import VECTOR_INDEX_PATH, VectorIndex, VectorIndexWriter
+
+# Compara backend-urile de cautare vectoriala: Chroma, matricea exacta si IVF.
+# Interogarile sunt embedding-uri din catalog cu zgomot adaugat (nu e nevoie de model);
+# adevarul de referinta e cautarea exacta pe toata matricea (sau pe subsetul filtrat).
+#
+#   python bench_vector_index.py                      # indexul exportat de build_embeddings.py
+#   python bench_vector_index.py --synthetic 1000000  # catalog sintetic, fara vector store
+#   python bench_vector_index.py --synthetic 200000 --storage float16 int8
+#                                  # recall@k si marimea indexului cuantizat fata de float32
+
+
+def make_synthetic_index(n_rows, path, dim=384, n_clusters=200, seed=0, ivf_lists=None, storage="float32"):
+    """Index sintetic cu embedding-uri grupate (ca niste cartiere/tipuri) si metadate."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    writer = VectorIndexWriter(path, storage=storage)
+
+    batch = 50_000
+    for start in range(0, n_rows, batch):
+        n = min(batch, n_rows - start)
+        cluster = rng.integers(0, n_clusters, n)
+        embeddings = centers[cluster] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+        metadatas = [
+            {"property_type": PROPERTY_TYPES[c % len(PROPERTY_TYPES)],
+             "neighborhood": NEIGHBORHOODS[c % len(NEIGHBORHOODS)],
+             "price_eur": float(p)}
+            for c, p in zip(cluster.tolist(), rng.integers(30_000, 400_000, n).tolist())
+        ]
+        writer.append(np.arange(start + 1, start + n + 1), embeddings, metadatas)
+
+    writer.close(ivf_lists=int(np.sqrt(n_rows)) if ivf_lists is None else ivf_lists)
+    return path
+
+
+def make_queries(index, n_queries, noise=0.3, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(index.count(), size=min(n_queries, index.count()), replace=False)
+    queries = index.decode(np.sort(rows))
+    queries = queries + rng.normal(scale=noise / np.sqrt(index.dim), size=queries.shape).astype(np.float32)
+
+    # Jumatate din interogari au si filtre, luate din metadatele randului de pornire
+    wheres = []
+    for i, meta in enumerate(index.get(ids=index.ids[np.sort(rows)])["metadatas"]):
+        if i % 2 and "property_type" in meta and "neighborhood" in meta:
+            wheres.append({"$and": [{"property_type": meta["property_type"]},
+                                    {"neighborhood": meta["neighborhood"]}]})
+        else:
+            wheres.append(None)
+    return queries, wheres
+
+
+def exact_ids(index, query, where, n_results):
+    mask = index.where_mask(where)
+    rows = np.arange(index.count()) if mask is None else np.flatnonzero(mask)
+    scores = index.decode(rows) @ (query / np.linalg.norm(query))
+    top = rows[np.argsort(-scores, kind="stable")[:n_results]]
+    return set(index.ids[top].astype(str).tolist())
+
+
+def open_backends(index_path, nprobe, chroma=True):
+    backends = {"matrix": VectorIndex(index_path, use_ivf=False)}
+    if backends["matrix"].meta["ivf_lists"] > 0:
+        backends["ivf"] = VectorIndex(index_path, use_ivf=True, nprobe=nprobe)
+    if chroma:
+        try:
+            import retrieval
+            backends["chroma"] = retrieval.open_vector_backend("chroma")
+        except ImportError:
+            print("chromadb nu e instalat: sarim backend-ul Chroma")
+    return backends
+
+
+def run_benchmark(index_path=VECTOR_INDEX_PATH, n_queries=200, n_results=50, nprobe=8, chroma=True):
+    backends = open_backends(index_path, nprobe, chroma=chroma)
+    reference = backends["matrix"]
+    queries, wheres = make_queries(reference, n_queries)
+    truth = [exact_ids(reference, q, w, n_results) for q, w in zip(queries, wheres)]
+
+    results = {"n_rows": reference.count(), "n_queries": len(queries), "n_results": n_results}
+    for name, backend in backends.items():
+        for label, filtered in [("no_filter", False), ("filtered", True)]:
+            latencies = []
+            recalls = []
+            for query, where, gt in zip(queries, wheres, truth):
+                if (where is not None) != filtered:
+                    continue
+                args = {"where": where} if where is not None else {}
+                with Timer() as t:
+                    res = backend.query(query_embeddings=query[None, :], n_results=n_results,
+                                        include=["embeddings"], **args)
+                latencies.append(t.elapsed * 1000)
+                if gt:
+                    recalls.append(len(set(res["ids"][0]) & gt) / len(gt))
+
+            if not latencies:
+                continue
+            latencies = np.array(latencies)
+            results[f"{name}_{label}"] = {
+                "recall_at_k": float(np.mean(recalls)) if recalls else None,
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p99": float(np.percentile(latencies, 99)),
+            }
+    return results
+
+
+def run_storage_benchmark(n_rows, storages, workdir, n_queries=200, n_results=50, nprobe=8):
+    """
+    Acelasi catalog sintetic stocat float32 si in formatele cuantizate: marimea pe disc,
+    timpul de construire, latenta si recall@k (cautare exacta si IVF) fata de cautarea
+    exacta pe float32.
+    """
+    results = {"n_rows": n_rows, "n_results": n_results}
+    paths = {}
+    for storage in ["float32"] + [s for s in storages if s != "float32"]:
+        paths[storage] = os.path.join(workdir, storage)
+        with Timer() as t:
+            make_synthetic_index(n_rows, paths[storage], storage=storage)
+        results[storage] = {
+            "build_s": t.elapsed,
+            "embeddings_mb": dir_size_mb(os.path.join(paths[storage], "embeddings.bin")),
+            "disk_mb": dir_size_mb(paths[storage]),
+        }
+
+    reference = VectorIndex(paths["float32"], use_ivf=False)
+    queries, wheres = make_queries(reference, n_queries)
+    truth = [exact_ids(reference, q, w, n_results) for q, w in zip(queries, wheres)]
+
+    for storage, path in paths.items():
+        for mode, use_ivf in [("exact", False), ("ivf", True)]:
+            index = VectorIndex(path, use_ivf=use_ivf, nprobe=nprobe)
+            latencies, recalls = [], []
+            for query, where, gt in zip(queries, wheres, truth):
+                args = {"where": where} if where is not None else {}
+                with Timer() as t:
+                    res = index.query(query_embeddings=query[None, :], n_results=n_results, include=[], **args)
+                latencies.append(t.elapsed * 1000)
+                if gt:
+                    recalls.append(len(set(res["ids"][0]) & gt) / len(gt))
+            results[storage][mode] = {
+                "recall_at_k": float(np.mean(recalls)),
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p99": float(np.percentile(latencies, 99)),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latenta si recall@k pentru backend-urile de cautare vectoriala")
+    parser.add_argument("--synthetic", type=int, default=None,
+                        help="numar de randuri pentru un index sintetic (fara vector store)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=50, help="n_results per interogare")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--storage", nargs="+", choices=["float32", "float16", "int8"], default=None,
+                        help="compara formatele de stocare pe un index sintetic (implicit 200k randuri)")
+    args = parser.parse_args()
+
+    if args.storage:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run_storage_benchmark(args.synthetic or 200_000, args.storage, tmp, args.queries, args.k,
+                                           args.nprobe)
+    elif args.synthetic:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = make_synthetic_index(args.synthetic, os.path.join(tmp, "index"))
+            report = run_benchmark(path, args.queries, args.k, args.nprobe, chroma=False)
+    else:
+        report = run_benchmark(VECTOR_INDEX_PATH, args.queries, args.k, args.nprobe)
+
+    print_report("Backend-uri de cautare vectoriala", report)
@@ -1,92 +1,285 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-import chromadb
+import numpy as np
+import argparse
+import hashlib
+import json
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-# Load dataset curat
-df = pd.read_csv("properties_clean.csv")
-
-# Functie pentru textul de indexare
-
-def build_index_text(row):
-    return (
-        f"{row['property_type']} {row['rooms']} camere "
-        f"in {row['neighborhood']}, {row['city']}, "
-        f"{row['size_sqm']} mp, construit in {row['year_built']}, "
-        f"pret {row['price_eur']} euro. "
-        f"Etaj {row['floor']} din {row['max_floor']}. "
-        f"Parcare: {row['parking']}. "
-        f"Distanta metro {row['dist_to_metro_min']} min. "
-        f"Descriere: {row['description']}"
-    )
+from lexical_index import LEXICAL_DIR, build_lexical_index
+from property_store import load_properties
+from response_cache import bump_index_version
+from vector_index import STORAGE_FORMATS, VECTOR_INDEX_PATH, build_vector_index
 
-df["index_text"] = df.apply(build_index_text, axis=1)
+VECTOR_STORE_PATH = "vector_store"
+COLLECTION_NAME = "real_estate_properties"
+MANIFEST_PATH = os.path.join(VECTOR_STORE_PATH, "index_manifest.json")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+UPSERT_BATCH_SIZE = 1000
+# Randurile se encodeaza si se scriu in colectie pe bucati de ENCODE_CHUNK_SIZE
+ENCODE_CHUNK_SIZE = 10_000
 
-# Incarca modelul de embeddings
+# Functie pentru textul de indexare (pe coloane, fara apply pe randuri)
 
-print("Loading model...")
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+INDEX_TEXT_COLUMNS = ["property_type", "rooms", "neighborhood", "city", "size_sqm", "year_built",
+                      "price_eur", "floor", "max_floor", "parking", "dist_to_metro_min", "description"]
 
-# Creeaza directorul pentru vector store
+def build_index_texts(df):
+    return [
+        f"{ptype} {rooms} camere "
+        f"in {nb}, {city}, "
+        f"{size} mp, construit in {year}, "
+        f"pret {price} euro. "
+        f"Etaj {floor} din {max_floor}. "
+        f"Parcare: {parking}. "
+        f"Distanta metro {metro} min. "
+        f"Descriere: {desc}"
+        for ptype, rooms, nb, city, size, year, price, floor, max_floor, parking, metro, desc in zip(
+            *(df[col].tolist() for col in INDEX_TEXT_COLUMNS)
+        )
+    ]
 
-os.makedirs("vector_store", exist_ok=True)
+def build_metadata_batch(df):
+    """Metadatele Chroma pentru toate randurile din df (pe coloane, fara iterrows)."""
+    rooms = df["rooms"].to_numpy(dtype=np.float64, na_value=np.nan)
+    metadatas = [
+        {"property_type": ptype, "city": city, "neighborhood": nb, "price_eur": price, "size_sqm": size}
+        for ptype, city, nb, price, size in zip(
+            df["property_type"].astype(str).tolist(),
+            df["city"].astype(str).tolist(),
+            df["neighborhood"].astype(str).tolist(),
+            df["price_eur"].to_numpy(dtype=np.float64).tolist(),
+            df["size_sqm"].to_numpy(dtype=np.float64).tolist(),
+        )
+    ]
+    # rooms lipseste la terenuri; Chroma nu accepta None in metadate
+    for i in np.flatnonzero(~np.isnan(rooms)).tolist():
+        metadatas[i]["rooms"] = int(rooms[i])
+    return metadatas
 
-# Creeaza ChromaDB
+# Encodare pe mai multe procese
 
-print("Creating ChromaDB PersistentClient...")
+# Cu workers > 1, textele se trimit pe bucati unui pool de procese; fiecare proces
+# isi incarca propriul model, cu cpu_count / workers thread-uri torch (fara
+# suprasubscriere). Bucatile vin inapoi in ordine, cu cel mult 2 x workers in lucru,
+# deci memoria nu creste cu marimea catalogului.
 
-chroma_client = chromadb.PersistentClient(path="vector_store")
+_worker_model = None
 
-collection = chroma_client.get_or_create_collection(
-    name="real_estate_properties",
-    metadata={"hnsw:space": "cosine"}
-)
+def load_model(model_name=MODEL_NAME):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
 
-# Genereaza embeddings
+def _init_encoder(model_factory, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = model_factory()
 
-print("Generating embeddings...")
+def _encode_chunk(texts, batch_size):
+    return np.asarray(_worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False),
+                      dtype=np.float32)
 
-embeddings = model.encode(
-    df["index_text"].tolist(),
-    batch_size=64,
-    show_progress_bar=True
-)
+def iter_embeddings(texts, model=None, workers=1, model_factory=load_model,
+                    chunk_size=ENCODE_CHUNK_SIZE, batch_size=64):
+    """
+    Genereaza (start, embeddings float32) pentru texts, pe bucati de chunk_size, in ordine.
+    model: folosit direct cu workers=1; cu workers > 1 fiecare proces apeleaza model_factory
+    (functie picklable, ex: partial(load_model, nume)).
+    """
+    starts = range(0, len(texts), chunk_size)
+    if workers <= 1:
+        model = model if model is not None else model_factory()
+        for start in starts:
+            part = texts[start:start + chunk_size]
+            yield start, np.asarray(model.encode(part, batch_size=batch_size, show_progress_bar=False),
+                                    dtype=np.float32)
+        return
 
-# Adauga embedding-urile in vector store
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_encoder,
+                             initargs=(model_factory, threads)) as pool:
+        pending = deque()
+        for start in starts:
+            pending.append((start, pool.submit(_encode_chunk, texts[start:start + chunk_size], batch_size)))
+            if len(pending) >= 2 * workers:
+                done_start, future = pending.popleft()
+                yield done_start, future.result()
+        while pending:
+            done_start, future = pending.popleft()
+            yield done_start, future.result()
 
-collection.add(
-    ids=df["id"].astype(str).tolist(),
-    embeddings=embeddings.tolist(),
-    documents=df["index_text"].tolist(),
-    metadatas=[
-        {
-            "property_type": row["property_type"],
-            "city": row["city"],
-            "neighborhood": row["neighborhood"],
-            "price_eur": float(row["price_eur"]),
-            "size_sqm": float(row["size_sqm"]),
-        }
-        for _, row in df.iterrows()
-    ]
-)
+# Manifest: id -> hash al textului indexat, ca sa re-encodam doar ce s-a schimbat
+
+def row_hash(text, metadata):
+    # Include si metadatele, ca un filtru nou (ex: rooms) sa ajunga si in randurile vechi
+    payload = text + "\n" + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+# Indexare incrementala
+
+def index_properties(df, collection, model, manifest_path=MANIFEST_PATH, full=False, workers=1,
+                     model_factory=load_model):
+    """
+    Sincronizeaza colectia Chroma cu df (care are deja coloana index_text).
+
+    Doar randurile noi sau modificate sunt encodate si trimise cu upsert,
+    id-urile disparute din CSV sunt sterse. full=True ignora manifestul.
+    workers: procese pentru encodare (vezi iter_embeddings)
+    Intoarce un rezumat cu numarul de randuri added/updated/deleted/skipped.
+    """
+    ids = df["id"].astype(str).tolist()
+    # Hash-urile se calculeaza pe bucati, ca metadatele sa nu stea toate in memorie
+    hashes = []
+    for start in range(0, len(df), ENCODE_CHUNK_SIZE):
+        part = df.iloc[start:start + ENCODE_CHUNK_SIZE]
+        hashes.extend(row_hash(t, m) for t, m in zip(part["index_text"], build_metadata_batch(part)))
+
+    manifest = None if full else load_manifest(manifest_path)
+    if manifest is None:
+        # Fara manifest nu stim ce e deja in colectie: pornim de la id-urile existente
+        existing_ids = collection.get(include=[])["ids"]
+        manifest = {i: None for i in existing_ids}
+
+    current = dict(zip(ids, hashes))
+    added = [i for i in ids if i not in manifest]
+    updated = [i for i in ids if i in manifest and manifest[i] != current[i]]
+    deleted = [i for i in manifest if i not in current]
+    skipped = len(ids) - len(added) - len(updated)
+
+    to_encode = set(added) | set(updated)
+    changed_mask = df["id"].astype(str).isin(to_encode).to_numpy()
+    changed = df[changed_mask]
+
+    if len(changed):
+        print(f"Generating embeddings for {len(changed)} rows ({workers} process(es))...")
+        changed_ids = changed["id"].astype(str).tolist()
+        documents = changed["index_text"].tolist()
+
+        # Fiecare bucata encodata merge direct in colectie (array numpy, fara .tolist())
+        for chunk_start, embeddings in iter_embeddings(documents, model, workers=workers,
+                                                       model_factory=model_factory):
+            for offset in range(0, len(embeddings), UPSERT_BATCH_SIZE):
+                start = chunk_start + offset
+                end = start + min(UPSERT_BATCH_SIZE, len(embeddings) - offset)
+                collection.upsert(
+                    ids=changed_ids[start:end],
+                    embeddings=embeddings[offset:offset + UPSERT_BATCH_SIZE],
+                    documents=documents[start:end],
+                    metadatas=build_metadata_batch(changed.iloc[start:end])
+                )
+            print(f"  {chunk_start + len(embeddings)}/{len(changed)}")
+
+    for start in range(0, len(deleted), UPSERT_BATCH_SIZE):
+        collection.delete(ids=deleted[start:start + UPSERT_BATCH_SIZE])
+
+    save_manifest(current, manifest_path)
 
-print("Vector store construit cu succes in ./vector_store/")
-print("Total proprietati indexate:", len(df))
+    return {
+        "added": len(added),
+        "updated": len(updated),
+        "deleted": len(deleted),
+        "skipped": skipped,
+    }
 
-# Test rapid
+def open_collection(full=False):
+    import chromadb
 
-query = "apartament 2 camere titan 50 mp"
-print("\nTest query:", query)
+    # Creeaza directorul pentru vector store
+    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
 
-query_embedding = model.encode([query])
+    print("Creating ChromaDB PersistentClient...")
+    chroma_client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
 
-results = collection.query(
-    query_embeddings=query_embedding,
-    n_results=5
-)
+    if full:
+        # Rebuild complet: pornim de la o colectie goala
+        try:
+            chroma_client.delete_collection(COLLECTION_NAME)
+        except Exception:
+            pass
+
+    return chroma_client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        metadata={"hnsw:space": "cosine"}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construieste / actualizeaza vector store-ul")
+    parser.add_argument("--full", action="store_true",
+                        help="re-encodeaza tot catalogul in loc de actualizare incrementala")
+    parser.add_argument("--ivf-lists", type=int, default=None,
+                        help="numarul de liste IVF din indexul exportat (implicit automat, 0 = fara IVF)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="procese pentru encodare (ex: numarul de nuclee CPU)")
+    parser.add_argument("--storage", choices=STORAGE_FORMATS, default="float32",
+                        help="formatul embedding-urilor in indexul exportat (float16 / int8 = cuantizat)")
+    args = parser.parse_args()
+
+    # Load dataset curat
+    df = load_properties()
+    df["index_text"] = build_index_texts(df)
+
+    # Incarca modelul de embeddings (import in load_model, ca build_index_texts /
+    # build_metadata_batch sa poata fi folosite si fara sentence_transformers, ex: in bench_suite.py)
+    print("Loading model...")
+    model = load_model()
+
+    collection = open_collection(full=args.full)
+
+    summary = index_properties(df, collection, model, full=args.full, workers=args.workers)
+
+    print("Vector store actualizat in ./vector_store/")
+    print(f"Added: {summary['added']}, updated: {summary['updated']}, "
+          f"deleted: {summary['deleted']}, skipped: {summary['skipped']}")
+    print("Total proprietati indexate:", len(df))
+
+    # Exportam embedding-urile ca matrice memory-mapped (cautare fara Chroma),
+    # impreuna cu tabelul de features pentru reranking, aliniat cu ea
+    index = build_vector_index(collection, ivf_lists=args.ivf_lists, features=df.set_index("id"),
+                               storage=args.storage)
+    print(f"Index vectorial exportat in {VECTOR_INDEX_PATH} "
+          f"({index.count()} randuri, IVF: {index.meta['ivf_lists']} liste, {index.storage})")
+
+    # Index BM25 peste acelasi index_text (regasire hybrid / lexical, vezi retrieval.py)
+    lexical = build_lexical_index(df["id"].to_numpy(), df["index_text"].tolist(),
+                                  os.path.join(VECTOR_STORE_PATH, LEXICAL_DIR))
+    print(f"Index lexical exportat in {os.path.join(VECTOR_STORE_PATH, LEXICAL_DIR)} "
+          f"({len(lexical)} documente, {len(lexical.terms)} termeni)")
+
+    # Stampila noua: raspunsurile din cache-ul app.py (response_cache.py) calculate
+    # pe indexul vechi nu mai sunt folosite
+    print("Versiune index:", bump_index_version(VECTOR_STORE_PATH))
+
+    # Test rapid
+
+    query = "apartament 2 camere titan 50 mp"
+    print("\nTest query:", query)
+
+    query_embedding = model.encode([query])
+
+    results = collection.query(
+        query_embeddings=query_embedding,
+        n_results=5
+    )
 
-print("\nPrimele 5 rezultate:")
-for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
-    print("----")
-    print(doc)
-    print(meta)
+    print("\nPrimele 5 rezultate:")
+    for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
+        print("----")
+        print(doc)
+        print(meta)
@@ -1,62 +1,199 @@
 import pandas as pd
+import numpy as np
+import os
 
-# Load raw data
+from market_stats import STATS_DIR, MarketStats
+from property_store import STORE_PATH, PropertyStoreWriter
+from spatial_index import build_spatial_index
 
-df = pd.read_csv("properties_raw.csv")
+RAW_PATH = "properties_raw.csv"
+OUTPUT_PATH = "properties_clean.csv"
 
-# Basic cleanup
-
-# Remove duplicates by ID
-df = df.drop_duplicates(subset=["id"])
+# Fisierul brut se proceseaza pe bucati, ca memoria sa nu depinda de marimea feed-ului
+CHUNK_SIZE = 100_000
 
-# Remove rows with missing essential fields
 essential_cols = ["price_eur", "size_sqm", "property_type", "city", "neighborhood"]
-df = df.dropna(subset=essential_cols)
 
-# Convert numeric columns safely
 num_cols = ["price_eur", "size_sqm", "rooms", "year_built",
             "floor", "max_floor", "dist_to_metro_min", "dist_to_park_min"]
 
-for col in num_cols:
-    df[col] = pd.to_numeric(df[col], errors="coerce")
+current_year = 2025
+
+# Set compact de id-uri deja vazute (deduplicare intre chunk-uri)
+
+class SeenIds:
+    """
+    Array numpy sortat (int64, fara duplicate) pentru id-urile intregi; set Python
+    pentru orice altceva. Memoria depinde de numarul de id-uri, nu de valoarea lor
+    (merge si pentru id-uri hash pe 64 de biti).
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.other = set()
+
+    def _split(self, ids):
+        ids = np.asarray(ids)
+        if ids.dtype.kind == "i":
+            in_array = np.ones(len(ids), dtype=bool)
+        elif ids.dtype.kind == "u":
+            in_array = ids <= np.iinfo(np.int64).max
+        else:
+            in_array = np.zeros(len(ids), dtype=bool)
+        return ids, in_array
+
+    def contains(self, ids):
+        ids, in_array = self._split(ids)
+        result = np.zeros(len(ids), dtype=bool)
+
+        idx = ids[in_array].astype(np.int64)
+        pos = np.searchsorted(self.ids, idx)
+        hits = pos < len(self.ids)
+        hits[hits] = self.ids[pos[hits]] == idx[hits]
+        result[in_array] = hits
+
+        result[~in_array] = [i in self.other for i in ids[~in_array].tolist()]
+        return result
+
+    def add(self, ids):
+        ids, in_array = self._split(ids)
+        # Un merge per chunk (union1d sorteaza si elimina duplicatele)
+        self.ids = np.union1d(self.ids, ids[in_array].astype(np.int64))
+        self.other.update(ids[~in_array].tolist())
+
+# Tipurile coloanelor numerice
+
+def scan_integer_columns(input_path=RAW_PATH, chunksize=CHUNK_SIZE):
+    """
+    Citind tot fisierul deodata, pandas face o coloana int64 doar daca e intreaga
+    in tot fisierul. Pe chunk-uri, tipul poate varia, asa ca facem o trecere
+    rapida doar peste coloanele numerice ca sa stim ce coloane raman int.
+    """
+    is_int = {col: True for col in num_cols}
+    for chunk in pd.read_csv(input_path, usecols=num_cols, chunksize=chunksize):
+        for col in num_cols:
+            if chunk[col].dtype.kind not in "iu":
+                is_int[col] = False
+    return [col for col, flag in is_int.items() if flag]
+
+# Basic cleanup
+
+def clean_chunk(chunk, seen_ids, int_cols):
+    # Remove duplicates by ID (si fata de chunk-urile anterioare)
+    chunk = chunk.drop_duplicates(subset=["id"])
+    ids = chunk["id"].to_numpy()
+    first_seen = ~seen_ids.contains(ids)
+    seen_ids.add(ids)
+    chunk = chunk[first_seen]
 
-# Remove absurd values (basic sanity checks)
-df = df[(df["price_eur"] > 5000) & (df["price_eur"] < 2_000_000)]
-df = df[(df["size_sqm"] > 10) & (df["size_sqm"] < 2000)]
+    # Remove rows with missing essential fields
+    chunk = chunk.dropna(subset=essential_cols)
+
+    # Convert numeric columns safely
+    for col in num_cols:
+        chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+        if col not in int_cols:
+            chunk[col] = chunk[col].astype(np.float64)
+
+    # Remove absurd values (basic sanity checks)
+    chunk = chunk[(chunk["price_eur"] > 5000) & (chunk["price_eur"] < 2_000_000)]
+    chunk = chunk[(chunk["size_sqm"] > 10) & (chunk["size_sqm"] < 2000)]
+
+    return chunk
 
 # Derived features
 
-# Price per sqm
-df["price_per_sqm"] = df["price_eur"] / df["size_sqm"]
+def add_derived_features(chunk):
+    # Price per sqm
+    chunk["price_per_sqm"] = chunk["price_eur"] / chunk["size_sqm"]
 
-# Age of the property (if house/apartment)
-current_year = 2025
-df["age"] = current_year - df["year_built"]
-
-# Is new build (year >= 2015)
-df["is_new_build"] = df["year_built"].apply(lambda y: 1 if y and y >= 2015 else 0)
-
-# Distance score (simplified)
-# lower distance = higher score
-df["distance_score"] = (
-    (20 - df["dist_to_metro_min"].clip(0, 20)) * 0.6 +
-    (15 - df["dist_to_park_min"].clip(0, 15)) * 0.4
-)
-
-# Text document for embeddings
-
-def build_text_embedding(row):
-    return (
-        f"{row['property_type']} in {row['neighborhood']}, "
-        f"{row['city']}, {row['size_sqm']} mp, "
-        f"{row['rooms']} camere, construit in {row['year_built']}. "
-        f"Detalii: {row['description']}"
-    )
+    # Age of the property (if house/apartment)
+    chunk["age"] = current_year - chunk["year_built"]
 
-df["text_for_embedding"] = df.apply(build_text_embedding, axis=1)
+    # Is new build (year >= 2015); NaN compara fals, deci 0
+    chunk["is_new_build"] = (chunk["year_built"] >= 2015).astype(np.int64)
 
-output_path = "properties_clean.csv"
-df.to_csv(output_path, index=False)
+    # Distance score (simplified)
+    # lower distance = higher score
+    chunk["distance_score"] = (
+        (20 - chunk["dist_to_metro_min"].clip(0, 20)) * 0.6 +
+        (15 - chunk["dist_to_park_min"].clip(0, 15)) * 0.4
+    )
 
-print(f"Dataset curatat generat: {output_path}")
-print(f"Numar final de proprietati: {len(df)}")
+    # Text document for embeddings (acelasi format ca inainte, fara apply pe randuri)
+    chunk["text_for_embedding"] = [
+        f"{ptype} in {nb}, "
+        f"{city}, {size} mp, "
+        f"{rooms} camere, construit in {year}. "
+        f"Detalii: {desc}"
+        for ptype, nb, city, size, rooms, year, desc in zip(
+            chunk["property_type"].tolist(),
+            chunk["neighborhood"].tolist(),
+            chunk["city"].tolist(),
+            chunk["size_sqm"].tolist(),
+            chunk["rooms"].tolist(),
+            chunk["year_built"].tolist(),
+            chunk["description"].tolist(),
+        )
+    ]
+
+    return chunk
+
+# Pipeline
+
+def iter_clean_chunks(input_path=RAW_PATH, chunksize=CHUNK_SIZE):
+    """Generator de chunk-uri curatate, cu toate campurile derivate."""
+    int_cols = scan_integer_columns(input_path, chunksize)
+    seen_ids = SeenIds()
+
+    for chunk in pd.read_csv(input_path, chunksize=chunksize):
+        chunk = clean_chunk(chunk, seen_ids, int_cols)
+        yield add_derived_features(chunk)
+
+
+def preprocess(input_path=RAW_PATH, output_path=OUTPUT_PATH, chunksize=CHUNK_SIZE,
+               store_path=STORE_PATH):
+    """
+    Scrie datele curate chunk cu chunk in store-ul coloanar (store_path) si,
+    ca export, in CSV (output_path). Oricare poate fi None ca sa fie sarit.
+    Indexul spatial (lat/lon) se construieste la final, in store_path/spatial, iar
+    statisticile de piata se aduna chunk cu chunk si se scriu in store_path/market_stats.
+    Intoarce numarul de randuri pastrate.
+    """
+    tmp_path = output_path + ".tmp" if output_path else None
+    writer = PropertyStoreWriter(store_path) if store_path else None
+    market = MarketStats()
+    total = 0
+    header = True
+
+    for chunk in iter_clean_chunks(input_path, chunksize):
+        if tmp_path:
+            chunk.to_csv(tmp_path, index=False, mode="w" if header else "a", header=header)
+        if writer:
+            writer.append(chunk)
+            market.add(chunk)
+        header = False
+        total += len(chunk)
+
+    if header:
+        # Niciun rand in fisier: scriem doar antetul, cu tot cu coloanele derivate
+        empty = add_derived_features(pd.read_csv(input_path, nrows=0))
+        if tmp_path:
+            empty.to_csv(tmp_path, index=False)
+        if writer:
+            writer.append(empty)
+
+    if writer:
+        writer.close()
+        build_spatial_index(store_path)
+        market.save(os.path.join(store_path, STATS_DIR))
+    if tmp_path:
+        os.replace(tmp_path, output_path)
+    return total
+
+
+if __name__ == "__main__":
+    n_rows = preprocess(RAW_PATH, OUTPUT_PATH)
+
+    print(f"Dataset curatat generat: {STORE_PATH}/ (export CSV: {OUTPUT_PATH})")
+    print(f"Numar final de proprietati: {n_rows}")
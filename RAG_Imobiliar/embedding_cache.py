@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# CACHE PENTRU EMBEDDING-URILE INTEROGARILOR
+
+# Aceeasi interogare (ex: la fiecare rerun Streamlit) nu mai trece prin
+# transformer: cheia este textul normalizat, valoarea este vectorul calculat
+
+
+def normalize_query(text: str) -> str:
+    """Litere mici, fara diacritice, spatii comprimate."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+class EmbeddingCache:
+    """
+    Cache LRU thread-safe pentru embedding-uri de interogari.
+
+    maxsize: numarul maxim de interogari pastrate
+    path: fisier .npz optional; daca exista se incarca la creare, iar save()
+          scrie cache-ul acolo pentru urmatoarea pornire a procesului
+    """
+
+    def __init__(self, maxsize=10_000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._data)
+
+    def _put(self, key, vector):
+        self._data[key] = vector
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def encode(self, texts, encode_fn):
+        """
+        Intoarce un array (len(texts), d) cu embedding-urile textelor.
+        encode_fn(list_of_texts) este apelat o singura data, doar pentru
+        interogarile care lipsesc din cache (deduplicate).
+        """
+        keys = [normalize_query(t) for t in texts]
+
+        with self._lock:
+            found = {}
+            for key in keys:
+                vector = self._data.get(key)
+                if vector is not None:
+                    self._data.move_to_end(key)
+                    found[key] = vector
+            n_missing = sum(1 for k in keys if k not in found)
+            self.hits += len(keys) - n_missing
+            self.misses += n_missing
+            missing = list(dict.fromkeys(k for k in keys if k not in found))
+
+        if missing:
+            vectors = np.asarray(encode_fn(missing), dtype=np.float32)
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._put(key, vector)
+
+        return np.stack([found[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # PERSISTENTA
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._data.keys())
+            vectors = np.stack(list(self._data.values())) if keys else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), vectors=vectors)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with np.load(path, allow_pickle=False) as data:
+            keys = data["keys"].tolist()
+            vectors = data["vectors"]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector.astype(np.float32))
@@ -1,8 +1,31 @@
+import asyncio
+import hashlib
 import json
-import subprocess
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+from sqlite_cache import SQLiteCache
+
+# Serverul Ollama ruleaza separat (`ollama serve`) si tine modelul incarcat;
+# aici doar deschidem conexiuni HTTP keep-alive catre el, fara proces nou per cerere
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "mistral")
+DEFAULT_TIMEOUT = 30.0
+
+DISCLAIMER = "Proiect educațional; nu reprezintă consultanță imobiliară."
+
+# Cache-ul de explicatii (doar raspunsurile complete ale LLM-ului)
+EXPLANATION_CACHE_PATH = os.path.join("cache", "explanations.sqlite")
+EXPLANATION_CACHE_TTL = 7 * 24 * 3600
+EXPLANATION_CACHE_SIZE = 5000
 
-def generate_explanation_local(data):
-    """Genereaza explicatia verdictului folosind un LLM local prin Ollama."""
+
+def build_prompt(data):
+    """Construieste promptul pentru LLM din JSON-ul de pret (pasul 4)."""
 
     # Extractie date reale din JSON-ul generat la pasul 4
     est = data["estimation"]
@@ -24,7 +47,7 @@ def generate_explanation_local(data):
     ])
 
     # Prompt
-    prompt = f"""
+    return f"""
 Esti un asistent care explica evaluari imobiliare, fara sa inventezi informatii.
 Datele de mai jos provin dintr-un sistem RAG.
 
@@ -41,20 +64,379 @@ Scrie o explicatie concisa (maxim 5 propozitii) care justifica verdictul.
 Raspunsul trebuie sa fie in limba romana.
 """
 
-    #Rulare LLM local (Mistral/Ollama)
-    result = subprocess.run(
-        ["ollama", "run", "mistral"],
-        input=prompt.encode("utf-8"),
-        capture_output=True,
+
+def rule_based_explanation(data):
+    """Explicatie determinista, folosita cand LLM-ul lipseste sau raspunde prea greu."""
+    est = data["estimation"]
+    comparables = data["comparables_used"]
+    lower = est["confidence_interval"]["lower"]
+    upper = est["confidence_interval"]["upper"]
+    listed_price = data.get("listed_price_eur")
+
+    position = {
+        "UNDERPRICED": "sub intervalul estimat",
+        "OVERPRICED": "peste intervalul estimat",
+        "FAIR": "in intervalul estimat",
+    }.get(est["verdict"])
+
+    sentences = []
+    if listed_price is not None and position:
+        sentences.append(
+            f"Pretul listat de {listed_price} € este {position} "
+            f"de {lower:.0f}–{upper:.0f} €."
+        )
+    sentences.append(
+        f"Pretul corect estimat este {est['fair_price']:.0f} € "
+        f"({est['fair_ppsqm']:.0f} €/mp), calculat ca medie ponderata a pretului pe mp."
     )
 
-    explanation = result.stdout.decode("utf-8").strip()
+    if comparables:
+        ppsqm = [c["price_per_sqm"] for c in comparables]
+        neighborhoods = [c["neighborhood"] for c in comparables]
+        top_nb = max(sorted(set(neighborhoods)), key=neighborhoods.count)
+        sentences.append(
+            f"Estimarea foloseste {len(comparables)} comparabile, intre "
+            f"{min(ppsqm):.0f} si {max(ppsqm):.0f} €/mp, majoritatea din {top_nb}."
+        )
+
+    sentences.append(f"Verdict: {est['verdict']}.")
+    return " ".join(sentences)
+
+# CLIENT OLLAMA (HTTP streaming, asyncio)
+
+class OllamaError(Exception):
+    pass
+
+
+class OllamaClient:
+    """
+    Client async pentru /api/generate cu raspuns in streaming (NDJSON).
+    Conexiunile keep-alive sunt pastrate intre cereri si refolosite.
+
+    timeout: limita pe cerere (secunde), pentru tot raspunsul
+    """
+
+    def __init__(self, base_url=OLLAMA_HOST, model=OLLAMA_MODEL, timeout=DEFAULT_TIMEOUT):
+        url = urlparse(base_url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 11434
+        self.model = model
+        self.timeout = timeout
+        self._idle = []
+        self._loop = None
+
+    @staticmethod
+    async def _wait(awaitable, deadline):
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(awaitable, remaining)
+
+    async def _acquire(self, deadline):
+        # Conexiunile apartin unui event loop; la loop nou pornim de la zero
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._idle = []
+            self._loop = loop
+
+        if self._idle:
+            reader, writer = self._idle.pop()
+            return reader, writer, True
+
+        reader, writer = await self._wait(asyncio.open_connection(self.host, self.port), deadline)
+        return reader, writer, False
+
+    def _release(self, reader, writer):
+        self._idle.append((reader, writer))
+
+    async def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+    def _request_bytes(self, prompt):
+        body = json.dumps({
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+        }).encode("utf-8")
+        head = (
+            f"POST /api/generate HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+        return head + body
+
+    async def _send(self, prompt, deadline):
+        # Serverul poate inchide o conexiune keep-alive nefolosita; reincercam o data
+        for attempt in range(2):
+            reader, writer, reused = await self._acquire(deadline)
+            try:
+                writer.write(self._request_bytes(prompt))
+                await self._wait(writer.drain(), deadline)
+                status_line = await self._wait(reader.readline(), deadline)
+            except (ConnectionError, OSError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if not status_line and reused and attempt == 0:
+                writer.close()
+                continue
+            return reader, writer, status_line
+        raise OllamaError("Serverul Ollama a inchis conexiunea")
+
+    async def stream(self, prompt, timeout=None):
+        """Generator async cu fragmentele de text, pe masura ce sunt generate."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout is None else timeout)
+
+        reader, writer, status_line = await self._send(prompt, deadline)
+        clean = False
+        try:
+            parts = status_line.split()
+            status = int(parts[1]) if len(parts) > 1 else 0
+
+            headers = {}
+            while True:
+                line = await self._wait(reader.readline(), deadline)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if status != 200:
+                raise OllamaError(f"Ollama a raspuns cu HTTP {status}")
+
+            buffer = b""
+            async for data in self._body(reader, headers, deadline):
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        message = json.loads(line)
+                        if message.get("error"):
+                            raise OllamaError(message["error"])
+                        if message.get("response"):
+                            yield message["response"]
+            if buffer.strip():
+                message = json.loads(buffer)
+                if message.get("response"):
+                    yield message["response"]
+
+            clean = headers.get("connection", "").lower() != "close"
+        finally:
+            if clean:
+                self._release(reader, writer)
+            else:
+                writer.close()
+
+    async def _body(self, reader, headers, deadline):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self._wait(reader.readline(), deadline)
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await self._wait(reader.readline(), deadline)
+                    return
+                data = await self._wait(reader.readexactly(size + 2), deadline)
+                yield data[:-2]
+        elif "content-length" in headers:
+            yield await self._wait(reader.readexactly(int(headers["content-length"])), deadline)
+        else:
+            yield await self._wait(reader.read(), deadline)
+
+    async def generate(self, prompt, timeout=None):
+        return "".join([token async for token in self.stream(prompt, timeout=timeout)])
+
+# EXPLICATIE ASYNC, CU FALLBACK
+
+async def stream_explanation(data, client=None, timeout=DEFAULT_TIMEOUT, result=None):
+    """
+    Generator async de fragmente de explicatie. Daca LLM-ul lipseste, da eroare sau
+    depaseste timeout-ul inainte de primul fragment, se intoarce explicatia rule-based.
+    result: dict optional in care se scrie sursa ("llm" / "rule_based").
+    """
+    client = client or OllamaClient()
+    result = {} if result is None else result
+    got_tokens = False
+
+    try:
+        async for token in client.stream(build_prompt(data), timeout=timeout):
+            got_tokens = True
+            result["source"] = "llm"
+            yield token
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, OllamaError, ConnectionError, OSError, ValueError):
+        # Raspunsul partial (daca exista) ramane afisat, completat de explicatia rule-based
+        result["source"] = "rule_based"
+        result["truncated"] = got_tokens
+        yield ("...\n\n" if got_tokens else "") + rule_based_explanation(data)
+
+
+# CACHE DE EXPLICATII
+
+_explanation_cache = None
+_explanation_cache_lock = threading.Lock()
+
+# Generari in curs, pe (event loop, cheie): cererile identice simultane asteapta
+# rezultatul primei in loc sa porneasca alta generare
+_inflight = {}
+
+
+def get_explanation_cache():
+    global _explanation_cache
+    with _explanation_cache_lock:
+        if _explanation_cache is None:
+            _explanation_cache = SQLiteCache(
+                EXPLANATION_CACHE_PATH,
+                ttl=EXPLANATION_CACHE_TTL,
+                max_entries=EXPLANATION_CACHE_SIZE
+            )
+        return _explanation_cache
+
+
+def explanation_key(data, model=OLLAMA_MODEL):
+    """
+    Cheie content-addressed: SHA-256 peste model + promptul construit din date.
+    Promptul e forma canonica a intrarilor (aceleasi campuri, aceleasi formatari),
+    deci intrari identice dau aceeasi cheie.
+    """
+    payload = json.dumps({"model": model, "prompt": build_prompt(data)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def stream_explanation_cached(data, client=None, timeout=DEFAULT_TIMEOUT, result=None, cache=None):
+    """
+    Ca stream_explanation, dar raspunde din cache daca explicatia exista deja si
+    face single-flight pentru cererile identice aflate in curs.
+    result["source"] poate fi si "cache".
+    """
+    client = client or OllamaClient()
+    cache = cache or get_explanation_cache()
+    result = {} if result is None else result
+    key = explanation_key(data, client.model)
+
+    # Cache-ul e SQLite (I/O blocant): citirea si scrierea ruleaza in afara event loop-ului
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(None, cache.get, key)
+    if cached is not None:
+        result["source"] = "cache"
+        yield cached["explanation_text"]
+        return
+
+    flight_key = (id(loop), key)
+    leader = _inflight.get(flight_key)
+    if leader is not None:
+        shared = await asyncio.shield(leader)
+        if shared is not None:
+            result["source"] = shared["source"]
+            yield shared["text"]
+            return
+
+    future = loop.create_future()
+    _inflight[flight_key] = future
+    parts = []
+    complete = False
+    try:
+        async for token in stream_explanation(data, client=client, timeout=timeout, result=result):
+            parts.append(token)
+            yield token
+        complete = True
+    finally:
+        if _inflight.get(flight_key) is future:
+            del _inflight[flight_key]
+
+        text = "".join(parts).strip()
+        future.set_result({"text": text, "source": result.get("source")} if complete else None)
+
+    # Ajungem aici doar dupa o generare completa
+    if result.get("source") == "llm":
+        await loop.run_in_executor(None, cache.set, key, {"explanation_text": text, "model": client.model})
+
+
+async def generate_explanation_async(data, client=None, timeout=DEFAULT_TIMEOUT, on_token=None,
+                                     use_cache=True):
+    result = {}
+    parts = []
+    stream = stream_explanation_cached if use_cache else stream_explanation
+    async for token in stream(data, client=client, timeout=timeout, result=result):
+        parts.append(token)
+        if on_token is not None:
+            on_token(token)
 
     return {
-        "explanation_text": explanation,
-        "disclaimer": "Proiect educațional; nu reprezintă consultanță imobiliară."
+        "explanation_text": "".join(parts).strip(),
+        "disclaimer": DISCLAIMER,
+        "source": result.get("source", "rule_based"),
     }
 
+# PUNTE SINCRONA (Streamlit, scripturi)
+
+# Un singur event loop de fundal pe proces, ca acelasi OllamaClient (si conexiunile
+# lui keep-alive) sa fie refolosit intre rerun-urile Streamlit
+
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop, _client
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="explanation-loop", daemon=True).start()
+            _client = OllamaClient()
+        return _loop, _client
+
+
+def stream_explanation_sync(data, timeout=DEFAULT_TIMEOUT, result=None, use_cache=True):
+    """Generator sincron peste stream_explanation (ex: pentru st.write_stream)."""
+    loop, client = _background_loop()
+    tokens = queue.Queue()
+    done = object()
+    stream = stream_explanation_cached if use_cache else stream_explanation
+    result = {} if result is None else result
+    start = time.perf_counter()
+    first_token = True
+
+    async def pump():
+        try:
+            async for token in stream(data, client=client, timeout=timeout, result=result):
+                tokens.put(token)
+        finally:
+            tokens.put(done)
+
+    asyncio.run_coroutine_threadsafe(pump(), loop)
+    while True:
+        token = tokens.get()
+        if token is done:
+            if metrics.enabled():
+                metrics.observe("explanation.stream", time.perf_counter() - start)
+                metrics.incr(f"explanation.source.{result.get('source', 'rule_based')}")
+            return
+        if first_token and metrics.enabled():
+            metrics.observe("explanation.first_token", time.perf_counter() - start)
+        first_token = False
+        yield token
+
+
+@metrics.timed("explanation.generate")
+def generate_explanation_local(data, timeout=DEFAULT_TIMEOUT, use_cache=True):
+    """Genereaza explicatia verdictului folosind un LLM local prin Ollama."""
+    loop, client = _background_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        generate_explanation_async(data, client=client, timeout=timeout, use_cache=use_cache), loop
+    )
+    explanation = future.result()
+    metrics.incr(f"explanation.source.{explanation['source']}")
+    return explanation
+
 
 if __name__ == "__main__":
     # Testare locala
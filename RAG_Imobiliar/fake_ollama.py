@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import json
+
+# Server fals compatibil cu /api/generate din Ollama (streaming NDJSON, chunked,
+# keep-alive), pentru testarea explanation_module fara model real:
+#
+#   python fake_ollama.py --port 11435 --delay 0.05
+#   OLLAMA_HOST=http://127.0.0.1:11435 streamlit run app.py
+
+DEFAULT_TEXT = (
+    "Pretul listat este apropiat de media comparabilelor din aceeasi zona, "
+    "iar diferenta fata de pretul corect estimat se incadreaza in interval."
+)
+
+
+class FakeOllamaServer:
+    """
+    text: raspunsul trimis, cuvant cu cuvant
+    delay: pauza (secunde) intre fragmente, ca sa simulam un model lent
+    drop_after: dupa atatea fragmente serverul anunta un fragment pe care nu il mai
+                trimite intreg si inchide conexiunea (None = raspuns complet)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, text=DEFAULT_TEXT, delay=0.0, drop_after=None):
+        self.host = host
+        self.port = port
+        self.text = text
+        self.delay = delay
+        self.drop_after = drop_after
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+
+                if not request_line.startswith(b"POST /api/generate"):
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                    await writer.drain()
+                    continue
+
+                model = json.loads(body or b"{}").get("model", "fake")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/x-ndjson\r\n"
+                    b"Transfer-Encoding: chunked\r\n\r\n"
+                )
+                words = self.text.split(" ")
+                for i, word in enumerate(words):
+                    if i == self.drop_after:
+                        # Conexiune cazuta in mijlocul raspunsului
+                        writer.write(b"1f4\r\n" + b'{"response": "x' + b"\r\n")
+                        await writer.drain()
+                        return
+                    token = word if i == 0 else " " + word
+                    await self._send_chunk(writer, {"model": model, "response": token, "done": False})
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                await self._send_chunk(writer, {"model": model, "response": "", "done": True})
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send_chunk(writer, message):
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+
+
+async def main(host, port, delay, drop_after=None):
+    server = await FakeOllamaServer(host, port, delay=delay, drop_after=drop_after).start()
+    print(f"Fake Ollama pe {server.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server Ollama fals pentru teste locale")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--drop-after", type=int, default=None,
+                        help="inchide conexiunea dupa atatea fragmente (server cazut)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.host, args.port, args.delay, args.drop_after))
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from property_store import build_id_index, lookup_rows
+from query_parser import NUMBER_WORDS, PROPERTY_TYPE_WORDS, ROOM_UNITS, TOKEN_RE, fold, parse_number
+
+# INDEX LEXICAL (BM25) PESTE index_text
+
+# Index inversat in format CSR: pentru fiecare termen, randurile documentelor care il
+# contin (int32, crescator) si frecventa lui in document (uint8), concatenate, plus
+# offset-urile termenilor. Vocabularul e sortat, deci termenul se gaseste cu un dict
+# construit la incarcare. Scorul e BM25 clasic (K1, B).
+# Tokenizarea e aceeasi la indexare si la interogare: fara diacritice, sinonimele de
+# tip devin tipul din date ("apartament" -> "apartment"), "2 camere" / "2 cam" devine
+# un singur termen ("2camere"), iar numerele izolate (preturi, ani, etaje) si cuvintele
+# din sablonul index_text sunt ignorate. Un anunt fara parcare ("Parcare: no") nu
+# contine termenul "parcare".
+# build_embeddings.py scrie indexul in vector_store/lexical_index.
+
+LEXICAL_VERSION = 1
+LEXICAL_DIR = "lexical_index"
+K1 = 1.2
+B = 0.75
+BUILD_CHUNK = 50_000
+
+# Cuvinte de legatura si cuvintele care apar in fiecare index_text
+STOPWORDS = {
+    "in", "de", "din", "cu", "si", "la", "pe", "un", "o", "zona", "nan", "proprietate", "descriere",
+    "suprafata", "pret", "etaj", "distanta", "metro", "construit", "camere", "camera", "mp", "euro", "eur",
+    "min", "the", "and", "with", "fara",
+}
+NEGATIONS = {"no", "nu", "fara"}
+AFFIRMATIONS = {"yes", "da"}
+FLAG_WORDS = {"parcare"}
+TYPE_ALIASES = {fold(word): ptype for ptype, words in PROPERTY_TYPE_WORDS.items() for word in words}
+
+
+def tokenize(text):
+    """Termenii BM25 ai unui text (anunt sau interogare), in ordine."""
+    tokens = TOKEN_RE.findall(fold(text))
+    terms = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        prev = tokens[i - 1] if i > 0 else None
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+        i += 1
+        if token[0].isdigit() or token in NUMBER_WORDS:
+            if nxt in ROOM_UNITS:
+                value = NUMBER_WORDS.get(token) or parse_number(token)
+                if value == int(value):
+                    terms.append(f"{int(value)}camere")
+                i += 1
+            continue
+        if token in FLAG_WORDS:
+            # "Parcare: no" / "fara parcare" -> fara termen; "Parcare: yes" -> "parcare"
+            if nxt in NEGATIONS or prev in NEGATIONS:
+                i += nxt in NEGATIONS
+                continue
+            i += nxt in AFFIRMATIONS
+            terms.append(token)
+            continue
+        if token in TYPE_ALIASES:
+            terms.append(TYPE_ALIASES[token])
+        elif token not in STOPWORDS:
+            terms.append(token)
+    return terms
+
+
+class LexicalIndex:
+    """Index BM25 (CSR) peste textele anunturilor; randul i corespunde id-ului ids[i]."""
+
+    def __init__(self, ids, terms, offsets, docs, tfs, doc_len):
+        self.ids = ids
+        self.terms = terms
+        self.term_index = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.n_docs = len(ids)
+        self.avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+        doc_freq = np.diff(offsets)
+        self.idf = np.log(1 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        id_index = build_id_index(ids)
+        self.id_index_kind, self.id_index = id_index["kind"], id_index["array"]
+        # Partea din BM25 care depinde doar de lungimea documentului
+        self.norm = (K1 * (1 - B + B * doc_len / self.avgdl)).astype(np.float32) if self.n_docs else doc_len
+
+    def __len__(self):
+        return self.n_docs
+
+    @classmethod
+    def build(cls, ids, texts):
+        """Construieste indexul din textele date (pe bucati, cu vocabular comun)."""
+        vocab = {}
+        term_parts, doc_parts, tf_parts = [], [], []
+        doc_len = np.zeros(len(texts), dtype=np.uint16)
+        for start in range(0, len(texts), BUILD_CHUNK):
+            term_ids, doc_rows = [], []
+            for row, text in enumerate(texts[start:start + BUILD_CHUNK], start):
+                terms = tokenize(text)
+                doc_len[row] = min(len(terms), np.iinfo(np.uint16).max)
+                term_ids.extend(vocab.setdefault(t, len(vocab)) for t in terms)
+                doc_rows.extend([row] * len(terms))
+            # Perechi (termen, document) unice + frecventa, pentru bucata curenta
+            pairs = np.array(term_ids, dtype=np.int64) * len(texts) + np.array(doc_rows, dtype=np.int64)
+            pairs, counts = np.unique(pairs, return_counts=True)
+            term_parts.append(pairs // max(len(texts), 1))
+            doc_parts.append(pairs % max(len(texts), 1))
+            tf_parts.append(np.minimum(counts, 255))
+
+        term_of = np.concatenate(term_parts) if term_parts else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(doc_parts) if doc_parts else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.int64)
+
+        # Vocabular sortat; postings grupate pe termen, crescator dupa document
+        terms = sorted(vocab)
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+        term_of = rank[term_of]
+        order = np.lexsort((docs, term_of))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_of, minlength=len(terms)), out=offsets[1:])
+
+        return cls(np.asarray(ids, dtype=np.int64), terms, offsets, docs[order].astype(np.int32),
+                   tfs[order].astype(np.uint8), doc_len)
+
+    def _term_ids(self, query):
+        return sorted({self.term_index[t] for t in tokenize(query) if t in self.term_index})
+
+    def _contributions(self, term, rows=None):
+        """(randuri, scor BM25 al termenului) pentru postings-urile termenului (sau doar pentru rows)."""
+        start, end = self.offsets[term], self.offsets[term + 1]
+        docs = self.docs[start:end]
+        tfs = self.tfs[start:end].astype(np.float32)
+        if rows is not None:
+            # Fiecare termen din vocabular are cel putin un document
+            pos = np.minimum(np.searchsorted(docs, rows), len(docs) - 1)
+            tf = np.where(docs[pos] == rows, tfs[pos], 0.0)
+            docs = rows
+        else:
+            tf = tfs
+        return docs, self.idf[term] * tf * (K1 + 1) / (tf + self.norm[docs])
+
+    def search(self, query, k=50):
+        """(ids, scoruri) ale celor mai bune k documente pentru interogare, fara model."""
+        term_ids = self._term_ids(query)
+        if not term_ids or not self.n_docs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        touched = int(sum(self.offsets[t + 1] - self.offsets[t] for t in term_ids))
+        if touched > self.n_docs // 16:
+            # Termeni frecventi: acumulam pe tot catalogul
+            scores = np.zeros(self.n_docs, dtype=np.float32)
+            for term in term_ids:
+                docs, contrib = self._contributions(term)
+                scores[docs] += contrib
+            rows = np.flatnonzero(scores)
+            row_scores = scores[rows]
+        else:
+            # Termeni rari: doar postings-urile atinse
+            parts = [self._contributions(term) for term in term_ids]
+            rows, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+            row_scores = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts])).astype(np.float32)
+
+        if len(rows) > k:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            rows, row_scores = rows[top], row_scores[top]
+        order = np.argsort(-row_scores, kind="stable")
+        return self.ids[rows[order]], row_scores[order]
+
+    def score(self, query, ids):
+        """Scorul BM25 al interogarii pentru documentele date (0 pentru id-uri necunoscute)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = lookup_rows(self.id_index_kind, self.id_index, ids.ravel())
+        known = rows >= 0
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for term in self._term_ids(query):
+            _, contrib = self._contributions(term, rows[known].astype(np.int32))
+            scores[known] += contrib
+        return scores.reshape(ids.shape)
+
+    def save(self, path):
+        """Scrie indexul in directorul path (atomic: director temporar + os.replace)."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        self.ids.astype(np.int64).tofile(os.path.join(tmp_path, "ids.bin"))
+        self.offsets.astype(np.int64).tofile(os.path.join(tmp_path, "offsets.bin"))
+        self.docs.astype(np.int32).tofile(os.path.join(tmp_path, "docs.bin"))
+        self.tfs.astype(np.uint8).tofile(os.path.join(tmp_path, "tfs.bin"))
+        self.doc_len.astype(np.uint16).tofile(os.path.join(tmp_path, "doc_len.bin"))
+        meta = {
+            "version": LEXICAL_VERSION,
+            "n_docs": self.n_docs,
+            "n_postings": len(self.docs),
+            "k1": K1,
+            "b": B,
+            "terms": self.terms,
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Indexul scris de save(), memory-mapped; None daca lipseste sau are alta versiune."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != LEXICAL_VERSION or meta["k1"] != K1 or meta["b"] != B:
+            return None
+
+        def memmap(name, dtype, length):
+            if length == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.asarray(np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(length,)))
+
+        n_docs, n_postings = meta["n_docs"], meta["n_postings"]
+        return cls(
+            memmap("ids.bin", np.int64, n_docs),
+            meta["terms"],
+            memmap("offsets.bin", np.int64, len(meta["terms"]) + 1),
+            memmap("docs.bin", np.int32, n_postings),
+            memmap("tfs.bin", np.uint8, n_postings),
+            memmap("doc_len.bin", np.uint16, n_docs),
+        )
+
+
+def build_lexical_index(ids, texts, path):
+    """Construieste indexul BM25 pentru (ids, texts) si il scrie in directorul path."""
+    index = LexicalIndex.build(ids, texts)
+    index.save(path)
+    return index
+
+
+def load_lexical_index(path):
+    return LexicalIndex.load(path)
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from property_store import STORE_PATH, load_properties
+
+# STRATURI PENTRU HARTA (catalog intreg, clustere, heatmap)
+
+# Tot calculul se face pe server, vectorizat: un index pe grila (lat, lon) gaseste
+# punctele din viewport, iar cand sunt prea multe le grupam in clustere pe o grila
+# care depinde de zoom. Browser-ul primeste cel mult MAX_MARKERS markere, deci harta
+# ramane interactiva si la 100k+ anunturi. app.py tine serviciul in st.cache_resource.
+
+MAP_COLUMNS = ["id", "lat", "lon", "price_eur", "price_per_sqm"]
+GRID_CELL_DEG = 0.005
+MAX_MARKERS = 400
+CLUSTER_PX = 40
+
+PALETTE = np.array(["green", "lightgreen", "orange", "red"], dtype=object)
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def quantile_thresholds(values, quantiles=QUANTILES):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.zeros(len(quantiles))
+    return np.quantile(values, quantiles)
+
+
+def quantile_colors(values, thresholds=None):
+    """
+    Culoarea fiecarui punct dupa segmentul de pret/mp (<= q1 verde, ..., > q3 rosu).
+    thresholds: pragurile (implicit quartilele valorilor date)
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    if thresholds is None:
+        thresholds = quantile_thresholds(values)
+    return PALETTE[np.searchsorted(thresholds, values, side="left")]
+
+
+def cell_size_for_zoom(zoom, cluster_px=CLUSTER_PX):
+    """Latura (in grade) a celulei de cluster: cluster_px pixeli la nivelul de zoom dat."""
+    return cluster_px * 360.0 / (256 * 2 ** zoom)
+
+
+def bbox_around(lat, lon, zoom, width_px=800, height_px=500):
+    """Dreptunghiul vizibil pentru o harta centrata in (lat, lon) la zoom-ul dat."""
+    deg_per_px = 360.0 / (256 * 2 ** zoom)
+    half_lon = width_px / 2 * deg_per_px
+    half_lat = height_px / 2 * deg_per_px * np.cos(np.radians(lat))
+    return lat - half_lat, lon - half_lon, lat + half_lat, lon + half_lon
+
+
+def viewport_from_folium(state, precision=3):
+    """
+    (bbox, zoom) din valoarea intoarsa de st_folium (bounds + zoom), cu bbox rotunjit
+    ca viewport-urile aproape identice sa nimereasca acelasi cache; (None, None) daca lipseste.
+    """
+    bounds = (state or {}).get("bounds") or {}
+    south_west, north_east = bounds.get("_southWest"), bounds.get("_northEast")
+    zoom = (state or {}).get("zoom")
+    if not south_west or not north_east or zoom is None or south_west.get("lat") is None:
+        return None, None
+    bbox = (south_west["lat"], south_west["lng"], north_east["lat"], north_east["lng"])
+    return tuple(round(float(x), precision) for x in bbox), int(zoom)
+
+
+class GridIndex:
+    """Punctele grupate pe celule de cell_deg x cell_deg grade (CSR: ordine + offset-uri)."""
+
+    def __init__(self, lat, lon, cell_deg=GRID_CELL_DEG):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_deg = cell_deg
+
+        valid = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        if len(valid) == 0:
+            self.lat0 = self.lon0 = 0.0
+        else:
+            self.lat0 = self.lat[valid].min()
+            self.lon0 = self.lon[valid].min()
+        rows = np.floor((self.lat[valid] - self.lat0) / cell_deg).astype(np.int64)
+        cols = np.floor((self.lon[valid] - self.lon0) / cell_deg).astype(np.int64)
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 1
+
+        cells = rows * self.n_cols + cols
+        order = np.argsort(cells, kind="stable")
+        self.order = valid[order]
+        self.cells, self.starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+
+    def query_bbox(self, south, west, north, east):
+        """Pozitiile punctelor din dreptunghiul dat."""
+        cell_rows = self.cells // self.n_cols
+        cell_cols = self.cells % self.n_cols
+        r0, r1 = np.floor((np.array([south, north]) - self.lat0) / self.cell_deg)
+        c0, c1 = np.floor((np.array([west, east]) - self.lon0) / self.cell_deg)
+        sel = (cell_rows >= r0) & (cell_rows <= r1) & (cell_cols >= c0) & (cell_cols <= c1)
+
+        # Concatenam intervalele celulelor selectate fara bucla Python
+        starts, lengths = self.starts[sel], self.ends[sel] - self.starts[sel]
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        rows = self.order[positions]
+
+        # Celulele de la margine pot contine si puncte din afara dreptunghiului
+        inside = ((self.lat[rows] >= south) & (self.lat[rows] <= north) &
+                  (self.lon[rows] >= west) & (self.lon[rows] <= east))
+        return np.sort(rows[inside])
+
+
+def cluster_points(lat, lon, values, cell_deg):
+    """
+    Grupeaza punctele pe o grila de cell_deg grade: pozitia medie, numarul de puncte
+    si pretul/mp mediu pentru fiecare celula ocupata.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    if len(lat) == 0:
+        return pd.DataFrame({"lat": [], "lon": [], "count": [], "price_per_sqm": []})
+
+    keys = np.floor(lat / cell_deg).astype(np.int64) * 1_000_003 + np.floor(lon / cell_deg).astype(np.int64)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return pd.DataFrame({
+        "lat": np.bincount(inverse, weights=lat) / counts,
+        "lon": np.bincount(inverse, weights=lon) / counts,
+        "count": counts,
+        "price_per_sqm": np.bincount(inverse, weights=values) / counts,
+    })
+
+
+class MapLayerService:
+    """Punctele catalogului + indexul pe grila, construite o singura data per proces."""
+
+    def __init__(self, points):
+        self.points = points.reset_index(drop=True)
+        self.lat = self.points["lat"].to_numpy(dtype=np.float64)
+        self.lon = self.points["lon"].to_numpy(dtype=np.float64)
+        self.ppsqm = self.points["price_per_sqm"].to_numpy(dtype=np.float64)
+        self.grid = GridIndex(self.lat, self.lon)
+        # Pragurile de culoare sunt ale intregului catalog, ca o zona sa nu-si schimbe
+        # culoarea cand mutam harta
+        self.thresholds = quantile_thresholds(self.ppsqm)
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        return cls(load_properties(MAP_COLUMNS, path=path))
+
+    def viewport(self, bbox, zoom, max_markers=MAX_MARKERS):
+        """
+        Markerele pentru viewport-ul bbox = (south, west, north, east) la zoom-ul dat:
+        punctele individuale daca sunt putine, altfel clustere (cel mult max_markers).
+        Coloane: lat, lon, count, price_per_sqm, color (+ id, price_eur pentru puncte).
+        """
+        rows = self.grid.query_bbox(*bbox)
+
+        if len(rows) <= max_markers:
+            markers = self.points.iloc[rows][["id", "lat", "lon", "price_eur", "price_per_sqm"]].copy()
+            markers["count"] = 1
+        else:
+            cell_deg = cell_size_for_zoom(zoom)
+            markers = cluster_points(self.lat[rows], self.lon[rows], self.ppsqm[rows], cell_deg)
+            # La zoom mic pot ramane prea multe celule: dublam celula pana incap
+            while len(markers) > max_markers:
+                cell_deg *= 2
+                markers = cluster_points(self.lat[rows], self.lon[rows], self.ppsqm[rows], cell_deg)
+
+        markers["color"] = quantile_colors(markers["price_per_sqm"], self.thresholds)
+        return markers.reset_index(drop=True)
+
+    def heat_points(self, bbox, zoom, max_points=5000):
+        """[lat, lon, greutate] pentru HeatMap: clustere din viewport, ponderate cu pretul/mp."""
+        rows = self.grid.query_bbox(*bbox)
+        cell_deg = cell_size_for_zoom(zoom, cluster_px=8)
+        cells = cluster_points(self.lat[rows], self.lon[rows], self.ppsqm[rows], cell_deg)
+        while len(cells) > max_points:
+            cell_deg *= 2
+            cells = cluster_points(self.lat[rows], self.lon[rows], self.ppsqm[rows], cell_deg)
+        top = self.thresholds[-1] if len(self.thresholds) and self.thresholds[-1] > 0 else 1.0
+        weights = np.clip(cells["price_per_sqm"].to_numpy() / top, 0.0, 1.0)
+        return np.column_stack([cells["lat"], cells["lon"], weights]).tolist()
@@ -0,0 +1,287 @@
+import bisect
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from property_store import STORE_PATH, PropertyStore
+
+# STATISTICI DE PIATA (cartier x tip x clasa de suprafata)
+
+# Pentru fiecare celula (cartier, tip, clasa de suprafata) tinem doar statistici
+# care se pot aduna: numarul de anunturi, suma si suma patratelor pretului pe mp si
+# o histograma pe N_BINS intervale logaritmice intre PPSQM_MIN si PPSQM_MAX. Asa se
+# construiesc chunk cu chunk, in aceeasi trecere cu preprocesarea, fara sa tinem
+# catalogul in memorie. Mediana si cuantilele vin din histograma (interpolare in
+# interval, eroare sub ~2%).
+# La incarcare se calculeaza o singura data si nivelurile agregate (cartier x tip,
+# tip x clasa, tip, cartier, tot catalogul), deci lookup-ul e un dict: O(1), fara cautare
+# vectoriala. Cand celula exacta are sub MIN_COUNT anunturi urcam pe nivelul urmator.
+# data_preprocessing.py scrie tabelul in directorul store-ului (market_stats/).
+
+STATS_VERSION = 1
+STATS_DIR = "market_stats"
+STATS_COLUMNS = ["neighborhood", "property_type", "size_sqm", "price_per_sqm"]
+
+SIZE_BANDS = np.array([0, 40, 60, 80, 100, 150, 250, 500, np.inf])
+SIZE_LABELS = ["<40", "40-60", "60-80", "80-100", "100-150", "150-250", "250-500", "500+"]
+N_BINS = 256
+PPSQM_MIN, PPSQM_MAX = 10.0, 100_000.0
+LOG_EDGES = np.linspace(np.log(PPSQM_MIN), np.log(PPSQM_MAX), N_BINS + 1)
+
+MIN_COUNT = 5
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Cheia "oricare" pentru nivelurile agregate
+ANY = "*"
+# Ordinea de cautare: celula exacta, apoi tot mai general
+LEVELS = [
+    ("neighborhood", "property_type", "size_band"),
+    ("neighborhood", "property_type"),
+    ("property_type", "size_band"),
+    ("property_type",),
+    ("neighborhood",),
+    (),
+]
+
+
+def size_band(size_sqm):
+    """Indexul clasei de suprafata (-1 daca lipseste suprafata)."""
+    size_sqm = np.asarray(size_sqm, dtype=np.float64)
+    band = np.searchsorted(SIZE_BANDS, size_sqm, side="right") - 1
+    return np.where(np.isfinite(size_sqm), np.clip(band, 0, len(SIZE_LABELS) - 1), -1)
+
+
+def _norm(values):
+    return [str(v).strip().lower() for v in values]
+
+
+class MarketStats:
+    """Statisticile aditive pe celule (cheie = (cartier, tip, clasa)) + nivelurile agregate."""
+
+    def __init__(self):
+        self.keys = []
+        self.key_index = {}
+        self.count = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.float64)
+        self.total_sq = np.zeros(0, dtype=np.float64)
+        self.hist = np.zeros((0, N_BINS), dtype=np.uint32)
+        self._summary = None
+
+    def __len__(self):
+        return int(self.count.sum())
+
+    # CONSTRUIRE (CHUNK CU CHUNK)
+
+    def _rows_for(self, keys):
+        new = [k for k in dict.fromkeys(keys) if k not in self.key_index]
+        if new:
+            for key in new:
+                self.key_index[key] = len(self.keys)
+                self.keys.append(key)
+            grow = len(new)
+            self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+            self.total = np.concatenate([self.total, np.zeros(grow)])
+            self.total_sq = np.concatenate([self.total_sq, np.zeros(grow)])
+            self.hist = np.concatenate([self.hist, np.zeros((grow, N_BINS), dtype=np.uint32)])
+        return np.array([self.key_index[k] for k in keys], dtype=np.int64)
+
+    def add(self, frame):
+        """Adauga anunturile din frame (coloanele din STATS_COLUMNS)."""
+        ppsqm = frame["price_per_sqm"].to_numpy(dtype=np.float64, na_value=np.nan)
+        bands = size_band(frame["size_sqm"].to_numpy(dtype=np.float64, na_value=np.nan))
+        valid = np.isfinite(ppsqm) & (ppsqm > 0) & (bands >= 0)
+        if not valid.any():
+            return
+
+        keys = list(zip(_norm(frame["neighborhood"].to_numpy()[valid]),
+                        _norm(frame["property_type"].to_numpy()[valid]),
+                        bands[valid].tolist()))
+        rows = self._rows_for(keys)
+        values = ppsqm[valid]
+        bins = np.clip(np.searchsorted(LOG_EDGES, np.log(values), side="right") - 1, 0, N_BINS - 1)
+
+        n = len(self.keys)
+        self.count += np.bincount(rows, minlength=n)
+        self.total += np.bincount(rows, weights=values, minlength=n)
+        self.total_sq += np.bincount(rows, weights=values ** 2, minlength=n)
+        self.hist += np.bincount(rows * N_BINS + bins, minlength=n * N_BINS).reshape(n, N_BINS).astype(np.uint32)
+        self._summary = None
+
+    # LOOKUP O(1)
+
+    def _build_summary(self):
+        """Nivelurile agregate si statisticile finale pentru fiecare cheie, calculate o data."""
+        keys = pd.DataFrame(self.keys, columns=["neighborhood", "property_type", "size_band"])
+        count, total, total_sq, hist = [], [], [], []
+        summary_keys = []
+        for level in LEVELS:
+            if level:
+                groups = keys.groupby(list(level), sort=False).indices
+            else:
+                groups = {(): np.arange(len(keys))}
+            for group, rows in groups.items():
+                group = group if isinstance(group, tuple) else (group,)
+                named = dict(zip(level, group))
+                summary_keys.append((named.get("neighborhood", ANY), named.get("property_type", ANY),
+                                     named.get("size_band", ANY)))
+                count.append(self.count[rows].sum())
+                total.append(self.total[rows].sum())
+                total_sq.append(self.total_sq[rows].sum())
+                hist.append(self.hist[rows].sum(axis=0, dtype=np.int64))
+
+        count = np.array(count, dtype=np.float64)
+        hist = np.array(hist, dtype=np.float64).reshape(len(count), N_BINS)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.array(total) / count
+            std = np.sqrt(np.maximum(np.array(total_sq) / count - mean ** 2, 0.0))
+        stats = {"count": count.astype(np.int64), "mean": mean, "std": std}
+        stats.update({f"p{int(q * 100)}": self._quantile(hist, count, q) for q in QUANTILES})
+        self._summary = {"index": {k: i for i, k in enumerate(summary_keys)}, **stats}
+
+    @staticmethod
+    def _quantile(hist, count, q):
+        """Cuantila q pentru fiecare rand al histogramei (interpolare liniara pe log)."""
+        cum = np.cumsum(hist, axis=1)
+        target = q * count
+        bins = np.minimum((cum < target[:, None]).sum(axis=1), N_BINS - 1)
+        rows = np.arange(len(count))
+        before = np.where(bins > 0, cum[rows, bins - 1], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            within = np.clip((target - before) / hist[rows, bins], 0.0, 1.0)
+        value = np.exp(LOG_EDGES[bins] + within * (LOG_EDGES[1] - LOG_EDGES[0]))
+        return np.where(count > 0, value, np.nan)
+
+    def lookup(self, neighborhood=None, property_type=None, size_sqm=None, min_count=MIN_COUNT):
+        """
+        Statisticile pretului pe mp pentru cea mai specifica celula cu cel putin
+        min_count anunturi: dict cu level (cheia folosita), count, mean, std, p10..p90
+        (p50 = mediana); None daca nu avem deloc date.
+        """
+        if self._summary is None:
+            self._build_summary()
+        summary = self._summary
+
+        neighborhood = _norm([neighborhood])[0] if neighborhood else ANY
+        property_type = _norm([property_type])[0] if property_type and property_type != "any" else ANY
+        band = ANY
+        if size_sqm is not None and size_sqm == size_sqm:
+            band = min(max(bisect.bisect_right(SIZE_BANDS.tolist(), size_sqm) - 1, 0), len(SIZE_LABELS) - 1)
+
+        candidates = [
+            (neighborhood, property_type, band),
+            (neighborhood, property_type, ANY),
+            (ANY, property_type, band),
+            (ANY, property_type, ANY),
+            (neighborhood, ANY, ANY),
+            (ANY, ANY, ANY),
+        ]
+        for key in candidates:
+            row = summary["index"].get(key)
+            if row is not None and summary["count"][row] >= min_count:
+                break
+        else:
+            row = summary["index"].get((ANY, ANY, ANY))
+            if row is None or summary["count"][row] == 0:
+                return None
+            key = (ANY, ANY, ANY)
+
+        result = {
+            "level": {"neighborhood": key[0], "property_type": key[1],
+                      "size_band": SIZE_LABELS[key[2]] if key[2] != ANY else ANY},
+            "count": int(summary["count"][row]),
+        }
+        for name in ["mean", "std"] + [f"p{int(q * 100)}" for q in QUANTILES]:
+            result[name] = round(float(summary[name][row]), 2)
+        return result
+
+    def overview(self, neighborhood=None, property_type=None):
+        """
+        Tabel de piata pe clase de suprafata (si pe tip, daca tipul nu e dat) pentru
+        un cartier sau pentru tot catalogul: count, mediana si cuantilele pretului pe mp.
+        """
+        if self._summary is None:
+            self._build_summary()
+        neighborhood = _norm([neighborhood])[0] if neighborhood else ANY
+        types = ([_norm([property_type])[0]] if property_type and property_type != "any"
+                 else sorted({k[1] for k in self.keys}))
+
+        records = []
+        for ptype in types:
+            for band, label in enumerate(SIZE_LABELS):
+                row = self._summary["index"].get((neighborhood, ptype, band))
+                if row is None or self._summary["count"][row] == 0:
+                    continue
+                records.append({
+                    "property_type": ptype,
+                    "size_band": label,
+                    "count": int(self._summary["count"][row]),
+                    **{f"p{int(q * 100)}": round(float(self._summary[f"p{int(q * 100)}"][row]), 0)
+                       for q in QUANTILES},
+                })
+        return pd.DataFrame(records, columns=["property_type", "size_band", "count"] +
+                            [f"p{int(q * 100)}" for q in QUANTILES])
+
+    # SALVARE / INCARCARE
+
+    def save(self, path):
+        """Scrie tabelul in directorul path (atomic: director temporar + os.replace)."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        self.count.astype(np.int64).tofile(os.path.join(tmp_path, "count.bin"))
+        self.total.astype(np.float64).tofile(os.path.join(tmp_path, "total.bin"))
+        self.total_sq.astype(np.float64).tofile(os.path.join(tmp_path, "total_sq.bin"))
+        self.hist.astype(np.uint32).tofile(os.path.join(tmp_path, "hist.bin"))
+        meta = {
+            "version": STATS_VERSION,
+            "n_bins": N_BINS,
+            "ppsqm_range": [PPSQM_MIN, PPSQM_MAX],
+            "size_bands": SIZE_LABELS,
+            "keys": [list(k) for k in self.keys],
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Tabelul scris de save(); None daca lipseste sau are alt format."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("version") != STATS_VERSION or meta["n_bins"] != N_BINS
+                or meta["ppsqm_range"] != [PPSQM_MIN, PPSQM_MAX] or meta["size_bands"] != SIZE_LABELS):
+            return None
+
+        stats = cls()
+        stats.keys = [tuple(k) for k in meta["keys"]]
+        stats.key_index = {k: i for i, k in enumerate(stats.keys)}
+        n = len(stats.keys)
+        stats.count = np.fromfile(os.path.join(path, "count.bin"), dtype=np.int64, count=n)
+        stats.total = np.fromfile(os.path.join(path, "total.bin"), dtype=np.float64, count=n)
+        stats.total_sq = np.fromfile(os.path.join(path, "total_sq.bin"), dtype=np.float64, count=n)
+        stats.hist = np.fromfile(os.path.join(path, "hist.bin"), dtype=np.uint32,
+                                 count=n * N_BINS).reshape(n, N_BINS)
+        return stats
+
+
+def build_market_stats(store_path=STORE_PATH):
+    """Construieste statisticile din store si le scrie in store_path/market_stats."""
+    store = PropertyStore(store_path)
+    stats = MarketStats()
+    stats.add(store.to_dataframe(STATS_COLUMNS))
+    stats.save(os.path.join(store_path, STATS_DIR))
+    return stats
+
+
+def load_market_stats(store_path=STORE_PATH):
+    return MarketStats.load(os.path.join(store_path, STATS_DIR))
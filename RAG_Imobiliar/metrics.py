@@ -0,0 +1,247 @@
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# INSTRUMENTARE: TIMPI PE ETAPE SI CONTOARE
+
+# Dezactivat implicit: span() intoarce un context manager gol si timed() doar
+# verifica un bool, deci costul in hot path e practic zero. Se activeaza cu
+# RAG_METRICS=1 sau enable().
+#
+#   with metrics.span("retrieval.encode"): ...
+#   @metrics.timed("pricing.compute_fair_price")
+#   metrics.incr("retrieval.queries", len(texts))
+#
+#   with metrics.trace("app.request") as t: ...   # t.spans = etapele cererii curente
+#
+# trace(..., force=True) masoara etapele unei singure cereri (ex: panoul de debug din
+# app.py) fara sa activeze instrumentarea pentru tot procesul: span() / timed() sunt
+# active si in interiorul unui trace fortat, dar histogramele si contoarele globale
+# raman neatinse cat timp instrumentarea e dezactivata.
+#
+# Export: prometheus_text() / write_prometheus(path) / start_http_server(port)
+# si un log JSON per cerere pe logger-ul "rag.metrics" (RAG_METRICS_LOG=fisier).
+
+_enabled = os.environ.get("RAG_METRICS", "0") == "1"
+
+# Limitele histogramelor, in secunde (ca la clientul Prometheus)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("rag.metrics")
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_current_trace = contextvars.ContextVar("rag_metrics_trace", default=None)
+_NOOP = nullcontext()
+
+
+def configure_json_log(path=None):
+    """Trimite log-urile JSON intr-un fisier (sau la stderr, cu path=None), un obiect pe linie."""
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+if os.environ.get("RAG_METRICS_LOG"):
+    configure_json_log(os.environ["RAG_METRICS_LOG"])
+
+
+def enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _active():
+    # Activ global sau in interiorul unui trace (fortat) al cererii curente
+    return _enabled or _current_trace.get() is not None
+
+
+def observe(name, seconds):
+    """Inregistreaza o durata in histograma etapei si in trace-ul curent (daca exista)."""
+    spans = _current_trace.get()
+    if _enabled:
+        with _lock:
+            hist = _histograms.get(name)
+            if hist is None:
+                hist = _histograms[name] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+            hist["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+    if spans is not None:
+        spans.append({"stage": name, "ms": round(seconds * 1000, 3)})
+
+
+@contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def span(name):
+    """Masoara blocul `with`; fara efect cand instrumentarea e dezactivata."""
+    return _span(name) if _active() else _NOOP
+
+
+def timed(name):
+    """Decorator: masoara fiecare apel al functiei ca etapa `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def incr(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+class Trace:
+    """
+    Colecteaza etapele masurate intre start() si stop() (acelasi thread / task) si la
+    final scrie un log JSON cu ele. Merge si ca `with metrics.trace(...) as t`.
+    `spans` ramane gol cand instrumentarea e dezactivata, in afara de force=True.
+    """
+
+    def __init__(self, name, force=False, **fields):
+        self.name = name
+        self.force = force
+        self.fields = fields
+        self.spans = []
+        self.total_ms = None
+        self._token = None
+
+    def start(self):
+        if _enabled or self.force:
+            self._token = _current_trace.set(self.spans)
+            self._start = time.perf_counter()
+        return self
+
+    def stop(self):
+        if self._token is None:
+            return self
+        _current_trace.reset(self._token)
+        self._token = None
+        total = time.perf_counter() - self._start
+        self.total_ms = round(total * 1000, 3)
+        observe(self.name, total)
+        logger.info(json.dumps({
+            "event": self.name,
+            "ts": time.time(),
+            "total_ms": self.total_ms,
+            "spans": self.spans,
+            **self.fields,
+        }, ensure_ascii=False, default=str))
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def trace(name, force=False, **fields):
+    return Trace(name, force=force, **fields)
+
+# EXPORT
+
+def _metric_name(name):
+    return "rag_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def snapshot():
+    """Copie a histogramelor si contoarelor (pentru JSON / afisare)."""
+    with _lock:
+        return {
+            "stages": {k: {"count": v["count"], "sum_seconds": v["sum"]} for k, v in _histograms.items()},
+            "counters": dict(_counters),
+        }
+
+
+def prometheus_text():
+    """Metricile in formatul text Prometheus (exposition format 0.0.4)."""
+    lines = []
+    with _lock:
+        if _histograms:
+            lines.append("# HELP rag_stage_seconds Durata etapelor din pipeline")
+            lines.append("# TYPE rag_stage_seconds histogram")
+        for stage, hist in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), hist["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+            lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+        for name, value in sorted(_counters.items()):
+            metric = _metric_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Scrie metricile intr-un fisier (pentru textfile collector-ul node_exporter)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port=9108, host="127.0.0.1"):
+    """Porneste endpoint-ul /metrics intr-un thread daemon si intoarce serverul."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
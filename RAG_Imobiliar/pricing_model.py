@@ -1,6 +1,8 @@
 import json
 import numpy as np
 
+import metrics
+
 # LOAD COMPARABLES
 
 def load_comparables(path="comparables.json"):
@@ -9,11 +11,17 @@ def load_comparables(path="comparables.json"):
 
 # FAIR PRICE ESTIMATION
 
-def compute_fair_price(comparables, target_price=None, target_sqm=None):
+# Intervalul implicit: ±5% in jurul pretului corect (fractiuni din pret)
+DEFAULT_INTERVAL = (0.95, 1.05)
+
+
+@metrics.timed("pricing.compute_fair_price")
+def compute_fair_price(comparables, target_price=None, target_sqm=None, interval=DEFAULT_INTERVAL):
     """
     comparables: lista cu id, final_score, price_per_sqm, size_sqm etc.
     target_price: pretul proprietatii analizate (din cererea userului)
     target_sqm: suprafata proprietatii (din cererea userului)
+    interval: (jos, sus) ca fractiuni din pretul corect (vezi market_interval)
     """
 
     # Daca nu avem suprafata in query, luam media comparabilelor
@@ -27,22 +35,11 @@ def compute_fair_price(comparables, target_price=None, target_sqm=None):
     fair_ppsqm = np.sum(prices_ppsqm * weights) / np.sum(weights)
     fair_price = fair_ppsqm * target_sqm
 
-    # Interval ±5%
-    lower = fair_price * 0.95
-    upper = fair_price * 1.05
+    # Interval (implicit ±5%)
+    lower = fair_price * interval[0]
+    upper = fair_price * interval[1]
 
-    # Verdict
-    verdict = None
-    if target_price is None:
-        verdict = "UNKNOWN"
-    else:
-        if target_price < lower:
-            verdict = "UNDERPRICED"
-        elif target_price > upper:
-            verdict = "OVERPRICED"
-            pass
-        else:
-            verdict = "FAIR"
+    verdict = _verdict(target_price, lower, upper)
 
     return {
         "fair_price": round(float(fair_price), 2),
@@ -55,15 +52,245 @@ def compute_fair_price(comparables, target_price=None, target_sqm=None):
         "target_sqm": target_sqm
     }
 
+
+def _verdict(target_price, lower, upper):
+    if target_price is None:
+        return "UNKNOWN"
+    if target_price < lower:
+        return "UNDERPRICED"
+    if target_price > upper:
+        return "OVERPRICED"
+    return "FAIR"
+
+# PRET DE BAZA DIN STATISTICILE DE PIATA (fara cautare vectoriala)
+
+def market_interval(market, property_type=None, neighborhood=None, size_sqm=None):
+    """
+    Intervalul (jos, sus) din dispersia reala a pretului pe mp in celula de piata
+    (market_stats): p25 / mediana si p75 / mediana, ca la baseline_estimation.
+    Nu se ingusteaza cu numarul de comparabile: verdictul priveste pretul unui
+    singur anunt, deci conteaza dispersia preturilor individuale, nu eroarea mediei.
+    DEFAULT_INTERVAL daca nu avem statistici.
+    """
+    cell = market.lookup(neighborhood, property_type, size_sqm) if market is not None else None
+    if cell is None or not cell["p50"] > 0:
+        return DEFAULT_INTERVAL
+    return float(cell["p25"] / cell["p50"]), float(cell["p75"] / cell["p50"])
+
+
+def baseline_estimation(market, property_type=None, neighborhood=None, size_sqm=None, target_price=None):
+    """
+    Estimare O(1) din market_stats, fara comparabile: mediana €/mp a celei mai
+    specifice celule cu destule anunturi x suprafata, interval p25 - p75.
+    Acelasi format ca compute_fair_price, plus "market" (celula folosita si statisticile ei);
+    None daca nu avem statistici sau suprafata.
+    """
+    cell = market.lookup(neighborhood, property_type, size_sqm) if market is not None else None
+    if cell is None or size_sqm is None or not size_sqm == size_sqm:
+        return None
+
+    fair_price = cell["p50"] * size_sqm
+    lower = cell["p25"] * size_sqm
+    upper = cell["p75"] * size_sqm
+    return {
+        "fair_price": round(float(fair_price), 2),
+        "fair_ppsqm": round(float(cell["p50"]), 2),
+        "confidence_interval": {
+            "lower": round(float(lower), 2),
+            "upper": round(float(upper), 2)
+        },
+        "verdict": _verdict(target_price, lower, upper),
+        "target_sqm": size_sqm,
+        "market": cell,
+    }
+
+# BATCH PRICING (multe proprietati deodata)
+
+# Coduri numerice pentru verdict, in aceeasi ordine ca VERDICT_LABELS
+VERDICT_UNKNOWN, VERDICT_UNDERPRICED, VERDICT_FAIR, VERDICT_OVERPRICED = 0, 1, 2, 3
+VERDICT_LABELS = ("UNKNOWN", "UNDERPRICED", "FAIR", "OVERPRICED")
+
+
+def pad_comparables(comparables_lists, k=None):
+    """
+    Transforma o lista de liste de comparabile (ex: din get_comparables_many) in
+    matrici (T, k) completate cu 0; mask marcheaza pozitiile reale.
+    """
+    k = k or max((len(c) for c in comparables_lists), default=0)
+    n_targets = len(comparables_lists)
+    scores = np.zeros((n_targets, k))
+    ppsqm = np.zeros((n_targets, k))
+    sizes = np.zeros((n_targets, k))
+    mask = np.zeros((n_targets, k), dtype=bool)
+
+    for t, comps in enumerate(comparables_lists):
+        comps = comps[:k]
+        n = len(comps)
+        scores[t, :n] = [c["final_score"] for c in comps]
+        ppsqm[t, :n] = [c["price_per_sqm"] for c in comps]
+        sizes[t, :n] = [c["size_sqm"] for c in comps]
+        mask[t, :n] = True
+
+    return scores, ppsqm, sizes, mask
+
+
+@metrics.timed("pricing.compute_fair_price_batch")
+def compute_fair_price_batch(scores, prices_ppsqm, target_sqm=None, target_price=None,
+                             sizes_sqm=None, mask=None, interval=None):
+    """
+    Varianta vectorizata a compute_fair_price pentru T proprietati.
+
+    scores, prices_ppsqm: matrici (T, k) cu final_score si €/mp ale comparabilelor
+    target_sqm: vector (T,) cu suprafetele; NaN (sau None) = media comparabilelor,
+                caz in care sizes_sqm (T, k) este necesar
+    target_price: vector (T,) cu preturile listate; NaN (sau None) = verdict UNKNOWN
+    mask: (T, k) bool, pozitiile valide (implicit toate); restul sunt ignorate
+    interval: (jos, sus) comun sau matrice (T, 2), ca fractiuni din pret; implicit DEFAULT_INTERVAL
+
+    Intoarce un dict de array-uri: fair_price, fair_ppsqm, lower, upper (rotunjite
+    la 2 zecimale ca in compute_fair_price), target_sqm si verdict (coduri
+    VERDICT_*, vezi VERDICT_LABELS).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    prices_ppsqm = np.asarray(prices_ppsqm, dtype=np.float64)
+    n_targets = scores.shape[0]
+    if mask is None:
+        mask = np.ones(scores.shape, dtype=bool)
+
+    # Pozitiile de padding devin 0 ca sa nu schimbe sumele
+    weights = np.where(mask, scores, 0.0)
+    values = np.where(mask, prices_ppsqm, 0.0)
+
+    if target_sqm is None:
+        target_sqm = np.full(n_targets, np.nan)
+    target_sqm = np.asarray(target_sqm, dtype=np.float64)
+    missing_sqm = np.isnan(target_sqm)
+    if missing_sqm.any():
+        sizes = np.where(mask, np.asarray(sizes_sqm, dtype=np.float64), 0.0)
+        mean_sqm = np.sum(sizes, axis=1) / mask.sum(axis=1)
+        target_sqm = np.where(missing_sqm, mean_sqm, target_sqm)
+
+    # Media ponderata €/mp
+    fair_ppsqm = np.sum(values * weights, axis=1) / np.sum(weights, axis=1)
+    fair_price = fair_ppsqm * target_sqm
+
+    # Interval (implicit ±5%)
+    interval = np.broadcast_to(np.asarray(DEFAULT_INTERVAL if interval is None else interval,
+                                          dtype=np.float64), (n_targets, 2))
+    lower = fair_price * interval[:, 0]
+    upper = fair_price * interval[:, 1]
+
+    # Verdict
+    if target_price is None:
+        target_price = np.full(n_targets, np.nan)
+    target_price = np.asarray(target_price, dtype=np.float64)
+    verdict = np.full(n_targets, VERDICT_FAIR, dtype=np.int8)
+    verdict[target_price < lower] = VERDICT_UNDERPRICED
+    verdict[target_price > upper] = VERDICT_OVERPRICED
+    verdict[np.isnan(target_price)] = VERDICT_UNKNOWN
+
+    return {
+        "fair_price": _round2(fair_price),
+        "fair_ppsqm": _round2(fair_ppsqm),
+        "lower": _round2(lower),
+        "upper": _round2(upper),
+        "verdict": verdict,
+        "target_sqm": target_sqm,
+    }
+
+
+def _round2(values):
+    # np.round poate diferi de round() Python cu 0.01 la valorile aflate exact la
+    # jumatate (reprezentarea binara); bench_pricing.py compara cu toleranta
+    return np.round(values, 2)
+
+
+def batch_to_estimations(batch):
+    """Transforma rezultatul lui compute_fair_price_batch in dict-uri ca la compute_fair_price."""
+    return [
+        {
+            "fair_price": fp,
+            "fair_ppsqm": fpp,
+            "confidence_interval": {"lower": lo, "upper": up},
+            "verdict": VERDICT_LABELS[v],
+            "target_sqm": sqm,
+        }
+        for fp, fpp, lo, up, v, sqm in zip(
+            batch["fair_price"].tolist(), batch["fair_ppsqm"].tolist(),
+            batch["lower"].tolist(), batch["upper"].tolist(),
+            batch["verdict"].tolist(), batch["target_sqm"].tolist(),
+        )
+    ]
+
+# ESTIMARE COMUNA (app.py, valuation_service.py, valuate_portfolio.py)
+
+# Sub atatea comparabile estimarea vine din statisticile de piata (baseline_estimation)
+MIN_COMPARABLES = 3
+
+
+def _missing(value):
+    return value is None or value != value
+
+
+def estimate_batch(comparables_lists, market=None, property_types=None, neighborhoods=None,
+                   target_sqm=None, target_price=None):
+    """
+    Aceeasi regula pentru toate caile de evaluare, pentru T proprietati:
+      - sub MIN_COMPARABLES comparabile: baseline_estimation din market (daca are celula)
+      - altfel media ponderata (compute_fair_price_batch), cu intervalul din market_interval
+      - None daca nu avem nici comparabile, nici statistici
+    property_types, neighborhoods, target_sqm, target_price: liste de lungime T (None = lipsa)
+    """
+    n_targets = len(comparables_lists)
+    property_types = property_types or [None] * n_targets
+    neighborhoods = neighborhoods or [None] * n_targets
+    target_sqm = [None] * n_targets if target_sqm is None else [None if _missing(v) else v for v in target_sqm]
+    target_price = [None] * n_targets if target_price is None else [None if _missing(v) else v
+                                                                      for v in target_price]
+
+    estimations = [None] * n_targets
+    weighted = []
+    for t, comps in enumerate(comparables_lists):
+        if len(comps) < MIN_COMPARABLES:
+            estimations[t] = baseline_estimation(market, property_types[t], neighborhoods[t], target_sqm[t],
+                                                 target_price=target_price[t])
+        if estimations[t] is None and comps:
+            weighted.append(t)
+
+    if weighted:
+        scores, ppsqm, sizes, mask = pad_comparables([comparables_lists[t] for t in weighted])
+        interval = [market_interval(market, property_types[t], neighborhoods[t], target_sqm[t]) for t in weighted]
+        batch = compute_fair_price_batch(
+            scores, ppsqm,
+            target_sqm=[np.nan if target_sqm[t] is None else target_sqm[t] for t in weighted],
+            target_price=[np.nan if target_price[t] is None else target_price[t] for t in weighted],
+            sizes_sqm=sizes, mask=mask, interval=interval,
+        )
+        for t, estimation in zip(weighted, batch_to_estimations(batch)):
+            estimations[t] = estimation
+    return estimations
+
+
+def estimate(comparables, market=None, property_type=None, neighborhood=None, target_sqm=None, target_price=None):
+    """estimate_batch pentru o singura proprietate."""
+    return estimate_batch([comparables], market, [property_type], [neighborhood], [target_sqm], [target_price])[0]
+
 # MAIN FUNCTION
 
 def evaluate_property(
     comparables_path="comparables.json",
     target_price=None,
     target_sqm=None,
-    output_path="pricing_output.json"
+    output_path="pricing_output.json",
+    comparables=None
 ):
-    comparables = load_comparables(comparables_path)
+    """
+    comparables: lista de comparabile deja in memorie (ex: rezultatul din
+    retrieval.get_comparables); daca lipseste, se citeste din comparables_path
+    output_path: None = nu se scrie raportul pe disc
+    """
+    if comparables is None:
+        comparables = load_comparables(comparables_path)
 
     estimation = compute_fair_price(
         comparables,
@@ -76,10 +303,11 @@ def evaluate_property(
         "comparables_used": comparables
     }
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=4, ensure_ascii=False)
+    if output_path is not None:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=4, ensure_ascii=False)
 
-    print(f"Saved pricing report to {output_path}")
+        print(f"Saved pricing report to {output_path}")
     return output
 
 # TEST
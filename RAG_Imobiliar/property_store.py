@@ -0,0 +1,273 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+# STORE COLOANAR PENTRU PROPRIETATI
+
+# Fiecare coloana e un fisier binar separat, deschis cu np.memmap (fara copiere):
+#   - numerice: valorile brute (int64 / float64)
+#   - categoriale: coduri int32 + lista de categorii in meta.json (-1 = lipsa)
+#   - text: bytes UTF-8 concatenati + offset-uri int64 (ca in Arrow)
+# Indexul id -> rand e tot un array memory-mapped, deci gather-ul e O(1) per id.
+# properties_clean.csv ramane doar format de export.
+
+STORE_PATH = "property_store"
+CSV_PATH = "properties_clean.csv"
+STORE_VERSION = 1
+
+CATEGORY_COLS = ["property_type", "city", "neighborhood", "parking", "heating"]
+STRING_COLS = ["title", "description", "source_url", "text_for_embedding"]
+
+
+class PropertyStoreWriter:
+    """Scrie store-ul incremental, chunk cu chunk (vezi data_preprocessing.py)."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+
+        self.n_rows = 0
+        self.columns = None
+        self.categories = {}
+        self.string_sizes = {}
+
+    def _file(self, name, mode="ab"):
+        return open(os.path.join(self.tmp_path, name), mode)
+
+    def append(self, chunk):
+        if self.columns is None:
+            self.columns = {}
+            for col in chunk.columns:
+                if col in CATEGORY_COLS:
+                    self.columns[col] = {"kind": "category"}
+                    self.categories[col] = {}
+                elif col in STRING_COLS:
+                    self.columns[col] = {"kind": "string"}
+                    self.string_sizes[col] = 0
+                    with self._file(f"{col}.offsets.bin") as f:
+                        np.zeros(1, dtype=np.int64).tofile(f)
+                else:
+                    self.columns[col] = {"kind": "numeric", "dtype": str(chunk[col].dtype)}
+
+        for col, info in self.columns.items():
+            values = chunk[col]
+
+            if info["kind"] == "numeric":
+                with self._file(f"{col}.bin") as f:
+                    values.to_numpy(dtype=info["dtype"]).tofile(f)
+
+            elif info["kind"] == "category":
+                mapping = self.categories[col]
+                codes = np.full(len(values), -1, dtype=np.int32)
+                present = values.notna().to_numpy()
+                for value in pd.unique(values[present]):
+                    mapping.setdefault(str(value), len(mapping))
+                codes[present] = values[present].astype(str).map(mapping).to_numpy(dtype=np.int32)
+                with self._file(f"{col}.bin") as f:
+                    codes.tofile(f)
+
+            else:
+                present = values.notna().to_numpy()
+                encoded = [str(v).encode("utf-8") if ok else b""
+                           for v, ok in zip(values.tolist(), present)]
+                lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+                offsets = self.string_sizes[col] + np.cumsum(lengths)
+                self.string_sizes[col] = int(offsets[-1]) if len(offsets) else self.string_sizes[col]
+                with self._file(f"{col}.bin") as f:
+                    f.write(b"".join(encoded))
+                with self._file(f"{col}.offsets.bin") as f:
+                    offsets.tofile(f)
+                with self._file(f"{col}.null.bin") as f:
+                    (~present).astype(np.uint8).tofile(f)
+
+        self.n_rows += len(chunk)
+
+    def close(self):
+        columns = self.columns or {}
+        for col, info in columns.items():
+            if info["kind"] == "category":
+                mapping = self.categories[col]
+                info["categories"] = sorted(mapping, key=mapping.get)
+
+        # Indexul id -> rand
+        ids = np.fromfile(os.path.join(self.tmp_path, "id.bin"), dtype=np.int64) \
+            if "id" in columns else np.zeros(0, dtype=np.int64)
+        id_index = build_id_index(ids)
+        with self._file("id_index.bin", "wb") as f:
+            id_index["array"].tofile(f)
+
+        meta = {
+            "version": STORE_VERSION,
+            "n_rows": self.n_rows,
+            "columns": columns,
+            "id_index": {"kind": id_index["kind"], "length": len(id_index["array"])},
+        }
+        with self._file("meta.json", "w") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+        # Inlocuim store-ul vechi doar dupa ce cel nou e complet
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_path, self.path)
+
+
+def build_id_index(ids):
+    """
+    Id-uri dense (cazul obisnuit): array direct id -> rand, -1 pentru lipsa.
+    Id-uri foarte rare: perechi (id, rand) sortate, cautate cu searchsorted.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0 or (ids.min() >= 0 and ids.max() <= 4 * len(ids) + 1_000_000):
+        lookup = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+        lookup[ids] = np.arange(len(ids), dtype=np.int64)
+        return {"kind": "dense", "array": lookup}
+
+    order = np.argsort(ids, kind="stable")
+    pairs = np.stack([ids[order], order.astype(np.int64)], axis=1).ravel()
+    return {"kind": "sorted", "array": pairs}
+
+
+def lookup_rows(kind, id_index, ids):
+    """Cauta id-uri intr-un index construit cu build_id_index (-1 daca id-ul nu exista)."""
+    ids = np.asarray(ids, dtype=np.int64)
+
+    if kind == "dense":
+        inside = (ids >= 0) & (ids < len(id_index))
+        rows = np.full(ids.shape, -1, dtype=np.int64)
+        rows[inside] = id_index[ids[inside]]
+        return rows
+
+    pairs = id_index.reshape(-1, 2)
+    sorted_ids, positions = pairs[:, 0], pairs[:, 1]
+    if len(sorted_ids) == 0:
+        return np.full(ids.shape, -1, dtype=np.int64)
+    idx = np.searchsorted(sorted_ids, ids).clip(0, len(sorted_ids) - 1)
+    return np.where(sorted_ids[idx] == ids, positions[idx], -1)
+
+
+def write_property_store(df, path=STORE_PATH):
+    """Scrie un DataFrame intreg (cu coloana id) ca store coloanar."""
+    writer = PropertyStoreWriter(path)
+    writer.append(df)
+    writer.close()
+    return path
+
+
+class PropertyStore:
+    """Acces read-only, memory-mapped, la store-ul coloanar."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.n_rows = self.meta["n_rows"]
+        self.columns = list(self.meta["columns"])
+        self._id_index = self._memmap("id_index.bin", np.int64, self.meta["id_index"]["length"])
+        if self.meta["id_index"]["kind"] == "sorted":
+            self._id_index = self._id_index.reshape(-1, 2)
+
+    def __len__(self):
+        return self.n_rows
+
+    def _memmap(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(length,))
+
+    def codes(self, name):
+        """Codurile int32 ale unei coloane categoriale (fara decodare)."""
+        return self._memmap(f"{name}.bin", np.int32, self.n_rows)
+
+    def categories(self, name):
+        return self.meta["columns"][name]["categories"]
+
+    def column(self, name, rows=None):
+        """Valorile unei coloane, optional doar pentru pozitiile `rows`."""
+        info = self.meta["columns"][name]
+
+        if info["kind"] == "numeric":
+            values = self._memmap(f"{name}.bin", np.dtype(info["dtype"]), self.n_rows)
+            return values if rows is None else values[rows]
+
+        if info["kind"] == "category":
+            codes = self.codes(name)
+            codes = np.asarray(codes if rows is None else codes[rows])
+            return pd.Categorical.from_codes(codes, categories=info["categories"])
+
+        offsets = self._memmap(f"{name}.offsets.bin", np.int64, self.n_rows + 1)
+        nulls = self._memmap(f"{name}.null.bin", np.uint8, self.n_rows)
+        data = self._memmap(f"{name}.bin", np.uint8, int(offsets[-1]) if self.n_rows else 0)
+        rows = np.arange(self.n_rows) if rows is None else np.asarray(rows)
+        return np.array([
+            None if nulls[r] else bytes(data[offsets[r]:offsets[r + 1]]).decode("utf-8")
+            for r in rows.tolist()
+        ], dtype=object)
+
+    def rows_for_ids(self, ids):
+        """Pozitiile randurilor pentru id-uri date (-1 daca id-ul nu exista)."""
+        return lookup_rows(self.meta["id_index"]["kind"], self._id_index, ids)
+
+    def gather(self, ids, columns=None):
+        """DataFrame cu randurile pentru `ids`, in ordinea data; id-urile lipsa sunt omise."""
+        rows = self.rows_for_ids(ids)
+        rows = rows[rows >= 0]
+        columns = columns or self.columns
+        return pd.DataFrame({col: self.column(col, rows) for col in columns})
+
+    def to_dataframe(self, columns=None):
+        columns = columns or self.columns
+        return pd.DataFrame({col: self.column(col) for col in columns})
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path=STORE_PATH):
+    """Store-ul deschis o singura data per proces (memmap-urile sunt partajate)."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = PropertyStore(path)
+        return _stores[path]
+
+
+def load_properties(columns=None, path=STORE_PATH, csv_path=CSV_PATH):
+    """
+    Tabelul de proprietati ca DataFrame: din store daca exista, altfel din CSV
+    (ex: inainte de a rula data_preprocessing.py cu versiunea noua).
+    """
+    if os.path.exists(os.path.join(path, "meta.json")):
+        store = open_store(path)
+        if columns is not None and "id" not in columns:
+            columns = ["id"] + list(columns)
+        return store.to_dataframe(columns)
+
+    df = pd.read_csv(csv_path)
+    return df if columns is None else df[["id"] + [c for c in columns if c != "id"]]
+
+
+def gather_properties(ids, columns, path=STORE_PATH, csv_path=CSV_PATH):
+    """Randurile pentru `ids` (in ordinea data), doar cu coloanele cerute."""
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return open_store(path).gather(ids, columns)
+
+    df = pd.read_csv(csv_path, usecols=lambda c: c in columns or c == "id").set_index("id")
+    return df.loc[[i for i in ids if i in df.index]].reset_index()[columns]
+
+
+def export_csv(path=STORE_PATH, csv_path=CSV_PATH):
+    open_store(path).to_dataframe().to_csv(csv_path, index=False)
+
+
+if __name__ == "__main__":
+    # Construieste store-ul dintr-un properties_clean.csv existent
+    df = pd.read_csv(CSV_PATH)
+    write_property_store(df, STORE_PATH)
+    print(f"Store coloanar generat: {STORE_PATH}/ ({len(df)} proprietati)")
@@ -0,0 +1,256 @@
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+from property_store import STORE_PATH, open_store
+
+# PARSER PENTRU INTEROGARI (filtrele din textul cautarii)
+
+# O singura trecere peste token-urile interogarii, fara diacritice si cu litere mici:
+#   - un trie pe cuvinte recunoaste cea mai lunga fraza cunoscuta de la pozitia
+#     curenta: cartiere si orase (vocabularul vine din store, nu e scris in cod),
+#     tipuri de proprietate si cuvinte-cheie ("minim", "pana la", "intre", "buget")
+#   - numerele (120.000, 1,5 mil, 120k, "doua") se leaga de unitatea care le urmeaza
+#     (camere, mp, euro) sau de cuvantul-cheie dinainte ("buget 90000")
+# Match-ul e pe cuvinte intregi, deci "titan" nu se potriveste in "titanic", iar
+# costul nu creste cu numarul de cartiere. Rezultatele se tin intr-un cache LRU:
+# aceleasi interogari (ex: din app.py) nu se mai parseaza a doua oara.
+#
+# Filtrele intoarse (toate optionale):
+#   property_type, neighborhood, city, rooms, size_sqm (suprafata fara calificativ),
+#   size_min, size_max, price_min, price_max
+
+CACHE_SIZE = 4096
+
+# Folosite cand nu exista store (ex: inainte de data_preprocessing.py)
+DEFAULT_NEIGHBORHOODS = ["Titan", "Militari", "Dristor", "Berceni", "Aviatiei", "Pipera", "Drumul Taberei"]
+
+PROPERTY_TYPE_WORDS = {
+    "apartment": ["apartament", "apartamente", "apartamentul", "apt", "ap", "apartment", "apartments",
+                  "garsoniera", "garsoniere", "studio", "penthouse"],
+    "house": ["casa", "case", "casuta", "vila", "vile", "house", "houses", "duplex"],
+    "land": ["teren", "terenuri", "terenul", "land", "lot", "parcela"],
+}
+# Garsoniera = apartament cu o camera
+ONE_ROOM_WORDS = {"garsoniera", "garsoniere", "studio"}
+
+ROOM_UNITS = {"camere", "camera", "cam", "camerei", "rooms", "room", "odai"}
+SIZE_UNITS = {"mp", "m2", "mpu", "metri", "sqm", "m"}
+PRICE_UNITS = {"euro", "eur", "€"}
+# "10 min de metrou": minutele nu sunt nici filtru, nici calificativul "min"
+TIME_UNITS = {"min", "minute", "minut"}
+MULTIPLIERS = {"k": 1_000, "mii": 1_000, "mie": 1_000, "mil": 1_000_000, "milion": 1_000_000,
+               "milioane": 1_000_000, "m": 1_000_000}
+NUMBER_WORDS = {"unu": 1, "una": 1, "doua": 2, "doi": 2, "trei": 3, "patru": 4, "cinci": 5,
+                "sase": 6, "sapte": 7, "opt": 8}
+
+# Calificativele care leaga urmatorul numar de un minim sau un maxim
+QUALIFIERS = {
+    "min": ["minim", "minimum", "min", "peste", "cel putin", "de la", "mai mult de", "mai mare de",
+            "macar", "from", "over", "at least"],
+    "max": ["maxim", "maximum", "max", "sub", "pana la", "pana in", "cel mult", "mai putin de",
+            "mai mic de", "under", "up to", "below"],
+    "between": ["intre", "between"],
+}
+# Dupa aceste cuvinte, un numar fara unitate e un pret ("buget 90000")
+PRICE_WORDS = ["buget", "bugetul", "pret", "pretul", "budget", "price", "valoare"]
+
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[a-z]+\d*|€")
+
+
+def _fold_table():
+    # Litere latine cu diacritice (Latin-1 + Latin Extended-A/B) -> litera de baza
+    table = {}
+    for code in range(0xC0, 0x250):
+        base = unicodedata.normalize("NFKD", chr(code))[0]
+        if base.isascii() and base.isalpha():
+            table[code] = base.lower()
+    table[ord("²")] = "2"
+    return table
+
+
+FOLD_TABLE = _fold_table()
+
+
+def fold(text):
+    """Litere mici, fara diacritice (ș/ş -> s, ț/ţ -> t, ă/â -> a, î -> i)."""
+    return text.lower().translate(FOLD_TABLE)
+
+
+def parse_number(token):
+    """'120.000' / '1.200.000' -> separatori de mii; '1,5' / '1.5' -> zecimal."""
+    parts = re.split(r"[.,]", token)
+    if len(parts) > 1 and all(len(p) == 3 for p in parts[1:]):
+        return float("".join(parts))
+    if len(parts) == 2:
+        return float(f"{parts[0]}.{parts[1]}")
+    return float(parts[0])
+
+
+def _clean_number(value):
+    return int(value) if value == int(value) else value
+
+
+class QueryParser:
+    """Parser compilat o singura data pentru un vocabular de cartiere si orase."""
+
+    def __init__(self, neighborhoods=DEFAULT_NEIGHBORHOODS, cities=(), cache_size=CACHE_SIZE):
+        self.neighborhoods = list(neighborhoods)
+        self.cities = list(cities)
+        self.trie = {}
+        for ptype, words in PROPERTY_TYPE_WORDS.items():
+            for word in words:
+                self._insert(word, ("type", ptype, word))
+        for kind, phrases in QUALIFIERS.items():
+            for phrase in phrases:
+                self._insert(phrase, ("qualifier", kind, phrase))
+        for word in PRICE_WORDS:
+            self._insert(word, ("price_word", None, word))
+        # Cartierele si orasele vin ultimele: un nume de loc castiga in fata unui cuvant comun
+        for city in cities:
+            self._insert(city, ("city", city, city))
+        for nb in neighborhoods:
+            self._insert(nb, ("neighborhood", nb, nb))
+
+        self._parse_cached = lru_cache(maxsize=cache_size)(self._parse)
+
+    @classmethod
+    def from_store(cls, path=STORE_PATH, **kwargs):
+        """Vocabularul (cartiere, orase) din categoriile store-ului; cel implicit daca store-ul lipseste."""
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return cls(**kwargs)
+        store = open_store(path)
+        return cls(store.categories("neighborhood"), store.categories("city"), **kwargs)
+
+    def _insert(self, phrase, entry):
+        words = TOKEN_RE.findall(fold(phrase))
+        if not words:
+            return
+        node = self.trie
+        for word in words:
+            node = node.setdefault(word, {})
+        node[None] = entry
+
+    def _match(self, tokens, start):
+        """Cea mai lunga fraza din trie care incepe la tokens[start]: (intrare, lungime) sau (None, 0)."""
+        node, best, length = self.trie, None, 0
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if None in node:
+                best, length = node[None], i - start + 1
+        return best, length
+
+    def parse(self, text):
+        """Filtrele extrase din text (dict nou la fiecare apel, rezultatul e tinut in cache)."""
+        return dict(self._parse_cached(text))
+
+    def cache_info(self):
+        return self._parse_cached.cache_info()
+
+    def _parse(self, text):
+        tokens = TOKEN_RE.findall(fold(text))
+        filters = {}
+        qualifier = None
+        price_context = False
+        between = None
+        i = 0
+
+        while i < len(tokens):
+            token = tokens[i]
+
+            if token[0].isdigit() or token in NUMBER_WORDS:
+                value = NUMBER_WORDS[token] if token in NUMBER_WORDS else parse_number(token)
+                i += 1
+                # "m" e multiplicator doar in "1,2 m euro"; altfel sunt metri
+                if i < len(tokens) and tokens[i] in MULTIPLIERS and (
+                        tokens[i] != "m" or i + 1 < len(tokens) and tokens[i + 1] in PRICE_UNITS):
+                    value *= MULTIPLIERS[tokens[i]]
+                    i += 1
+
+                unit = None
+                if i < len(tokens):
+                    if tokens[i] in ROOM_UNITS:
+                        unit = "rooms"
+                    elif tokens[i] in SIZE_UNITS:
+                        unit = "size"
+                    elif tokens[i] in PRICE_UNITS:
+                        unit = "price"
+                    elif tokens[i] in TIME_UNITS:
+                        unit = "time"
+                    if unit:
+                        i += 1
+                if unit == "time":
+                    continue
+                # "intre 50 si 70 mp": primul numar asteapta unitatea celui de-al doilea
+                if qualifier == "between" and between is None and unit is None:
+                    between = value
+                    if i < len(tokens) and tokens[i] in ("si", "and", "-"):
+                        i += 1
+                    continue
+                # Fara unitate: pret dupa "buget" / "pret" sau daca e prea mare pentru
+                # altceva (sub 5000 euro nu exista anunturi, vezi data_preprocessing.py)
+                if unit is None and (price_context or value >= 5000):
+                    unit = "price"
+
+                self._assign(filters, unit, value, qualifier, between)
+                qualifier, between = None, None
+                price_context = False
+                continue
+
+            entry, length = self._match(tokens, i)
+            if entry is None:
+                i += 1
+                continue
+            kind, value, phrase = entry
+            i += length
+            if kind == "type":
+                filters.setdefault("property_type", value)
+                if phrase in ONE_ROOM_WORDS:
+                    filters.setdefault("rooms", 1)
+            elif kind in ("neighborhood", "city"):
+                filters.setdefault(kind, value)
+            elif kind == "qualifier":
+                qualifier, between = value, None
+            elif kind == "price_word":
+                price_context = True
+
+        return filters
+
+    @staticmethod
+    def _assign(filters, unit, value, qualifier, between):
+        if unit == "rooms":
+            if value == int(value) and 0 < value < 20:
+                filters.setdefault("rooms", int(value))
+        elif unit in ("size", "price"):
+            prefix = "size" if unit == "size" else "price"
+            if between is not None:
+                low, high = sorted((between, value))
+                filters[f"{prefix}_min"] = _clean_number(low)
+                filters[f"{prefix}_max"] = _clean_number(high)
+            elif qualifier == "min":
+                filters[f"{prefix}_min"] = _clean_number(value)
+            elif qualifier == "max" or unit == "price":
+                # Un pret fara calificativ e bugetul
+                filters[f"{prefix}_max"] = _clean_number(value)
+            else:
+                filters.setdefault("size_sqm", _clean_number(value))
+
+
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+
+def get_parser(path=STORE_PATH):
+    """Parser-ul construit o singura data per proces (vocabularul din store-ul path)."""
+    with _parsers_lock:
+        if path not in _parsers:
+            _parsers[path] = QueryParser.from_store(path)
+        return _parsers[path]
+
+
+def parse_query(text, path=STORE_PATH):
+    return get_parser(path).parse(text)
@@ -0,0 +1,147 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from property_store import build_id_index, lookup_rows
+
+# TABEL DE FEATURES PENTRU RERANKING
+
+# Tot ce foloseste rerank_batch despre un candidat, ca array-uri numpy aliniate
+# cu ordinea randurilor din indexul vectorial:
+#   - property_type / city / neighborhood: coduri int32 (-1 = lipsa)
+#   - neighborhood_key: cod al numelui cartierului cu litere mici (pentru match-ul
+#     cu filtrul din interogare, fara .lower() pe stringuri la fiecare cautare)
+#   - price_eur, size_sqm, price_per_sqm, rooms, lat, lon: float64 (NaN = lipsa)
+# Tabelul e scris de build_embeddings.py in acelasi director cu indexul vectorial
+# si poarta build_id-ul acestuia, ca cele doua sa nu poata ajunge nesincronizate.
+
+FEATURES_VERSION = 2
+FEATURES_META = "rerank.json"
+
+CODED_COLUMNS = ["property_type", "city", "neighborhood"]
+NUMERIC_COLUMNS = ["price_eur", "size_sqm", "price_per_sqm", "rooms", "lat", "lon"]
+
+
+def build_rerank_table(frame, ids=None):
+    """
+    frame: DataFrame indexat dupa id, cu coloanele din CODED_COLUMNS si NUMERIC_COLUMNS
+           (rooms, lat, lon pot lipsi)
+    ids: ordinea randurilor din tabel (ex: cea a indexului vectorial); implicit frame.index
+    """
+    ids = np.asarray(frame.index if ids is None else ids, dtype=np.int64)
+    source_rows = frame.index.get_indexer(ids)
+    present = source_rows >= 0
+    take = np.where(present, source_rows, 0)
+
+    def column(col, dtype, fill):
+        if col not in frame.columns or len(frame) == 0:
+            return np.full(len(ids), fill, dtype=dtype)
+        return frame[col].to_numpy(dtype=dtype, na_value=fill)[take]
+
+    id_index = build_id_index(ids)
+    table = {
+        "ids": ids,
+        "present": present,
+        "id_index_kind": id_index["kind"],
+        "id_index": id_index["array"],
+        "categories": {},
+    }
+
+    for col in CODED_COLUMNS:
+        raw = column(col, object, None)
+        missing = ~present | pd.isna(raw)
+        strings = np.where(missing, None, raw.astype(str))
+        categories = sorted(set(strings[~missing].tolist()))
+        table[f"{col}_code"] = pd.Categorical(strings, categories=categories).codes.astype(np.int32)
+        table["categories"][col] = categories
+
+    keys = sorted({c.lower() for c in table["categories"]["neighborhood"]})
+    key_of_code = np.array([keys.index(c.lower()) for c in table["categories"]["neighborhood"]] + [-1],
+                           dtype=np.int32)
+    table["neighborhood_key_code"] = key_of_code[table["neighborhood_code"]]
+    table["neighborhood_keys"] = keys
+
+    for col in NUMERIC_COLUMNS:
+        table[col] = np.where(present, column(col, np.float64, np.nan), np.nan)
+
+    return finalize_table(table)
+
+
+def finalize_table(table):
+    """Structurile derivate (dict-uri de cautare, etichete), comune pentru build si load."""
+    table["neighborhood_lookup"] = {k: i for i, k in enumerate(table["neighborhood_keys"])}
+    # Eticheta pentru codul -1 e ultimul element ("nan"), ca la str(NaN) din pandas
+    table["labels"] = {
+        col: np.array(list(table["categories"][col]) + ["nan"], dtype=object)
+        for col in CODED_COLUMNS
+    }
+    return table
+
+
+def candidate_rows(table, ids):
+    """Randurile din tabel pentru id-urile candidatilor (-1 = lipsa / padding)."""
+    rows = lookup_rows(table["id_index_kind"], table["id_index"], ids)
+    inside = rows >= 0
+    rows[inside] = np.where(table["present"][rows[inside]], rows[inside], -1)
+    return rows
+
+
+def save_rerank_table(table, path, build_id=None):
+    """Scrie tabelul in directorul path (de obicei directorul indexului vectorial)."""
+    os.makedirs(path, exist_ok=True)
+    np.asarray(table["ids"], dtype=np.int64).tofile(os.path.join(path, "rerank_ids.bin"))
+    np.asarray(table["present"], dtype=np.uint8).tofile(os.path.join(path, "rerank_present.bin"))
+    np.asarray(table["id_index"], dtype=np.int64).tofile(os.path.join(path, "rerank_id_index.bin"))
+    for col in CODED_COLUMNS + ["neighborhood_key"]:
+        np.asarray(table[f"{col}_code"], dtype=np.int32).tofile(os.path.join(path, f"rerank_{col}.bin"))
+    for col in NUMERIC_COLUMNS:
+        np.asarray(table[col], dtype=np.float64).tofile(os.path.join(path, f"rerank_{col}.bin"))
+
+    meta = {
+        "version": FEATURES_VERSION,
+        "build_id": build_id,
+        "n_rows": len(table["ids"]),
+        "id_index": {"kind": table["id_index_kind"], "length": len(table["id_index"])},
+        "categories": table["categories"],
+        "neighborhood_keys": table["neighborhood_keys"],
+    }
+    with open(os.path.join(path, FEATURES_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+
+def load_rerank_table(path, build_id=None):
+    """
+    Tabelul scris de save_rerank_table, memory-mapped. Intoarce None daca lipseste,
+    are alta versiune sau nu corespunde build_id-ului indexului vectorial.
+    """
+    meta_path = os.path.join(path, FEATURES_META)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["version"] != FEATURES_VERSION or (build_id is not None and meta["build_id"] != build_id):
+        return None
+
+    n_rows = meta["n_rows"]
+
+    def memmap(name, dtype, length=n_rows):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        # np.asarray: ndarray simplu peste acelasi mmap (indexarea pe np.memmap e mai lenta)
+        return np.asarray(np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(length,)))
+
+    table = {
+        "ids": memmap("rerank_ids.bin", np.int64),
+        "present": memmap("rerank_present.bin", np.uint8).astype(bool),
+        "id_index_kind": meta["id_index"]["kind"],
+        "id_index": memmap("rerank_id_index.bin", np.int64, meta["id_index"]["length"]),
+        "categories": meta["categories"],
+        "neighborhood_keys": meta["neighborhood_keys"],
+    }
+    for col in CODED_COLUMNS + ["neighborhood_key"]:
+        table[f"{col}_code"] = memmap(f"rerank_{col}.bin", np.int32)
+    for col in NUMERIC_COLUMNS:
+        table[col] = memmap(f"rerank_{col}.bin", np.float64)
+    return finalize_table(table)
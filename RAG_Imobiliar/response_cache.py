@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import metrics
+from lexical_index import LEXICAL_DIR
+from market_stats import STATS_DIR
+from property_store import STORE_PATH
+from query_parser import fold
+from spatial_index import SPATIAL_DIR
+from sqlite_cache import SQLiteCache
+
+# CACHE DE RASPUNSURI (comparabile + estimare)
+
+# Raspunsul complet pentru o evaluare (comparabilele dupa reranking si estimarea de
+# pret), pastrat in SQLite (sqlite_cache.py), deci partajat intre sesiunile Streamlit
+# si intre procese, cu limita de intrari (LRU) si rata de hit comuna.
+# Cheia e SHA-256 peste intrarile normalizate (texte fara diacritice, litere mici,
+# spatii comprimate; numere intregi fara ".0") si versiunea datelor: stampila
+# indexului (build_embeddings.py scrie una noua la fiecare rulare) plus marimea si
+# mtime-ul fisierelor meta.json ale artefactelor de care depinde raspunsul (store-ul,
+# statisticile de piata, indexul spatial, indexul vectorial cu tabelul de reranking,
+# indexul lexical). Toate se rescriu atomic la reconstruire, deci dupa o reindexare
+# sau o noua rulare a data_preprocessing.py intrarile vechi nu mai sunt gasite si
+# ies treptat prin LRU.
+
+RESPONSE_CACHE_PATH = os.path.join("cache", "responses.sqlite")
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_SIZE = 5000
+
+VECTOR_STORE_PATH = "vector_store"
+INDEX_VERSION_FILE = "index_version.json"
+
+
+def bump_index_version(vector_store_path=VECTOR_STORE_PATH):
+    """Scrie o stampila noua de versiune (apelat de build_embeddings.py la fiecare reindexare)."""
+    os.makedirs(vector_store_path, exist_ok=True)
+    path = os.path.join(vector_store_path, INDEX_VERSION_FILE)
+    stamp = {"version": uuid.uuid4().hex, "built_at": time.time()}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, path)
+    return stamp["version"]
+
+
+def read_index_version(vector_store_path=VECTOR_STORE_PATH):
+    """Stampila curenta (None daca indexul a fost construit inainte sa existe stampila)."""
+    path = os.path.join(vector_store_path, INDEX_VERSION_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def normalize_value(value):
+    if isinstance(value, str):
+        return " ".join(fold(value).split())
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return int(value) if value.is_integer() else round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    return str(value)
+
+
+class ResponseCache:
+    """
+    Cache de raspunsuri invalidat la reconstruirea indexului sau a store-ului.
+
+    inputs (la get / set): dict cu tot ce determina raspunsul (interogare, k,
+    suprafata, pret, tip, cartier, ...); ordinea cheilor nu conteaza.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE,
+                 vector_store_path=VECTOR_STORE_PATH, store_path=STORE_PATH):
+        self.cache = SQLiteCache(path, ttl=ttl, max_entries=max_entries)
+        self.vector_store_path = vector_store_path
+        # Fisierele a caror schimbare invalideaza raspunsurile salvate
+        self.version_paths = [
+            os.path.join(vector_store_path, INDEX_VERSION_FILE),
+            os.path.join(vector_store_path, "matrix_index", "meta.json"),
+            os.path.join(vector_store_path, LEXICAL_DIR, "meta.json"),
+            os.path.join(store_path, "meta.json"),
+            os.path.join(store_path, STATS_DIR, "meta.json"),
+            os.path.join(store_path, SPATIAL_DIR, "meta.json"),
+        ]
+        self._version = (None, None)
+
+    def _signatures(self):
+        signatures = []
+        for path in self.version_paths:
+            try:
+                stat = os.stat(path)
+                signatures.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signatures.append(None)
+        return signatures
+
+    def version(self):
+        # Un stat per fisier la fiecare cerere; stampila se recalculeaza doar la schimbare
+        signatures = self._signatures()
+        if signatures != self._version[0]:
+            payload = json.dumps({"index": read_index_version(self.vector_store_path), "files": signatures})
+            self._version = (signatures, hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16])
+        return self._version[1]
+
+    def key(self, inputs):
+        payload = json.dumps({"data_version": self.version(), "inputs": normalize_value(inputs)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, inputs):
+        """Raspunsul salvat pentru inputs (la versiunea curenta a datelor) sau None."""
+        with metrics.span("response_cache.get"):
+            response = self.cache.get(self.key(inputs))
+        metrics.incr("response_cache.hits" if response is not None else "response_cache.misses")
+        return response
+
+    def set(self, inputs, response):
+        self.cache.set(self.key(inputs), response)
+
+    def get_or_compute(self, inputs, compute):
+        """(raspuns, hit): din cache sau calculat cu compute() si salvat."""
+        response = self.get(inputs)
+        if response is not None:
+            return response, True
+        response = compute()
+        self.set(inputs, response)
+        return response, False
+
+    def stats(self):
+        return dict(self.cache.stats(), index_version=read_index_version(self.vector_store_path),
+                    data_version=self.version())
+
+    def clear(self):
+        self.cache.clear()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Cache-ul de raspunsuri al procesului (acelasi fisier SQLite pentru toate procesele)."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -1,152 +1,811 @@
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import chromadb
-import re
+import atexit
 import json
+import os
+import threading
+import time
+
+import metrics
+from embedding_cache import EmbeddingCache
+from lexical_index import LEXICAL_DIR, load_lexical_index
+from property_store import STORE_PATH, load_properties
+from query_parser import get_parser
+from rerank_features import build_rerank_table, candidate_rows
+from rerank_features import load_rerank_table as load_features_table
+from spatial_index import distance_m, load_spatial_index
 
 # LOAD MODEL + VECTOR STORE
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Initializare Chroma
-chroma_client = chromadb.PersistentClient(path="vector_store")
-
-# Preia colectia
-collection = chroma_client.get_or_create_collection(
-    name="real_estate_properties",
-    metadata={"hnsw:space": "cosine"}
-)
-
-df = pd.read_csv("properties_clean.csv")
-df = df.set_index("id")
-
-# FILTER EXTRACTION
-
-def extract_filters(user_query: str):
-    q = user_query.lower()
-    filters = {}
-
-    # Property type
-    if "apartament" in q:
-        filters["property_type"] = "apartment"
-    elif "casa" in q or "vila" in q or "vilă" in q:
-        filters["property_type"] = "house"
-    elif "teren" in q:
-        filters["property_type"] = "land"
-
-    # Rooms
-    m = re.search(r"(\d+)\s*cam", q)
-    if m:
-        filters["rooms"] = int(m.group(1))
-
-    # Price max
-    m = re.search(r"(\d{2,6})\s*euro", q)
-    if m:
-        filters["price_max"] = int(m.group(1))
-
-    # Neighborhood detection
-    neighborhoods = ["titan", "militari", "dristor", "berceni", "aviatiei", "pipera", "drumul taberei"]
-    for nb in neighborhoods:
-        if nb in q:
-            filters["neighborhood"] = nb.title()
-
-    return filters
+# Modelul, Chroma si CSV-ul se incarca la prima utilizare, nu la import,
+# ca extract_filters si restul utilitarelor sa porneasca instant
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+VECTOR_STORE_PATH = "vector_store"
+COLLECTION_NAME = "real_estate_properties"
+PROPERTIES_PATH = STORE_PATH
+
+# Coloanele din store de care are nevoie regasirea (fara textele lungi)
+PROPERTY_COLUMNS = ["property_type", "city", "neighborhood", "price_eur",
+                    "size_sqm", "price_per_sqm", "rooms", "lat", "lon"]
+EMBEDDING_CACHE_SIZE = 10_000
+
+# Backend-ul de cautare vectoriala (vezi vector_index.py):
+#   "chroma" - colectia Chroma
+#   "matrix" - matricea exportata, cautare exacta in proces
+#   "ivf"    - matricea exportata, cautare aproximativa pe liste IVF
+#   "auto"   - indexul exportat daca exista, altfel Chroma
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "auto")
+
+# Modul de regasire (vezi lexical_index.py):
+#   "dense"   - doar embedding-uri (MiniLM)
+#   "hybrid"  - candidatii vectoriali + cei BM25, scor combinat (termenul LEXICAL_BONUS)
+#   "lexical" - doar BM25, fara model (interogarea nu mai trece prin transformer)
+#   "auto"    - hybrid daca exista indexul lexical, altfel dense
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "auto")
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical", "auto")
+
+
+class RetrievalContext:
+    """
+    Resursele folosite la regasire: modelul, colectia Chroma, tabelul de reranking
+    (rerank_table precalculat sau construit din df) si, optional, indexul spatial
+    (candidati dupa distanta pentru interogarile cu locatie) si indexul lexical BM25.
+    """
+
+    def __init__(self, model, collection, df=None, embedding_cache=None, rerank_table=None,
+                 spatial_index=None, lexical_index=None):
+        self.model = model
+        self.collection = collection
+        self.df = df
+        self.spatial_index = spatial_index
+        self.lexical_index = lexical_index
+        self.rerank_table = build_rerank_table(df) if rerank_table is None else rerank_table
+        if embedding_cache is None:
+            embedding_cache = EmbeddingCache(maxsize=EMBEDDING_CACHE_SIZE)
+        self.embedding_cache = embedding_cache
+
+    def encode_queries(self, texts, batch_size=64):
+        """Embedding-urile interogarilor, trecute prin cache-ul LRU."""
+        return self.embedding_cache.encode(
+            texts,
+            lambda missing: self.model.encode(missing, batch_size=batch_size)
+        )
 
-# RERANKING FUNCTION
+    @classmethod
+    def load(cls, model_name=MODEL_NAME, vector_store_path=VECTOR_STORE_PATH,
+             properties_path=PROPERTIES_PATH, embedding_cache_path=None, backend=None):
+        """
+        embedding_cache_path: fisier .npz optional in care cache-ul de
+        embedding-uri se pastreaza intre reporniri (salvat la iesirea procesului)
+        backend: "chroma", "matrix", "ivf" sau "auto" (implicit VECTOR_BACKEND)
+        """
+        # Cu RETRIEVAL_MODE=lexical modelul nu e folosit, deci nu il incarcam deloc
+        model = None
+        if RETRIEVAL_MODE != "lexical":
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name)
+        collection = open_vector_backend(backend or VECTOR_BACKEND, vector_store_path)
+
+        # Tabelul precalculat la indexare; fara el, il construim din store
+        rerank_table = load_rerank_table(vector_store_path)
+        df = None
+        if rerank_table is None:
+            df = load_properties(PROPERTY_COLUMNS, path=properties_path)
+            df = df.set_index("id")
+
+        embedding_cache = EmbeddingCache(maxsize=EMBEDDING_CACHE_SIZE, path=embedding_cache_path)
+        if embedding_cache_path:
+            atexit.register(embedding_cache.save)
+
+        # Scris de data_preprocessing.py in store; fara el, locatia conteaza doar la scor
+        spatial_index = load_spatial_index(properties_path)
+        # Scris de build_embeddings.py; fara el, regasirea ramane doar vectoriala
+        lexical_index = load_lexical_index(os.path.join(vector_store_path, LEXICAL_DIR))
+
+        return cls(model, collection, df, embedding_cache=embedding_cache, rerank_table=rerank_table,
+                   spatial_index=spatial_index, lexical_index=lexical_index)
+
+
+def open_vector_backend(backend, vector_store_path=VECTOR_STORE_PATH):
+    """Colectia Chroma sau un VectorIndex cu aceeasi interfata (query / get / count)."""
+    from vector_index import VectorIndex
+
+    index_path = os.path.join(vector_store_path, "matrix_index")
+    if backend == "auto":
+        if not os.path.exists(os.path.join(index_path, "meta.json")):
+            backend = "chroma"
+        else:
+            # IVF daca indexul a fost construit cu liste (catalog mare), altfel exact
+            return VectorIndex(index_path)
+
+    if backend == "matrix":
+        return VectorIndex(index_path, use_ivf=False)
+    if backend == "ivf":
+        return VectorIndex(index_path, use_ivf=True)
+    if backend != "chroma":
+        raise ValueError(f"Backend necunoscut: {backend}")
+
+    import chromadb
+
+    # Initializare Chroma
+    chroma_client = chromadb.PersistentClient(path=vector_store_path)
+
+    # Preia colectia
+    return chroma_client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        metadata={"hnsw:space": "cosine"}
+    )
 
-def rerank_results(raw_results, query_embedding, filters):
-    reranked = []
 
-    for item in raw_results:
-        prop_id = int(item["id"])
-        row = df.loc[prop_id]
+_context = None
+_context_lock = threading.Lock()
 
-        doc_emb = np.array(item["embedding"])
-        q_emb = np.array(query_embedding)
 
-        # Similaritate cosinus
-        similarity = float(
-            np.dot(q_emb, doc_emb) /
-            (np.linalg.norm(q_emb) * np.linalg.norm(doc_emb))
-        )
+def get_context():
+    """Intoarce contextul global, creat la primul apel (thread-safe)."""
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = RetrievalContext.load()
+    return _context
 
-        score = similarity
 
-        # Bonus pentru cartier identic
-        if "neighborhood" in filters:
-            if row["neighborhood"].lower() == filters["neighborhood"].lower():
-                score += 0.20
-            else:
-                score -= 0.10
+def set_context(context):
+    """Inlocuieste contextul global (ex: in teste, cu model si colectie false)."""
+    global _context
+    with _context_lock:
+        _context = context
 
-        # Penalizare pentru pret/mp diferit de "ideal"
-        if row["price_per_sqm"] > 0:
-            ideal_ppsqm = None
+# FILTER EXTRACTION
 
-            if "price_max" in filters and row["size_sqm"] > 0:
-                ideal_ppsqm = filters["price_max"] / row["size_sqm"]
+def extract_filters(user_query: str):
+    """Filtrele din textul interogarii (vezi query_parser.py; vocabularul de cartiere vine din store)."""
+    return get_parser(PROPERTIES_PATH).parse(user_query)
+
+# RERANKING TABLE
+
+# Features-urile candidatilor (coduri int + array-uri float) vin din rerank_features.py:
+# precalculate la build_embeddings.py langa indexul vectorial sau, daca lipsesc,
+# construite din tabelul de proprietati la pornire
+
+def load_rerank_table(vector_store_path=VECTOR_STORE_PATH):
+    """Tabelul de reranking scris odata cu indexul vectorial (None daca lipseste sau e vechi)."""
+    index_path = os.path.join(vector_store_path, "matrix_index")
+    meta_path = os.path.join(index_path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        build_id = json.load(f).get("build_id")
+    if build_id is None:
+        return None
+    return load_features_table(index_path, build_id=build_id)
 
-            if ideal_ppsqm:
-                diff = abs(row["price_per_sqm"] - ideal_ppsqm)
-                score -= min(diff / 5000, 0.15)
+# RERANKING FUNCTION
 
-        reranked.append({
+# Termenul de distanta din final_score, doar pentru interogarile cu locatie:
+# DISTANCE_BONUS * exp(-d / DISTANCE_SCALE_M) (0.15 langa tinta, ~0.02 la 2 km)
+DISTANCE_BONUS = 0.15
+DISTANCE_SCALE_M = 1000.0
+
+# Termenul lexical din final_score, in modul hybrid: LEXICAL_BONUS * scorul BM25
+# normalizat per interogare (1 pentru cel mai bun candidat lexical)
+LEXICAL_BONUS = 0.20
+
+def rerank_batch(query_embeddings, candidate_ids, candidate_embeddings, filters_list, k=None, table=None,
+                 locations=None, radius_m=None, lexical_scores=None, similarity=None):
+    """
+    Reranking vectorizat pentru Q interogari deodata.
+
+    query_embeddings: (Q, d) embedding-urile interogarilor
+    candidate_ids: (Q, N) id-urile candidatilor (-1 = pozitie goala / padding)
+    candidate_embeddings: (Q, N, d) embedding-urile candidatilor
+    filters_list: lista de Q dictionare, ca cele din extract_filters
+    k: cate rezultate pastram per interogare (None = toate)
+    locations: (Q, 2) lat/lon ale interogarilor (NaN = fara locatie); adauga termenul
+               de distanta in final_score si campul distance_m in rezultate
+    radius_m: cu locatie, candidatii mai departe de radius_m sunt eliminati
+    lexical_scores: (Q, N) scorurile BM25 ale candidatilor; adauga termenul lexical
+                    in final_score si campul lexical_score in rezultate
+    similarity: (Q, N) similaritatea deja calculata (ex: BM25 normalizat in modul
+                lexical); embedding-urile nu mai sunt folosite si pot fi None
+    """
+    table = get_context().rerank_table if table is None else table
+
+    if similarity is None:
+        q_emb = np.asarray(query_embeddings, dtype=np.float64)
+        if q_emb.ndim == 1:
+            q_emb = q_emb[None, :]
+        ids = np.asarray(candidate_ids, dtype=np.int64).reshape(q_emb.shape[0], -1)
+        doc_emb = np.asarray(candidate_embeddings, dtype=np.float64).reshape(ids.shape + (q_emb.shape[1],))
+
+        # Similaritate cosinus: un singur produs matriceal per interogare
+        dots = np.einsum("qnd,qd->qn", doc_emb, q_emb)
+        norms = np.linalg.norm(doc_emb, axis=2) * np.linalg.norm(q_emb, axis=1)[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = dots / norms
+    else:
+        similarity = np.asarray(similarity, dtype=np.float64)
+        ids = np.asarray(candidate_ids, dtype=np.int64).reshape(similarity.shape)
+    n_queries, n_cand = ids.shape
+
+    # Pozitiile in tabel (un singur gather pentru toti candidatii)
+    pos = candidate_rows(table, ids)
+    valid = (ids >= 0) & (pos >= 0)
+    pos = np.where(valid, pos, 0)
+
+    # Filtrele fiecarei interogari, ca vectori de lungime Q
+    has_nb = np.array(["neighborhood" in f for f in filters_list], dtype=bool)
+    nb_lookup = table["neighborhood_lookup"]
+    nb_target = np.array([nb_lookup.get(f.get("neighborhood", "").lower(), -2) for f in filters_list],
+                         dtype=np.int32)
+    has_pm = np.array(["price_max" in f for f in filters_list], dtype=bool)
+    price_max = np.array([f.get("price_max", 0) for f in filters_list], dtype=np.float64)
+
+    nb = table["neighborhood_key_code"][pos]
+    ppsqm = table["price_per_sqm"][pos]
+    size = table["size_sqm"][pos]
+
+    # Bonus pentru cartier identic
+    bonus = np.where(nb == nb_target[:, None], 0.20, -0.10)
+    bonus = np.where(has_nb[:, None], bonus, 0.0)
+
+    # Penalizare pentru pret/mp diferit de "ideal"
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ideal = price_max[:, None] / size
+    apply_penalty = has_pm[:, None] & (ppsqm > 0) & (size > 0) & (ideal != 0)
+    penalty = np.where(apply_penalty, np.minimum(np.abs(ppsqm - ideal) / 5000, 0.15), 0.0)
+
+    score = similarity + bonus - penalty
+
+    # Termen de distanta (decadere exponentiala) fata de locatia interogarii
+    distance = None
+    if locations is not None:
+        loc = np.asarray(locations, dtype=np.float64).reshape(n_queries, 2)
+        distance = distance_m(loc[:, :1], loc[:, 1:], table["lat"][pos], table["lon"][pos])
+        decay = DISTANCE_BONUS * np.exp(-distance / DISTANCE_SCALE_M)
+        score = score + np.where(np.isfinite(decay), decay, 0.0)
+        if radius_m is not None:
+            valid = valid & ~(distance > radius_m)
+
+    # Termen lexical (BM25), normalizat fata de cel mai bun candidat al interogarii
+    lexical = None
+    if lexical_scores is not None:
+        lexical = np.asarray(lexical_scores, dtype=np.float64).reshape(n_queries, n_cand)
+        best = np.where(valid, lexical, 0.0).max(axis=1, keepdims=True, initial=0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = score + LEXICAL_BONUS * np.where(best > 0, lexical / best, 0.0)
+
+    score = np.where(valid, score, -np.inf)
+
+    # Top-k: argpartition, apoi sortare stabila doar pe cele k pastrate
+    if k is None or k >= n_cand:
+        top = np.tile(np.arange(n_cand), (n_queries, 1))
+    else:
+        top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+        top.sort(axis=1)
+    top_scores = np.take_along_axis(score, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+
+    # Un singur gather pentru toate rezultatele pastrate, apoi le impartim pe interogari
+    keep = np.take_along_axis(valid, top, axis=1)
+    flat_q = np.broadcast_to(np.arange(n_queries)[:, None], top.shape)[keep]
+    flat_n = top[keep]
+    rows = pos[flat_q, flat_n]
+    labels = table["labels"]
+
+    records = [
+        {
             "id": int(prop_id),
-            "similarity": float(similarity),
-            "final_score": float(score),
-            "property_type": str(row["property_type"]),
-            "neighborhood": str(row["neighborhood"]),
-            "city": str(row["city"]),
-            "price_eur": int(row["price_eur"]),
-            "size_sqm": int(row["size_sqm"]),
-            "price_per_sqm": float(row["price_per_sqm"]),
-        })
-
-    # Sortare descrescatoare
-    reranked = sorted(reranked, key=lambda x: x["final_score"], reverse=True)
-    return reranked
-
-# MAIN RETRIEVAL FUNCTION
-
-def get_comparables(user_query: str, k=10):
-    print("\nUser query:", user_query)
+            "similarity": float(sim),
+            "final_score": float(sc),
+            "property_type": str(ptype),
+            "neighborhood": str(nb_name),
+            "city": str(city),
+            "price_eur": int(price),
+            "size_sqm": int(sqm),
+            "price_per_sqm": float(pp),
+        }
+        for prop_id, sim, sc, ptype, nb_name, city, price, sqm, pp in zip(
+            ids[flat_q, flat_n].tolist(),
+            similarity[flat_q, flat_n].tolist(),
+            score[flat_q, flat_n].tolist(),
+            labels["property_type"][table["property_type_code"][rows]],
+            labels["neighborhood"][table["neighborhood_code"][rows]],
+            labels["city"][table["city_code"][rows]],
+            table["price_eur"][rows].tolist(),
+            table["size_sqm"][rows].tolist(),
+            table["price_per_sqm"][rows].tolist(),
+        )
+    ]
+
+    if distance is not None:
+        for record, dist in zip(records, distance[flat_q, flat_n].tolist()):
+            record["distance_m"] = round(dist, 1) if dist == dist else None
+
+    if lexical is not None:
+        for record, lex in zip(records, lexical[flat_q, flat_n].tolist()):
+            record["lexical_score"] = round(lex, 4)
+
+    ends = np.cumsum(keep.sum(axis=1)).tolist()
+    results = [records[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+    return results
+
+
+def rerank_results(raw_results, query_embedding, filters, k=None):
+    if not raw_results:
+        return []
+
+    ids = [int(item["id"]) for item in raw_results]
+    embeddings = [item["embedding"] for item in raw_results]
+
+    return rerank_batch(
+        np.asarray(query_embedding)[None, :],
+        np.asarray(ids)[None, :],
+        np.asarray(embeddings)[None, :, :],
+        [filters],
+        k=k,
+    )[0]
+
+# QUERY TEXT
+
+def build_query_text(listing):
+    """Construieste textul de cautare pentru un anunt (dict cu coloanele din CSV)."""
+    parts = []
+    if listing.get("property_type") and listing["property_type"] != "any":
+        parts.append(str(listing["property_type"]))
+    # NaN (camere lipsa la terenuri) e adevarat ca bool, dar diferit de el insusi
+    if listing.get("rooms") and listing["rooms"] == listing["rooms"]:
+        parts.append(f"{int(listing['rooms'])} camere")
+    if listing.get("neighborhood"):
+        parts.append(str(listing["neighborhood"]))
+    if listing.get("city"):
+        parts.append(str(listing["city"]))
+    if listing.get("size_sqm"):
+        parts.append(f"{int(listing['size_sqm'])} mp")
+    if listing.get("price_eur"):
+        parts.append(f"buget {int(listing['price_eur'])} euro")
+    return " ".join(parts)
+
+def query_locations(queries):
+    """(Q, 2) lat/lon din anunturile date ca dict (NaN pentru restul); None daca niciunul nu are."""
+    locations = np.full((len(queries), 2), np.nan)
+    for qi, q in enumerate(queries):
+        if isinstance(q, dict):
+            locations[qi] = [pd.to_numeric(q.get("lat"), errors="coerce"),
+                             pd.to_numeric(q.get("lon"), errors="coerce")]
+    return locations if np.isfinite(locations).all(axis=1).any() else None
+
+# VECTOR SEARCH
+
+def _pad_query_results(results, dim):
+    # Chroma poate intoarce liste de lungimi diferite; le aducem la (Q, N)
+    ids_lists = results["ids"]
+    n_max = max((len(x) for x in ids_lists), default=0)
+    ids = np.full((len(ids_lists), n_max), -1, dtype=np.int64)
+    embs = np.zeros((len(ids_lists), n_max, dim), dtype=np.float32)
+
+    for qi, (q_ids, q_embs) in enumerate(zip(ids_lists, results["embeddings"])):
+        if len(q_ids):
+            ids[qi, :len(q_ids)] = np.asarray(q_ids, dtype=np.int64)
+            embs[qi, :len(q_ids)] = np.asarray(q_embs, dtype=np.float32)
+
+    return ids, embs
+
+
+# PRE-FILTERING (where-clause Chroma)
+
+# Toleranta fata de bugetul din interogare: comparabilele pot fi putin peste buget,
+# altfel estimarea de pret ar fi trasa in jos
+PRICE_MAX_TOLERANCE = 1.2
+
+# Filtrele care raman doar in reranking (nu intra in where-clause) la o evaluare: pretul
+# anuntului evaluat nu e un buget, iar taierea la PRICE_MAX_TOLERANCE x pretul cerut ar
+# face estimarea circulara (comparabilele n-ar putea iesi mult peste pretul verificat)
+VALUATION_SOFT_FILTERS = ("price_max",)
+
+# Ordinea in care renuntam la filtre cand sunt prea selective (primul = cel mai putin important)
+RELAX_ORDER = ["price_min", "price_max", "size_min", "size_max", "rooms", "neighborhood", "city",
+               "property_type"]
+
+
+def build_where(filters, dropped=()):
+    """Traduce filtrele din extract_filters intr-o clauza `where` Chroma (None = fara filtru)."""
+    conditions = []
+    if "property_type" in filters and "property_type" not in dropped:
+        conditions.append({"property_type": filters["property_type"]})
+    if "neighborhood" in filters and "neighborhood" not in dropped:
+        conditions.append({"neighborhood": filters["neighborhood"]})
+    if "city" in filters and "city" not in dropped:
+        conditions.append({"city": filters["city"]})
+    if "rooms" in filters and "rooms" not in dropped:
+        conditions.append({"rooms": int(filters["rooms"])})
+    if "size_min" in filters and "size_min" not in dropped:
+        conditions.append({"size_sqm": {"$gte": float(filters["size_min"])}})
+    if "size_max" in filters and "size_max" not in dropped:
+        conditions.append({"size_sqm": {"$lte": float(filters["size_max"])}})
+    if "price_min" in filters and "price_min" not in dropped:
+        conditions.append({"price_eur": {"$gte": float(filters["price_min"])}})
+    if "price_max" in filters and "price_max" not in dropped:
+        conditions.append({"price_eur": {"$lte": float(filters["price_max"]) * PRICE_MAX_TOLERANCE}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def relaxation_steps(filters):
+    """Clauzele where de incercat, de la cea mai stricta pana la niciun filtru."""
+    steps = [build_where(filters)]
+    dropped = []
+    for key in RELAX_ORDER:
+        if key in filters:
+            dropped.append(key)
+            steps.append(build_where(filters, dropped))
+    if steps[-1] is not None:
+        steps.append(None)
+    return steps
+
+
+def _query_collection(collection, q_embs, filters_list, n_results, min_results, prefilter=True):
+    """
+    Interogheaza colectia pentru toate embedding-urile. Cu prefilter, interogarile
+    cu aceeasi clauza where merg intr-un singur apel; cele care primesc mai putin de
+    min_results candidati trec la pasul urmator de relaxare (mai putine filtre).
+    """
+    n_queries = len(filters_list)
+    ids_lists = [[] for _ in range(n_queries)]
+    emb_lists = [[] for _ in range(n_queries)]
+
+    if prefilter:
+        steps = [relaxation_steps(f) for f in filters_list]
+    else:
+        steps = [[None] for _ in filters_list]
+    level = [0] * n_queries
+    pending = list(range(n_queries))
+
+    while pending:
+        groups = {}
+        for qi in pending:
+            where = steps[qi][level[qi]]
+            key = json.dumps(where, sort_keys=True)
+            groups.setdefault(key, (where, []))[1].append(qi)
+
+        still_pending = []
+        for where, idxs in groups.values():
+            query_args = {}
+            if where is not None:
+                query_args["where"] = where
+            results = collection.query(
+                query_embeddings=q_embs[idxs],
+                n_results=n_results,
+                include=["embeddings"],    # necesar pentru reranking
+                **query_args
+            )
+
+            for j, qi in enumerate(idxs):
+                ids_lists[qi] = results["ids"][j]
+                emb_lists[qi] = results["embeddings"][j]
+                last_step = level[qi] == len(steps[qi]) - 1
+                if len(results["ids"][j]) < min_results and not last_step:
+                    level[qi] += 1
+                    still_pending.append(qi)
+
+        pending = still_pending
+
+    return {"ids": ids_lists, "embeddings": emb_lists}
+
+
+# CANDIDATI DUPA DISTANTA
+
+# Pentru interogarile cu locatie, pe langa candidatii semantici adaugam cei mai
+# apropiati SPATIAL_CANDIDATES vecini fizici (din indexul spatial, cu acelasi tip
+# de proprietate daca e cerut), ca reranking-ul sa nu depinda doar de ce a adus
+# cautarea vectoriala
+SPATIAL_CANDIDATES = 50
+
+
+def spatial_candidates(index, table, location, filters, n=SPATIAL_CANDIDATES, radius_m=None):
+    """Id-urile celor mai apropiati n vecini (cel mult radius_m), filtrati dupa tipul cerut."""
+    lat, lon = location
+    if not (np.isfinite(lat) and np.isfinite(lon)):
+        return np.zeros(0, dtype=np.int64)
+
+    # Cerem mai multi vecini cand filtram dupa tip, ca sa raman n dupa filtrare
+    want = n * 4 if "property_type" in filters else n
+    if radius_m is not None:
+        ids, _ = index.radius(lat, lon, radius_m, limit=want)
+    else:
+        ids, _ = index.nearest(lat, lon, want)
+
+    rows = candidate_rows(table, ids)
+    ids = ids[rows >= 0]
+    if "property_type" in filters:
+        categories = table["categories"]["property_type"]
+        wanted = categories.index(filters["property_type"]) if filters["property_type"] in categories else -2
+        ids = ids[table["property_type_code"][rows[rows >= 0]] == wanted]
+    return ids[:n]
+
+
+# CANDIDATI LEXICALI (BM25)
+
+# In modul hybrid, cei mai buni LEXICAL_CANDIDATES dupa BM25 se adauga la candidatii
+# vectoriali (ca si cei spatiali); in modul lexical sunt singurii candidati.
+# Filtrele din interogare se aplica pe tabelul de reranking, la fel ca build_where,
+# pe primii LEXICAL_POOL * n candidati BM25 (cu aceeasi relaxare ca _query_collection)
+LEXICAL_CANDIDATES = 50
+LEXICAL_POOL = 8
+
+
+def filter_mask(table, ids, filters, dropped=()):
+    """Echivalentul build_where pe tabelul de reranking: True pentru id-urile care trec filtrele."""
+    rows = candidate_rows(table, ids)
+    mask = rows >= 0
+    rows = np.where(mask, rows, 0)
+    active = {key: value for key, value in filters.items() if key not in dropped}
+
+    for col in ("property_type", "city"):
+        if col in active:
+            categories = table["categories"][col]
+            wanted = categories.index(active[col]) if active[col] in categories else -2
+            mask &= table[f"{col}_code"][rows] == wanted
+    if "neighborhood" in active:
+        wanted = table["neighborhood_lookup"].get(str(active["neighborhood"]).lower(), -2)
+        mask &= table["neighborhood_key_code"][rows] == wanted
+    if "rooms" in active:
+        mask &= table["rooms"][rows] == int(active["rooms"])
+    if "size_min" in active:
+        mask &= table["size_sqm"][rows] >= float(active["size_min"])
+    if "size_max" in active:
+        mask &= table["size_sqm"][rows] <= float(active["size_max"])
+    if "price_min" in active:
+        mask &= table["price_eur"][rows] >= float(active["price_min"])
+    if "price_max" in active:
+        mask &= table["price_eur"][rows] <= float(active["price_max"]) * PRICE_MAX_TOLERANCE
+    return mask
+
+
+def lexical_candidates(index, table, text, filters, n=LEXICAL_CANDIDATES, min_results=0, prefilter=True):
+    """
+    Id-urile celor mai buni n candidati dupa BM25 care trec filtrele. Daca raman mai
+    putin de min_results, renuntam la filtre in ordinea RELAX_ORDER.
+    """
+    ids, _ = index.search(text, n * LEXICAL_POOL if prefilter and filters else n)
+    if not prefilter:
+        return ids[:n]
+
+    steps = [[]]
+    for key in RELAX_ORDER:
+        if key in filters:
+            steps.append(steps[-1] + [key])
+    for step in steps:
+        kept = ids[filter_mask(table, ids, filters, step)]
+        if len(kept) >= min_results:
+            break
+    return kept[:n]
+
+
+def resolve_mode(mode, context):
+    """Modul efectiv de regasire ("auto" -> hybrid daca exista index lexical)."""
+    mode = RETRIEVAL_MODE if mode is None else mode
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Mod de regasire necunoscut: {mode} (optiuni: {', '.join(RETRIEVAL_MODES)})")
+    if mode == "auto":
+        return "hybrid" if context.lexical_index is not None else "dense"
+    if mode != "dense" and context.lexical_index is None:
+        raise ValueError(f"Modul {mode} cere indexul lexical (rulati build_embeddings.py)")
+    if mode != "lexical" and context.model is None:
+        raise ValueError(f"Modul {mode} cere modelul de embedding (contextul a fost incarcat fara model)")
+    return mode
+
+
+def _add_candidates(collection, results, extra_ids):
+    """Adauga la rezultatele cautarii vectoriale candidatii (spatiali, lexicali) care lipsesc, cu embedding-uri."""
+    wanted = sorted({int(i) for ids in extra_ids for i in ids})
+    if not wanted:
+        return results
+    fetched = collection.get(ids=[str(i) for i in wanted], include=["embeddings"])
+    emb_of = {int(i): e for i, e in zip(fetched["ids"], fetched["embeddings"])}
+
+    ids_lists, emb_lists = [], []
+    for q_ids, q_embs, extra in zip(results["ids"], results["embeddings"], extra_ids):
+        seen = {int(i) for i in q_ids}
+        new = [i for i in extra.tolist() if i not in seen and i in emb_of]
+        ids_lists.append(list(q_ids) + [str(i) for i in new])
+        emb_lists.append(list(q_embs) + [emb_of[i] for i in new])
+    return {"ids": ids_lists, "embeddings": emb_lists}
+
+
+def _search_lexical(texts, filters_list, k, n_results, context, prefilter=True, locations=None, radius_m=None,
+                    search_filters=None):
+    """Modul lexical: candidatii BM25 (+ spatiali), fara model si fara cautare vectoriala."""
+    search_filters = filters_list if search_filters is None else search_filters
+    with metrics.span("retrieval.lexical"):
+        id_lists = [lexical_candidates(context.lexical_index, context.rerank_table, t, f, n=max(n_results, k),
+                                       min_results=k, prefilter=prefilter)
+                    for t, f in zip(texts, search_filters)]
+    if locations is not None and context.spatial_index is not None:
+        with metrics.span("retrieval.spatial"):
+            for qi, (loc, f) in enumerate(zip(locations, search_filters)):
+                extra = spatial_candidates(context.spatial_index, context.rerank_table, loc, f, radius_m=radius_m)
+                id_lists[qi] = np.concatenate([id_lists[qi], extra[~np.isin(extra, id_lists[qi])]])
+
+    with metrics.span("retrieval.rerank"):
+        ids = np.full((len(texts), max((len(x) for x in id_lists), default=0)), -1, dtype=np.int64)
+        for qi, q_ids in enumerate(id_lists):
+            ids[qi, :len(q_ids)] = q_ids
+        bm25 = np.stack([context.lexical_index.score(t, q_ids) for t, q_ids in zip(texts, ids)])
+        # Similaritatea e scorul BM25 normalizat (1 pentru cel mai bun candidat)
+        best = bm25.max(axis=1, keepdims=True, initial=0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = np.where(best > 0, bm25 / best, 0.0)
+        return rerank_batch(None, ids, None, filters_list, k=k, table=context.rerank_table,
+                            locations=locations, radius_m=radius_m, similarity=similarity)
+
+
+def _search_batch(texts, k, n_results=50, encode_batch_size=64, context=None, prefilter=True,
+                  locations=None, radius_m=None, mode=None, soft_filters=None):
+    context = get_context() if context is None else context
+    mode = resolve_mode(mode, context)
+    metrics.incr("retrieval.queries", len(texts))
+
+    with metrics.span("retrieval.extract_filters"):
+        filters_list = [extract_filters(t) for t in texts]
+    # Filtrele pentru candidati (where-clause); reranking-ul le vede pe toate
+    search_filters = filters_list if soft_filters is None else [
+        {key: value for key, value in f.items() if key not in soft}
+        for f, soft in zip(filters_list, soft_filters)
+    ]
+    if mode == "lexical":
+        return filters_list, _search_lexical(texts, filters_list, k, n_results, context, prefilter=prefilter,
+                                             locations=locations, radius_m=radius_m,
+                                             search_filters=search_filters)
+
+    with metrics.span("retrieval.encode"):
+        q_embs = context.encode_queries(texts, batch_size=encode_batch_size)
+
+    with metrics.span("retrieval.vector_query"):
+        results = _query_collection(
+            context.collection, q_embs, search_filters,
+            n_results=n_results, min_results=k, prefilter=prefilter
+        )
 
-    filters = extract_filters(user_query)
-    print("Extracted filters:", filters)
+    if locations is not None and context.spatial_index is not None:
+        with metrics.span("retrieval.spatial"):
+            extra_ids = [
+                spatial_candidates(context.spatial_index, context.rerank_table, loc, f, radius_m=radius_m)
+                for loc, f in zip(locations, search_filters)
+            ]
+            results = _add_candidates(context.collection, results, extra_ids)
+
+    if mode == "hybrid":
+        with metrics.span("retrieval.lexical"):
+            extra_ids = [lexical_candidates(context.lexical_index, context.rerank_table, t, f, prefilter=prefilter)
+                         for t, f in zip(texts, search_filters)]
+            results = _add_candidates(context.collection, results, extra_ids)
+
+    with metrics.span("retrieval.rerank"):
+        ids, embs = _pad_query_results(results, q_embs.shape[1])
+        lexical_scores = None
+        if mode == "hybrid":
+            lexical_scores = np.stack([context.lexical_index.score(t, q_ids) for t, q_ids in zip(texts, ids)])
+        ranked = rerank_batch(q_embs, ids, embs, filters_list, k=k, table=context.rerank_table,
+                              locations=locations, radius_m=radius_m, lexical_scores=lexical_scores)
+    return filters_list, ranked
+
+# OUTPUT SINKS
+
+def save_comparables(comparables, path="comparables.json"):
+    # Scriere atomica (fisier temporar + os.replace), ca doua cereri paralele
+    # sa nu lase un fisier amestecat
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(comparables, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def json_file_sink(path="comparables.json"):
+    """Sink optional pentru get_comparables: salveaza rezultatul in fisier JSON."""
+    def sink(comparables):
+        save_comparables(comparables, path)
+    return sink
 
-    q_emb = model.encode([user_query])[0]
+# MAIN RETRIEVAL FUNCTION
 
-    # Query vector store
-    results = collection.query(
-        query_embeddings=[q_emb],
-        n_results=50,
-        include=["embeddings"]    # necesar pentru reranking
-    )
+@metrics.timed("retrieval.get_comparables")
+def get_comparables(user_query: str, k=10, sink=None, verbose=False, context=None, prefilter=True,
+                    location=None, radius_m=None, mode=None, soft_filters=()):
+    """
+    Regaseste top-k comparabile pentru o interogare, complet in memorie.
+
+    sink: functie optionala apelata cu rezultatul (ex: json_file_sink())
+    verbose: afiseaza interogarea si filtrele extrase
+    context: RetrievalContext explicit (implicit cel global, din get_context())
+    prefilter: aplica filtrele extrase direct in cautarea vectoriala (where-clause),
+               cu relaxare automata daca raman prea putini candidati
+    location: (lat, lon) optional; adauga vecinii fizici ca si candidati si
+              termenul de distanta in final_score
+    radius_m: cu location, pastreaza doar comparabilele aflate la cel mult radius_m
+    mode: "dense", "hybrid", "lexical" sau "auto" (implicit RETRIEVAL_MODE, vezi sus)
+    soft_filters: filtre folosite doar la reranking, nu si la pre-filtrare; pentru
+                  evaluarea unui anunt, VALUATION_SOFT_FILTERS (pretul lui nu e buget)
+    """
+    locations = None if location is None else np.asarray([location], dtype=np.float64)
+    filters_list, ranked = _search_batch([user_query], k, context=context, prefilter=prefilter,
+                                         locations=locations, radius_m=radius_m, mode=mode,
+                                         soft_filters=[soft_filters])
+    topk = ranked[0]
+
+    if verbose:
+        print("\nUser query:", user_query)
+        print("Extracted filters:", filters_list[0])
+
+    if sink is not None:
+        sink(topk)
 
-    # Construim lista
-    raw_items = []
-    for i in range(len(results["ids"][0])):
-        raw_items.append({
-            "id": int(results["ids"][0][i]),
-            "embedding": results["embeddings"][0][i],
-        })
+    return topk
 
-    # Reranking
-    ranked = rerank_results(raw_items, q_emb, filters)
-    topk = ranked[:k]
+# BATCH RETRIEVAL
+
+@metrics.timed("retrieval.get_comparables_many")
+def get_comparables_many(queries, k=10, batch_size=1024, n_results=50, encode_batch_size=64,
+                         verbose=True, context=None, prefilter=True, use_location=True, radius_m=None,
+                         mode=None, soft_filters=None):
+    """
+    Regaseste comparabile pentru mai multe interogari deodata.
+
+    queries: lista de texte sau de anunturi (dict cu property_type, neighborhood,
+             size_sqm, price_eur si optional lat, lon)
+    batch_size: cate interogari trimitem intr-un singur apel encode + Chroma
+    use_location: anunturile cu lat/lon primesc candidati si scor dupa distanta
+    radius_m, mode: vezi get_comparables
+    soft_filters: lista cu filtrele soft ale fiecarei interogari (vezi get_comparables);
+                  implicit VALUATION_SOFT_FILTERS pentru anunturi si niciunul pentru texte
+    Intoarce o lista cu cate o lista de comparabile pentru fiecare interogare.
+    """
+    texts = [q if isinstance(q, str) else build_query_text(q) for q in queries]
+    locations = query_locations(queries) if use_location else None
+    if soft_filters is None:
+        soft_filters = [() if isinstance(q, str) else VALUATION_SOFT_FILTERS for q in queries]
+
+    start = time.perf_counter()
+    all_results = []
+    for b in range(0, len(texts), batch_size):
+        _, ranked = _search_batch(
+            texts[b:b + batch_size], k,
+            n_results=n_results,
+            encode_batch_size=encode_batch_size,
+            context=context,
+            prefilter=prefilter,
+            locations=None if locations is None else locations[b:b + batch_size],
+            radius_m=radius_m,
+            mode=mode,
+            soft_filters=soft_filters[b:b + batch_size],
+        )
+        all_results.extend(ranked)
+    elapsed = time.perf_counter() - start
 
-    # Save output
-    with open("comparables.json", "w", encoding="utf-8") as f:
-        json.dump(topk, f, indent=4, ensure_ascii=False)
+    if verbose and texts:
+        print(f"Processed {len(texts)} queries in {elapsed:.2f}s "
+              f"({len(texts) / max(elapsed, 1e-9):.1f} queries/s)")
 
-    print("Saved: comparables.json")
-    return topk
+    return all_results
 
 # TEST
 
 if __name__ == "__main__":
-    res = get_comparables("apartament 2 camere titan buget 60000 euro")
+    res = get_comparables(
+        "apartament 2 camere titan buget 60000 euro",
+        sink=json_file_sink("comparables.json"),
+        verbose=True
+    )
+    print("Saved: comparables.json")
     print("\nTOP comparables:")
     for x in res:
         print(x, "\n")
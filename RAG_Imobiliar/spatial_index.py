@@ -0,0 +1,205 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from property_store import STORE_PATH, PropertyStore
+
+# INDEX SPATIAL (grila in metri)
+
+# Coordonatele sunt proiectate local (equirectangular, in jurul latitudinii medii a
+# catalogului) in metri si grupate pe celule de cell_m x cell_m: punctele sortate
+# dupa celula + offset-urile fiecarei celule (CSR). Cautarea pe raza citeste doar
+# celulele atinse de cerc; kNN mareste patratul de celule din jurul punctului pana
+# cand cele k puncte gasite sunt mai aproape decat marginea lui. La scara unui oras
+# eroarea proiectiei e sub 0.1%.
+# data_preprocessing.py scrie indexul in directorul store-ului (spatial/), deci e
+# inlocuit odata cu store-ul si nu poate ramane nesincronizat.
+
+SPATIAL_VERSION = 1
+SPATIAL_DIR = "spatial"
+CELL_M = 250.0
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Distanta in metri (aproximatie equirectangulara, vectorizata; NaN daca lipsesc coordonate)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_M * np.hypot(x, y)
+
+
+class SpatialIndex:
+    """Punctele (id, lat, lon) pe o grila in metri, cu cautare pe raza si k-nearest."""
+
+    def __init__(self, ids, lat, lon, cell_m=CELL_M):
+        ids = np.asarray(ids, dtype=np.int64)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+
+        self.cell_m = float(cell_m)
+        self.lat0 = float(lat[valid].mean()) if valid.any() else 0.0
+        x, y = self._project(lat[valid], lon[valid])
+        self.x0 = float(x.min()) if len(x) else 0.0
+        self.y0 = float(y.min()) if len(y) else 0.0
+
+        rows, cols = self._cell(x, y)
+        self.n_rows = int(rows.max()) + 1 if len(rows) else 1
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 1
+        keys = rows * self.n_cols + cols
+        order = np.argsort(keys, kind="stable")
+
+        self.ids = ids[valid][order]
+        self.x = x[order]
+        self.y = y[order]
+        self.cells, starts = np.unique(keys[order], return_index=True)
+        self.offsets = np.append(starts, len(order)).astype(np.int64)
+
+    @classmethod
+    def _from_arrays(cls, meta, ids, x, y, cells, offsets):
+        index = cls.__new__(cls)
+        for key in ("cell_m", "lat0", "x0", "y0", "n_rows", "n_cols"):
+            setattr(index, key, meta[key])
+        index.ids, index.x, index.y, index.cells, index.offsets = ids, x, y, cells, offsets
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _project(self, lat, lon):
+        x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(self.lat0))
+        y = np.radians(lat) * EARTH_RADIUS_M
+        return x, y
+
+    def _cell(self, x, y):
+        rows = np.floor((np.asarray(y) - self.y0) / self.cell_m).astype(np.int64)
+        cols = np.floor((np.asarray(x) - self.x0) / self.cell_m).astype(np.int64)
+        return rows, cols
+
+    def _positions(self, qx, qy, reach_m):
+        """Pozitiile punctelor din celulele atinse de patratul de latura 2*reach_m din jurul (qx, qy)."""
+        (r0, r1), (c0, c1) = self._cell([qx - reach_m, qx + reach_m], [qy - reach_m, qy + reach_m])
+        r0, c0 = max(r0, 0), max(c0, 0)
+        r1, c1 = min(r1, self.n_rows - 1), min(c1, self.n_cols - 1)
+        if r0 > r1 or c0 > c1 or len(self.cells) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        keys = (np.arange(r0, r1 + 1)[:, None] * self.n_cols + np.arange(c0, c1 + 1)[None, :]).ravel()
+        idx = np.searchsorted(self.cells, keys)
+        found = idx < len(self.cells)
+        found[found] = self.cells[idx[found]] == keys[found]
+        idx = idx[found]
+
+        # Concatenam intervalele celulelor fara bucla Python
+        starts = self.offsets[idx]
+        lengths = self.offsets[idx + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+    def radius(self, lat, lon, radius_m, limit=None):
+        """(ids, distante_m) ale punctelor aflate la cel mult radius_m, sortate crescator."""
+        qx, qy = self._project(lat, lon)
+        positions = self._positions(qx, qy, radius_m)
+        dist = np.hypot(self.x[positions] - qx, self.y[positions] - qy)
+        inside = dist <= radius_m
+        positions, dist = positions[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")[:limit]
+        return self.ids[positions[order]], dist[order]
+
+    def nearest(self, lat, lon, k, max_radius_m=None):
+        """(ids, distante_m) ale celor mai apropiate k puncte (optional doar pana la max_radius_m)."""
+        qx, qy = self._project(lat, lon)
+        max_reach = np.inf if max_radius_m is None else max_radius_m
+        # De la aceasta distanta, patratul cautat acopera toata grila
+        full = self.cell_m + max(abs(qx - self.x0), abs(qx - self.x0 - self.n_cols * self.cell_m),
+                                 abs(qy - self.y0), abs(qy - self.y0 - self.n_rows * self.cell_m))
+
+        reach = self.cell_m
+        while True:
+            reach = min(reach, max_reach)
+            positions = self._positions(qx, qy, reach)
+            dist = np.hypot(self.x[positions] - qx, self.y[positions] - qy)
+            if np.count_nonzero(dist <= reach) >= k or reach >= max_reach or reach >= full:
+                break
+            reach *= 2
+
+        # Punctele din afara patratului sunt la peste `reach` metri, deci cele
+        # pana la `reach` sunt exact cele mai apropiate
+        if reach < full:
+            inside = dist <= reach
+            positions, dist = positions[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")[:k]
+        return self.ids[positions[order]], dist[order]
+
+    def save(self, path):
+        """Scrie indexul in directorul path (atomic: director temporar + os.replace)."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        self.ids.astype(np.int64).tofile(os.path.join(tmp_path, "ids.bin"))
+        self.x.astype(np.float64).tofile(os.path.join(tmp_path, "x.bin"))
+        self.y.astype(np.float64).tofile(os.path.join(tmp_path, "y.bin"))
+        self.cells.astype(np.int64).tofile(os.path.join(tmp_path, "cells.bin"))
+        self.offsets.astype(np.int64).tofile(os.path.join(tmp_path, "offsets.bin"))
+        meta = {
+            "version": SPATIAL_VERSION,
+            "n_points": len(self.ids),
+            "n_cells": len(self.cells),
+            "cell_m": self.cell_m,
+            "lat0": self.lat0,
+            "x0": self.x0,
+            "y0": self.y0,
+            "n_rows": self.n_rows,
+            "n_cols": self.n_cols,
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Indexul scris de save(), memory-mapped; None daca lipseste sau are alta versiune."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SPATIAL_VERSION:
+            return None
+
+        def memmap(name, dtype, length):
+            if length == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.asarray(np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(length,)))
+
+        n_points, n_cells = meta["n_points"], meta["n_cells"]
+        return cls._from_arrays(
+            meta,
+            memmap("ids.bin", np.int64, n_points),
+            memmap("x.bin", np.float64, n_points),
+            memmap("y.bin", np.float64, n_points),
+            memmap("cells.bin", np.int64, n_cells),
+            memmap("offsets.bin", np.int64, n_cells + 1),
+        )
+
+
+def build_spatial_index(store_path=STORE_PATH, cell_m=CELL_M):
+    """Construieste indexul din coloanele id/lat/lon ale store-ului si il scrie in store_path/spatial."""
+    store = PropertyStore(store_path)
+    index = SpatialIndex(store.column("id"), store.column("lat"), store.column("lon"), cell_m=cell_m)
+    index.save(os.path.join(store_path, SPATIAL_DIR))
+    return index
+
+
+def load_spatial_index(store_path=STORE_PATH):
+    return SpatialIndex.load(os.path.join(store_path, SPATIAL_DIR))
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# CACHE CHEIE -> VALOARE PE DISC (SQLite)
+
+# Un singur fisier, partajat intre procese (WAL), cu expirare (TTL), limita de
+# intrari (se elimina cele folosite cel mai demult) si contoare de hit/miss
+# pastrate tot in baza, ca sa vedem rata de hit pentru toate procesele.
+#
+# SQLite are un singur writer, deci get() ramane o citire: `accessed` (pentru LRU)
+# se rescrie doar cand e mai vechi de ACCESS_RESOLUTION secunde, iar hit/miss se
+# aduna in memoria procesului si se scriu in baza la STATS_FLUSH_EVERY cereri,
+# dupa STATS_FLUSH_SECONDS sau la stats().
+
+ACCESS_RESOLUTION = 60.0
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_SECONDS = 10.0
+
+
+class SQLiteCache:
+    """
+    path: fisierul SQLite
+    ttl: secunde dupa care o intrare expira (None = nu expira)
+    max_entries: numarul maxim de intrari pastrate
+    """
+
+    def __init__(self, path, ttl=None, max_entries=10_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._pending = {"hits": 0, "misses": 0}
+        self._pending_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+
+    def _conn(self):
+        # sqlite3 nu permite partajarea conexiunii intre thread-uri: una per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name, n=1):
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = ?", (n, name))
+
+    def _record(self, name):
+        # Contor in memorie; scris in baza doar din cand in cand (vezi sus)
+        with self._pending_lock:
+            self._pending[name] += 1
+            due = (sum(self._pending.values()) >= STATS_FLUSH_EVERY
+                   or time.monotonic() - self._flushed_at >= STATS_FLUSH_SECONDS)
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Scrie in baza contoarele hit/miss adunate in memorie de la ultima scriere."""
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = {"hits": 0, "misses": 0}
+            self._flushed_at = time.monotonic()
+        if not any(pending.values()):
+            return
+        conn = self._conn()
+        with conn:
+            for name, n in pending.items():
+                if n:
+                    self._count(conn, name, n)
+
+    def get(self, key):
+        """Valoarea salvata (deserializata din JSON) sau None."""
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, created, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            self._record("misses")
+            return None
+
+        if now - row[2] > ACCESS_RESOLUTION:
+            with conn:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self._record("hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            evicted = conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            if evicted:
+                self._count(conn, "evictions", evicted)
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending = {"hits": 0, "misses": 0}
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE stats SET value = 0")
+
+    def purge_expired(self):
+        if self.ttl is None:
+            return 0
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                "DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+
+    def stats(self):
+        self.flush_stats()
+        conn = self._conn()
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        size = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = counters["hits"] + counters["misses"]
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "hit_rate": counters["hits"] / total if total else 0.0,
+        }
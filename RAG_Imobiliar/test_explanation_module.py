@@ -0,0 +1,83 @@
+import socket
+import unittest
+
+from explanation_module import OllamaClient, rule_based_explanation, stream_explanation
+from fake_ollama import DEFAULT_TEXT, FakeOllamaServer
+
+# Fallback-ul explicatiei fata de serverul fals din fake_ollama.py:
+#   python -m pytest test_explanation_module.py   (sau python -m unittest)
+
+DATA = {
+    "estimation": {
+        "fair_price": 54000.0,
+        "fair_ppsqm": 1000.0,
+        "confidence_interval": {"lower": 51300.0, "upper": 56700.0},
+        "verdict": "OVERPRICED",
+        "target_sqm": 54,
+    },
+    "comparables_used": [
+        {"id": 1, "neighborhood": "Titan", "price_per_sqm": 980.0, "size_sqm": 52, "final_score": 0.81},
+        {"id": 2, "neighborhood": "Titan", "price_per_sqm": 1020.0, "size_sqm": 57, "final_score": 0.77},
+    ],
+    "title": "Apartament 2 camere Titan",
+    "listed_price_eur": 60000,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StreamExplanationTest(unittest.IsolatedAsyncioTestCase):
+
+    async def explain(self, client, timeout=5.0):
+        result = {}
+        parts = [token async for token in stream_explanation(DATA, client=client, timeout=timeout, result=result)]
+        await client.close()
+        return "".join(parts), result
+
+    async def serve(self, **options):
+        server = await FakeOllamaServer(**options).start()
+        self.addAsyncCleanup(server.stop)
+        return OllamaClient(server.url, model="fake")
+
+    async def test_complete_response(self):
+        text, result = await self.explain(await self.serve())
+        self.assertEqual(text, DEFAULT_TEXT)
+        self.assertEqual(result["source"], "llm")
+
+    async def test_connection_dropped_mid_response(self):
+        text, result = await self.explain(await self.serve(drop_after=3))
+        self.assertEqual(result["source"], "rule_based")
+        self.assertTrue(result["truncated"])
+        self.assertTrue(text.endswith(rule_based_explanation(DATA)))
+
+    async def test_dropped_before_first_token(self):
+        text, result = await self.explain(await self.serve(drop_after=0))
+        self.assertEqual(result, {"source": "rule_based", "truncated": False})
+        self.assertEqual(text, rule_based_explanation(DATA))
+
+    async def test_slow_server(self):
+        text, result = await self.explain(await self.serve(delay=0.5), timeout=0.2)
+        self.assertEqual(result["source"], "rule_based")
+        self.assertIn(rule_based_explanation(DATA), text)
+
+    async def test_missing_server(self):
+        text, result = await self.explain(OllamaClient(f"http://127.0.0.1:{free_port()}", model="fake"))
+        self.assertEqual(result, {"source": "rule_based", "truncated": False})
+        self.assertEqual(text, rule_based_explanation(DATA))
+
+    async def test_connection_reused(self):
+        server = await FakeOllamaServer().start()
+        self.addAsyncCleanup(server.stop)
+        client = OllamaClient(server.url, model="fake")
+        for _ in range(3):
+            self.assertEqual(await client.generate("prompt", timeout=5.0), DEFAULT_TEXT)
+        await client.close()
+        self.assertEqual(server.connections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import pricing_model
+import retrieval
+from market_stats import load_market_stats
+
+# EVALUARE IN MASA A UNUI PORTOFOLIU
+#
+#   python valuate_portfolio.py targets.csv valuations.jsonl --workers 4
+#
+# Fisierul de intrare (CSV sau JSONL) are cate un anunt pe rand, cu coloanele din
+# properties_clean.csv (cel putin property_type, neighborhood, size_sqm, price_eur).
+# Intrarea e citita pe shard-uri, fiecare shard e evaluat intr-un proces din pool
+# (modelul si colectia se incarca o singura data per proces), iar rezultatele se
+# scriu pe masura ce shard-urile se termina. Checkpoint-ul retine shard-urile gata,
+# deci o rulare intrerupta se reia cu aceeasi comanda. Checkpoint-ul e legat de
+# fisierul de intrare (cale, marime, mtime): o intrare schimbata sau o rulare
+# terminata (checkpoint marcat complet) pornesc de la zero, ca la reevaluarea zilnica.
+
+SHARD_SIZE = 512
+# lat / lon: candidati spatiali si termenul de distanta; rooms / city: pre-filtrare
+TARGET_COLUMNS = ["id", "title", "property_type", "rooms", "neighborhood", "city", "size_sqm", "price_eur",
+                  "lat", "lon"]
+
+
+def iter_shards(input_path, shard_size=SHARD_SIZE):
+    """Citeste intrarea in bucati de shard_size anunturi (memorie limitata)."""
+    if input_path.endswith((".jsonl", ".ndjson")):
+        reader = pd.read_json(input_path, lines=True, chunksize=shard_size)
+    else:
+        reader = pd.read_csv(input_path, chunksize=shard_size)
+
+    for shard_id, chunk in enumerate(reader):
+        columns = [c for c in TARGET_COLUMNS if c in chunk.columns]
+        records = chunk[columns].astype(object).where(chunk[columns].notna(), None).to_dict("records")
+        yield shard_id, records
+
+
+def count_targets(input_path, chunksize=100_000):
+    """Numarul de anunturi; la CSV numaram randuri, nu linii (descrieri pe mai multe linii)."""
+    if input_path.endswith((".jsonl", ".ndjson")):
+        with open(input_path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    return sum(len(chunk) for chunk in pd.read_csv(input_path, usecols=[0], chunksize=chunksize))
+
+# WORKER
+
+_market = None
+
+
+def _init_worker():
+    # Incarcam modelul, colectia, tabelul si statisticile de piata o singura data per proces
+    global _market
+    retrieval.get_context()
+    _market = load_market_stats()
+
+
+def valuate_shard(shard_id, targets, k=10, exclude_self=True):
+    """Regasire + pricing pentru un shard; intoarce (shard_id, lista de rezultate)."""
+    # Un anunt din catalog se gaseste pe sine; cerem unul in plus si il eliminam
+    extra = 1 if exclude_self else 0
+    comparables = retrieval.get_comparables_many(targets, k=k + extra, verbose=False)
+
+    if exclude_self:
+        comparables = [
+            [c for c in comps if c["id"] != target.get("id")][:k]
+            for target, comps in zip(targets, comparables)
+        ]
+
+    # Aceeasi regula ca app.py si valuation_service.py (pricing_model.estimate_batch)
+    estimations = pricing_model.estimate_batch(
+        comparables, _market,
+        property_types=[t.get("property_type") for t in targets],
+        neighborhoods=[t.get("neighborhood") for t in targets],
+        target_sqm=[t.get("size_sqm") or None for t in targets],
+        target_price=[t.get("price_eur") or None for t in targets],
+    )
+
+    results = []
+    for target, comps, est in zip(targets, comparables, estimations):
+        results.append({
+            "decision_target_id": target.get("id"),
+            "title": target.get("title"),
+            "area": target.get("neighborhood"),
+            "listed_price_eur": target.get("price_eur"),
+            "fair_price_eur": est["fair_price"] if est else None,
+            "fair_range_eur": [est["confidence_interval"]["lower"], est["confidence_interval"]["upper"]]
+            if est else None,
+            "label": est["verdict"] if est else "UNKNOWN",
+            "comparables_used": [c["id"] for c in comps],
+        })
+    return shard_id, results
+
+# OUTPUT + CHECKPOINT
+
+class JsonlSink:
+    """Un singur fisier JSONL, completat la fiecare shard terminat."""
+
+    def __init__(self, path, resume_at=0):
+        self.path = path
+        self.f = open(path, "a+b")
+        # Taiem ce s-a scris dupa ultimul checkpoint (shard scris pe jumatate)
+        self.f.truncate(resume_at)
+        self.f.seek(resume_at)
+
+    def write(self, shard_id, results):
+        for r in results:
+            self.f.write((json.dumps(r, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8"))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def position(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetSink:
+    """Un fisier Parquet per shard intr-un director (necesita pyarrow)."""
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if fresh:
+            # Shard-urile unei rulari anterioare (posibil mai multe decat acum)
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith((".parquet", ".parquet.tmp")):
+                    os.remove(os.path.join(path, name))
+
+    def write(self, shard_id, results):
+        part = os.path.join(self.path, f"part-{shard_id:06d}.parquet")
+        frame = pd.DataFrame(results)
+        frame.to_parquet(part + ".tmp", index=False)
+        os.replace(part + ".tmp", part)
+
+    def position(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Nu se poate serializa {type(value)}")
+
+
+def input_stamp(input_path):
+    """Identitatea fisierului de intrare: cale absoluta, marime, mtime."""
+    stat = os.stat(input_path)
+    return {"path": os.path.abspath(input_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path, shard_size, stamp=None):
+    """
+    Intoarce (shard-urile terminate, pozitia in fisierul de iesire). Un checkpoint
+    complet sau facut pentru alta intrare (alt stamp) e ignorat: rulare noua.
+    """
+    if not os.path.exists(path):
+        return set(), 0
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("complete"):
+        return set(), 0
+    if stamp is not None and checkpoint.get("input") != stamp:
+        print(f"Checkpoint-ul {path} e pentru alta intrare ({checkpoint.get('input')}); pornim de la zero")
+        return set(), 0
+    if checkpoint["shard_size"] != shard_size:
+        raise ValueError(
+            f"Checkpoint-ul {path} a fost facut cu shard_size={checkpoint['shard_size']}; "
+            f"foloseste aceeasi valoare sau sterge checkpoint-ul"
+        )
+    return set(checkpoint["done"]), checkpoint.get("output_bytes", 0)
+
+
+def save_checkpoint(path, shard_size, done, output_bytes=0, stamp=None, complete=False):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"shard_size": shard_size, "done": sorted(done), "output_bytes": output_bytes,
+                   "input": stamp, "complete": complete}, f)
+    os.replace(tmp_path, path)
+
+# MAIN
+
+def valuate_portfolio(input_path, output_path, workers=None, shard_size=SHARD_SIZE, k=10,
+                      exclude_self=True, checkpoint_path=None):
+    """
+    Evalueaza toate anunturile din input_path si scrie rezultatele in output_path
+    (.jsonl sau director .parquet). Intoarce numarul de anunturi evaluate in rularea curenta.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint_path = checkpoint_path or output_path.rstrip("/\\") + ".checkpoint.json"
+    stamp = input_stamp(input_path)
+    done, resume_at = load_checkpoint(checkpoint_path, shard_size, stamp)
+    # JSONL se reia de la offset-ul din checkpoint (0 = de la zero); Parquet are un
+    # fisier per shard, deci doar o rulare noua sterge shard-urile vechi
+    if output_path.endswith(".parquet"):
+        sink = ParquetSink(output_path, fresh=not done)
+    else:
+        sink = JsonlSink(output_path, resume_at)
+
+    total = count_targets(input_path)
+    skipped = min(len(done) * shard_size, total)
+    processed = 0
+    start = time.perf_counter()
+    # Limitam shard-urile aflate in lucru, ca memoria sa nu creasca cu marimea intrarii
+    max_pending = 2 * workers
+
+    def report():
+        elapsed = time.perf_counter() - start
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        print(f"[{skipped + processed}/{total}] {rate:.1f} targets/s", flush=True)
+
+    def collect(finished):
+        nonlocal processed
+        for future in finished:
+            shard_id, results = future.result()
+            sink.write(shard_id, results)
+            done.add(shard_id)
+            save_checkpoint(checkpoint_path, shard_size, done, sink.position(), stamp)
+            processed += len(results)
+            report()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending = set()
+            for shard_id, targets in iter_shards(input_path, shard_size):
+                if shard_id in done:
+                    continue
+                pending.add(pool.submit(valuate_shard, shard_id, targets, k, exclude_self))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+
+            finished, _ = wait(pending)
+            collect(finished)
+        # Toate shard-urile sunt scrise: urmatoarea rulare porneste de la zero
+        save_checkpoint(checkpoint_path, shard_size, done, sink.position(), stamp, complete=True)
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Gata: {processed} anunturi evaluate in {elapsed:.1f}s "
+          f"({processed / max(elapsed, 1e-9):.1f} targets/s), {skipped} sarite din checkpoint")
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluare in masa: retrieval + pricing pentru un fisier de anunturi")
+    parser.add_argument("input", help="CSV sau JSONL cu anunturile de evaluat")
+    parser.add_argument("output", help="fisier .jsonl sau director .parquet pentru rezultate")
+    parser.add_argument("--workers", type=int, default=None, help="numar de procese (implicit: nr. de CPU)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("-k", type=int, default=10, help="numar de comparabile per anunt")
+    parser.add_argument("--keep-self", action="store_true",
+                        help="nu elimina anuntul insusi din comparabile")
+    parser.add_argument("--checkpoint", default=None, help="fisierul de checkpoint (implicit: <output>.checkpoint.json)")
+    args = parser.parse_args()
+
+    valuate_portfolio(
+        args.input, args.output,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        k=args.k,
+        exclude_self=not args.keep_self,
+        checkpoint_path=args.checkpoint,
+    )
@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import pricing_model
+import retrieval
+from market_stats import load_market_stats
+
+# SERVICIU HTTP ASYNC PENTRU EVALUARI
+#
+#   python valuation_service.py --port 8080
+#   curl -X POST localhost:8080/valuate \
+#        -d '{"query": "apartament 2 camere titan", "size_sqm": 55, "price_eur": 80000}'
+#
+#   POST /comparables  {"query": "..."} sau {"listing": {...}}, optional "k"
+#   POST /valuate      la fel, plus size_sqm / price_eur ale tintei (implicit din listing)
+#   GET  /health       starea cozii si a batch-urilor
+#   GET  /metrics      metricile in format Prometheus
+#
+# Modelul si indexul se incarca o singura data. Cererile concurente intra intr-o
+# coada marginita si sunt grupate in micro-batch-uri (cel mult max_batch cereri,
+# adunate in batch_wait_ms de la prima) care trec deodata prin encoder, cautarea
+# vectoriala, reranking si pricing (get_comparables_many + compute_fair_price_batch),
+# intr-un thread separat, ca event loop-ul sa raspunda in continuare. Cat timp un
+# batch ruleaza, urmatorul se aduna in coada, deci batch-urile cresc cu incarcarea.
+# Coada plina -> 503 imediat (backpressure); cererile care depasesc request_timeout
+# primesc 504 si sunt sarite de batch-urile urmatoare.
+# Cu statisticile de piata (market_stats) intervalul vine din dispersia celulei, iar
+# cand regasirea nu gaseste comparabile /valuate raspunde cu estimarea de baza.
+
+MAX_BATCH = 64
+BATCH_WAIT_MS = 5
+MAX_QUEUE = 1024
+REQUEST_TIMEOUT = 5.0
+# Conexiunile keep-alive inactive (sau clientii lenti) se inchid dupa READ_TIMEOUT
+READ_TIMEOUT = 30.0
+MAX_BODY_BYTES = 64 * 1024
+MAX_K = 50
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+
+class RequestError(Exception):
+    """Eroare raportata clientului cu un cod HTTP (close: inchide apoi conexiunea)."""
+
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.close = close
+
+
+def _number(value, name):
+    if value is None:
+        return math.nan
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RequestError(400, f"{name} trebuie sa fie un numar")
+    return float(value)
+
+
+def parse_request(kind, payload):
+    """Valideaza corpul unei cereri /comparables sau /valuate si il transforma intr-un job."""
+    if not isinstance(payload, dict):
+        raise RequestError(400, "Corpul cererii trebuie sa fie un obiect JSON")
+
+    listing = payload.get("listing")
+    query = payload.get("query")
+    if listing is not None:
+        if not isinstance(listing, dict):
+            raise RequestError(400, "listing trebuie sa fie un obiect JSON")
+    elif not isinstance(query, str) or not query.strip():
+        raise RequestError(400, "Lipseste query (text) sau listing (obiect)")
+
+    k = payload.get("k", 10)
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= MAX_K:
+        raise RequestError(400, f"k trebuie sa fie intre 1 si {MAX_K}")
+
+    listing = listing or {}
+    # Celula de piata: din campurile anuntului sau din filtrele extrase din text
+    cell = listing if listing else retrieval.extract_filters(query)
+    return {
+        "kind": kind,
+        "query": listing if listing else query,
+        "k": k,
+        # Un anunt din catalog se gaseste pe sine; il scoatem din comparabile
+        "exclude_id": listing.get("id"),
+        "property_type": cell.get("property_type"),
+        "neighborhood": cell.get("neighborhood"),
+        "target_sqm": _number(payload.get("size_sqm", listing.get("size_sqm")), "size_sqm"),
+        "target_price": _number(payload.get("price_eur", listing.get("price_eur")), "price_eur"),
+    }
+
+
+def process_batch(jobs, context=None, market=None):
+    """
+    Regasire (si pricing pentru /valuate) pentru un micro-batch; raspunsurile, in ordine.
+    market: MarketStats optional, pentru interval si estimarea de baza
+    """
+    # Cu exclude_id cerem o comparabila in plus, ca dupa eliminare sa ramana k
+    k_max = max(job["k"] + (job["exclude_id"] is not None) for job in jobs)
+    # Pretul anuntului evaluat nu e buget: la /valuate (si pentru anunturi) ramane soft
+    soft_filters = [
+        retrieval.VALUATION_SOFT_FILTERS if job["kind"] == "valuate" or isinstance(job["query"], dict) else ()
+        for job in jobs
+    ]
+    comparables = retrieval.get_comparables_many(
+        [job["query"] for job in jobs], k=k_max, verbose=False, context=context, soft_filters=soft_filters
+    )
+    comparables = [
+        [c for c in comps if job["exclude_id"] is None or c["id"] != job["exclude_id"]][:job["k"]]
+        for comps, job in zip(comparables, jobs)
+    ]
+    responses = [{"comparables": comps} for comps in comparables]
+
+    # Aceeasi regula ca app.py si valuate_portfolio.py (pricing_model.estimate_batch)
+    valuate = [i for i, job in enumerate(jobs) if job["kind"] == "valuate"]
+    if valuate:
+        estimations = pricing_model.estimate_batch(
+            [comparables[i] for i in valuate], market,
+            property_types=[jobs[i]["property_type"] for i in valuate],
+            neighborhoods=[jobs[i]["neighborhood"] for i in valuate],
+            target_sqm=[jobs[i]["target_sqm"] for i in valuate],
+            target_price=[jobs[i]["target_price"] for i in valuate],
+        )
+        for i, estimation in zip(valuate, estimations):
+            responses[i]["estimation"] = estimation
+    return responses
+
+
+class ValuationService:
+    """
+    context: RetrievalContext (implicit cel global, incarcat la start())
+    market: MarketStats (implicit cele din property_store, daca exista)
+    max_batch / batch_wait_ms: marimea maxima si bugetul de asteptare al unui micro-batch
+    max_queue: cereri in asteptare peste care raspundem 503
+    request_timeout: limita (secunde) pentru o cerere, din momentul in care intra in coada
+    """
+
+    def __init__(self, context=None, host="127.0.0.1", port=8080, max_batch=MAX_BATCH,
+                 batch_wait_ms=BATCH_WAIT_MS, max_queue=MAX_QUEUE, request_timeout=REQUEST_TIMEOUT,
+                 market=None):
+        self.context = context
+        self.market = market
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.stats = {"requests": 0, "rejected": 0, "timeouts": 0, "errors": 0,
+                      "batches": 0, "batched_requests": 0}
+        # Un singur thread: batch-urile ruleaza pe rand, contextul nu e folosit concurent
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="valuation")
+        self._queue = None
+        self._batcher = None
+        self._server = None
+        self._connections = {}
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.context is None:
+            self.context = await loop.run_in_executor(self._executor, retrieval.get_context)
+        if self.market is None:
+            self.market = await loop.run_in_executor(self._executor, load_market_stats)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batcher = asyncio.create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # Inchidem si conexiunile keep-alive deschise, altfel handler-ele raman in readline()
+        for writer in list(self._connections.values()):
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self._executor.shutdown(wait=False)
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def health(self):
+        batches = self.stats["batches"]
+        return {
+            "status": "ok",
+            "queue": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "mean_batch_size": self.stats["batched_requests"] / batches if batches else 0.0,
+            **self.stats,
+        }
+
+    # COADA + MICRO-BATCHING
+
+    async def submit(self, kind, payload):
+        """Pune cererea in coada si asteapta raspunsul batch-ului din care face parte."""
+        job = parse_request(kind, payload)
+        loop = asyncio.get_running_loop()
+        job["future"] = loop.create_future()
+        job["deadline"] = loop.time() + self.request_timeout
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            metrics.incr("service.rejected")
+            raise RequestError(503, "Serviciul este ocupat, reincercati")
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(job["future"]), self.request_timeout)
+        except asyncio.TimeoutError:
+            job["future"].cancel()
+            self.stats["timeouts"] += 1
+            metrics.incr("service.timeouts")
+            raise RequestError(504, "Cererea a depasit timpul maxim")
+
+    def _drain(self, jobs):
+        while len(jobs) < self.max_batch and not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            self._drain(jobs)
+            if len(jobs) < self.max_batch and self.batch_wait > 0:
+                await asyncio.sleep(self.batch_wait)
+                self._drain(jobs)
+
+            # Cererile expirate intre timp nu mai trec prin model
+            now = loop.time()
+            jobs = [job for job in jobs if not job["future"].done() and job["deadline"] > now]
+            if not jobs:
+                continue
+
+            start = time.perf_counter()
+            try:
+                responses = await loop.run_in_executor(self._executor, process_batch, jobs, self.context,
+                                                       self.market)
+            except Exception as exc:
+                for job in jobs:
+                    if not job["future"].done():
+                        job["future"].set_exception(exc)
+                continue
+            metrics.observe("service.batch", time.perf_counter() - start)
+            self.stats["batches"] += 1
+            self.stats["batched_requests"] += len(jobs)
+
+            for job, response in zip(jobs, responses):
+                if not job["future"].done():
+                    job["future"].set_result(response)
+
+    # HTTP
+
+    async def _read_request(self, reader):
+        request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        if not request_line:
+            return None
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        # Fara o lungime valida a corpului nu mai stim unde incepe cererea urmatoare
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(400, "Content-Length invalid", close=True)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"Corpul cererii depaseste {MAX_BODY_BYTES} bytes", close=True)
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+
+        parts = request_line.decode("latin-1").split()
+        method, path = (parts[0], parts[1].split("?")[0]) if len(parts) >= 2 else ("", "")
+        return method, path, headers, body
+
+    async def _route(self, method, path, body):
+        if path in ("/comparables", "/valuate"):
+            if method != "POST":
+                raise RequestError(405, "Folositi POST")
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise RequestError(400, "JSON invalid")
+            self.stats["requests"] += 1
+            metrics.incr(f"service.requests.{path[1:]}")
+            with metrics.span(f"service.request.{path[1:]}"):
+                return 200, "application/json", await self.submit(path[1:], payload)
+        if path == "/health" and method == "GET":
+            return 200, "application/json", self.health()
+        if path == "/metrics" and method == "GET":
+            return 200, "text/plain; version=0.0.4", metrics.prometheus_text()
+        raise RequestError(404, f"Ruta necunoscuta: {method} {path}")
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, content_type, result = await self._route(method, path, body)
+                except RequestError as exc:
+                    keep_alive = keep_alive and not exc.close
+                    status, content_type, result = exc.status, "application/json", {"error": exc.message}
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as exc:
+                    self.stats["errors"] += 1
+                    status, content_type, result = 500, "application/json", {"error": str(exc)}
+
+                await self._respond(writer, status, content_type, result, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, result, keep_alive):
+        if isinstance(result, str):
+            body = result.encode("utf-8")
+        else:
+            body = json.dumps(result, ensure_ascii=False, default=_json_default).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("ascii") + b"\r\n" + body)
+        await writer.drain()
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Nu se poate serializa {type(value)}")
+
+# CLIENT SINCRON (ex: app.py ca thin client)
+
+def request_json(base_url, path, payload, timeout=REQUEST_TIMEOUT + 5):
+    """POST JSON catre serviciu si intoarce raspunsul decodat (HTTPError pentru coduri != 200)."""
+    request = urllib.request.Request(
+        base_url.rstrip("/") + path,
+        data=json.dumps(payload, default=_json_default).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+async def serve(host, port, **options):
+    service = await ValuationService(host=host, port=port, **options).start()
+    print(f"Serviciul de evaluare asculta pe {service.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviciu HTTP async: /valuate si /comparables")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="limita per cerere (secunde)")
+    args = parser.parse_args()
+
+    # /metrics are sens doar cu instrumentarea pornita
+    metrics.enable()
+    asyncio.run(serve(args.host, args.port, max_batch=args.max_batch, batch_wait_ms=args.batch_wait_ms,
+                      max_queue=args.max_queue, request_timeout=args.timeout))
@@ -0,0 +1,484 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from rerank_features import build_rerank_table, save_rerank_table
+
+# INDEX VECTORIAL IN PROCES (alternativa la colectia Chroma)
+
+# Embedding-urile din vector store sunt exportate intr-o matrice float32 deja
+# normalizata, citita memory-mapped: cautarea exacta e un singur produs matriceal
+# (BLAS), fara round-trip prin Chroma si fara liste Python pentru embedding-uri.
+# Pentru cataloage mari, acelasi director poate contine si un index IVF
+# (k-means + liste inversate), care scaneaza doar cele mai apropiate nprobe liste.
+#
+# VectorIndex are aceeasi interfata ca o colectie Chroma (query / get / count),
+# inclusiv clauzele where, deci retrieval.py il poate folosi direct.
+#
+#   embeddings.bin   (n_rows, dim), randuri normalizate L2: float32 sau, cuantizat,
+#                    float16 / int8 (int8 cu o scala float32 per rand in scales.bin)
+#   ids.bin          int64, id-ul anuntului pentru fiecare rand
+#   meta_<col>.bin   metadatele: coduri int32 (text) sau float64 (numere, NaN = lipsa)
+#   ivf_*.bin        optional: centroizi, ordinea randurilor pe liste, offset-uri
+#   rerank_*.bin     optional: tabelul de features pentru reranking (rerank_features.py),
+#                    aliniat cu randurile si marcat cu acelasi build_id
+
+VECTOR_INDEX_PATH = os.path.join("vector_store", "matrix_index")
+INDEX_VERSION = 1
+EXPORT_BATCH_SIZE = 5000
+
+# Sub acest numar de randuri cautarea exacta e oricum sub o milisecunda
+IVF_MIN_ROWS = 50_000
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100_000
+
+# Cate scoruri (interogari x randuri) calculam deodata la cautarea exacta
+SCORE_BLOCK = 1 << 24
+
+# Formatele de stocare ale embedding-urilor. float16 injumatateste, int8 imparte la 4
+# memoria si discul; recall@k fata de float32 se masoara cu bench_vector_index.py --storage.
+# Matricea cuantizata se decodeaza in float32 pe bucati de DECODE_ROWS randuri.
+STORAGE_FORMATS = ("float32", "float16", "int8")
+DECODE_ROWS = 32_768
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+class VectorIndexWriter:
+    """Scrie indexul incremental, batch cu batch (ids, embedding-uri, metadate)."""
+
+    def __init__(self, path=VECTOR_INDEX_PATH, storage="float32"):
+        if storage not in STORAGE_FORMATS:
+            raise ValueError(f"Format de stocare necunoscut: {storage}")
+        self.path = path
+        self.storage = storage
+        self.tmp_path = path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+
+        self.n_rows = 0
+        self.dim = None
+        self.meta_values = {}
+
+    def _file(self, name, mode="ab"):
+        return open(os.path.join(self.tmp_path, name), mode)
+
+    def append(self, ids, embeddings, metadatas=None):
+        embeddings = _normalize(embeddings)
+        if len(embeddings) == 0:
+            return
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+
+        with self._file("embeddings.bin") as f:
+            embeddings.tofile(f)
+        with self._file("ids.bin") as f:
+            np.asarray(ids, dtype=np.int64).tofile(f)
+
+        # Metadatele se strang pe coloane; cheile noi primesc None pe randurile anterioare
+        metadatas = metadatas or [{}] * len(embeddings)
+        for key in {k for m in metadatas for k in (m or {})} - set(self.meta_values):
+            self.meta_values[key] = [None] * self.n_rows
+        for key, values in self.meta_values.items():
+            values.extend((m or {}).get(key) for m in metadatas)
+
+        self.n_rows += len(embeddings)
+
+    def close(self, ivf_lists=None, features=None):
+        """
+        ivf_lists: numarul de liste IVF (None = automat, doar peste IVF_MIN_ROWS randuri;
+        0 = fara IVF)
+        features: DataFrame indexat dupa id din care se scrie tabelul de reranking
+        """
+        build_id = uuid.uuid4().hex
+        columns = {}
+        for key, values in self.meta_values.items():
+            present = [v for v in values if v is not None]
+            if all(isinstance(v, str) for v in present):
+                categories = sorted(set(present))
+                mapping = {c: i for i, c in enumerate(categories)}
+                codes = np.array([mapping.get(v, -1) if v is not None else -1 for v in values], dtype=np.int32)
+                columns[key] = {"kind": "category", "categories": categories}
+                with self._file(f"meta_{key}.bin") as f:
+                    codes.tofile(f)
+            else:
+                is_int = all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present)
+                array = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+                columns[key] = {"kind": "int" if is_int else "float"}
+                with self._file(f"meta_{key}.bin") as f:
+                    array.tofile(f)
+
+        if ivf_lists is None:
+            ivf_lists = int(np.sqrt(self.n_rows)) if self.n_rows >= IVF_MIN_ROWS else 0
+        ivf_lists = min(ivf_lists, self.n_rows)
+        if ivf_lists > 0:
+            self._build_ivf(ivf_lists)
+        # Listele IVF se calculeaza pe float32; abia apoi cuantizam matricea
+        if self.storage != "float32" and self.n_rows:
+            self._quantize()
+
+        if features is not None:
+            ids = np.fromfile(os.path.join(self.tmp_path, "ids.bin"), dtype=np.int64) \
+                if self.n_rows else np.zeros(0, dtype=np.int64)
+            save_rerank_table(build_rerank_table(features, ids), self.tmp_path, build_id)
+
+        meta = {
+            "version": INDEX_VERSION,
+            "build_id": build_id,
+            "n_rows": self.n_rows,
+            "dim": self.dim or 0,
+            "metadata": columns,
+            "ivf_lists": ivf_lists,
+            "storage": self.storage,
+        }
+        with self._file("meta.json", "w") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+        # Inlocuim indexul vechi doar dupa ce cel nou e complet
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_path, self.path)
+
+    def _quantize(self):
+        """Rescrie embeddings.bin in formatul self.storage, pe bucati (memorie constanta)."""
+        source_path = os.path.join(self.tmp_path, "embeddings.bin")
+        float_path = os.path.join(self.tmp_path, "embeddings.f32")
+        os.replace(source_path, float_path)
+        matrix = np.memmap(float_path, dtype=np.float32, mode="r", shape=(self.n_rows, self.dim))
+
+        with self._file("embeddings.bin", "wb") as out, self._file("scales.bin", "wb") as out_scales:
+            for start in range(0, self.n_rows, DECODE_ROWS):
+                codes, scales = _quantize_rows(np.asarray(matrix[start:start + DECODE_ROWS]), self.storage)
+                codes.tofile(out)
+                if scales is not None:
+                    scales.tofile(out_scales)
+        del matrix
+        os.remove(float_path)
+        if self.storage != "int8":
+            os.remove(os.path.join(self.tmp_path, "scales.bin"))
+
+    def _build_ivf(self, n_lists, seed=0):
+        matrix = np.memmap(os.path.join(self.tmp_path, "embeddings.bin"), dtype=np.float32,
+                           mode="r", shape=(self.n_rows, self.dim))
+        rng = np.random.default_rng(seed)
+
+        # k-means sferic pe un esantion (vectorii sunt normalizati: similaritate = produs scalar)
+        sample_rows = np.sort(rng.choice(self.n_rows, size=min(KMEANS_SAMPLE, self.n_rows), replace=False))
+        sample = np.asarray(matrix[sample_rows])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        # Asignam toate randurile, pe bucati
+        assign = np.empty(self.n_rows, dtype=np.int32)
+        step = max(1, SCORE_BLOCK // n_lists)
+        for start in range(0, self.n_rows, step):
+            assign[start:start + step] = np.argmax(matrix[start:start + step] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+
+        with self._file("ivf_centroids.bin", "wb") as f:
+            centroids.astype(np.float32).tofile(f)
+        with self._file("ivf_order.bin", "wb") as f:
+            order.tofile(f)
+        with self._file("ivf_offsets.bin", "wb") as f:
+            offsets.tofile(f)
+
+
+def _quantize_rows(vectors, storage):
+    """(valori cuantizate, scale per rand sau None) pentru un bloc float32 normalizat."""
+    if storage == "float16":
+        return vectors.astype(np.float16), None
+    # int8 simetric per rand: componenta maxima (in modul) devine +/-127
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def build_vector_index(collection, path=VECTOR_INDEX_PATH, ivf_lists=None, batch_size=EXPORT_BATCH_SIZE,
+                       features=None, storage="float32"):
+    """
+    Exporta toata colectia Chroma (pe bucati, memorie limitata) intr-un VectorIndex.
+    features: tabelul de proprietati (indexat dupa id) pentru features-urile de reranking
+    storage: "float32", "float16" sau "int8" (vezi STORAGE_FORMATS)
+    """
+    writer = VectorIndexWriter(path, storage=storage)
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+        writer.append(batch["ids"], batch["embeddings"], batch["metadatas"])
+    writer.close(ivf_lists=ivf_lists, features=features)
+    return VectorIndex(path)
+
+
+class VectorIndex:
+    """
+    Index citit memory-mapped, cu interfata unei colectii Chroma.
+
+    use_ivf: None = IVF daca a fost construit, False = mereu cautare exacta
+    nprobe: cate liste IVF se scaneaza per interogare
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH, use_ivf=None, nprobe=DEFAULT_NPROBE):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != INDEX_VERSION:
+            raise ValueError(f"Versiune de index necunoscuta: {self.meta['version']}")
+
+        self.n_rows = self.meta["n_rows"]
+        self.dim = self.meta["dim"]
+        self.build_id = self.meta.get("build_id")
+        self.storage = self.meta.get("storage", "float32")
+        self.matrix = self._memmap("embeddings.bin", np.dtype(self.storage), (self.n_rows, self.dim))
+        self.scales = self._memmap("scales.bin", np.float32, (self.n_rows,)) if self.storage == "int8" else None
+        self.ids = self._memmap("ids.bin", np.int64, (self.n_rows,))
+
+        self.metadata = {}
+        for key, info in self.meta["metadata"].items():
+            dtype = np.int32 if info["kind"] == "category" else np.float64
+            self.metadata[key] = self._memmap(f"meta_{key}.bin", dtype, (self.n_rows,))
+
+        has_ivf = self.meta.get("ivf_lists", 0) > 0
+        if use_ivf and not has_ivf:
+            raise ValueError(f"Indexul din {path} nu are liste IVF (reconstruieste cu ivf_lists > 0)")
+        self.use_ivf = has_ivf if use_ivf is None else use_ivf
+        self.nprobe = nprobe
+        if has_ivf:
+            n_lists = self.meta["ivf_lists"]
+            self.centroids = np.asarray(self._memmap("ivf_centroids.bin", np.float32, (n_lists, self.dim)))
+            self.ivf_order = self._memmap("ivf_order.bin", np.int64, (self.n_rows,))
+            self.ivf_offsets = np.asarray(self._memmap("ivf_offsets.bin", np.int64, (n_lists + 1,)))
+
+    def _memmap(self, name, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=shape)
+
+    def count(self):
+        return self.n_rows
+
+    def decode(self, rows):
+        """Embedding-urile float32 pentru randurile date (index, slice sau array de pozitii)."""
+        vectors = np.asarray(self.matrix[rows])
+        if self.storage == "float32":
+            return vectors
+        vectors = vectors.astype(np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[..., None]
+        return vectors
+
+    # FILTRE (subsetul de where-clause Chroma)
+
+    def _condition_mask(self, key, condition):
+        if key not in self.metadata:
+            return np.zeros(self.n_rows, dtype=bool)
+        info = self.meta["metadata"][key]
+        column = self.metadata[key]
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        (op, value), = condition.items()
+
+        if info["kind"] == "category":
+            categories = info["categories"]
+
+            def code(v):
+                return categories.index(v) if v in categories else -2
+
+            if op == "$eq":
+                return column == code(value)
+            if op == "$ne":
+                return (column != code(value)) & (column >= 0)
+            if op in ("$in", "$nin"):
+                mask = np.isin(column, [code(v) for v in value])
+                return mask if op == "$in" else ~mask & (column >= 0)
+            raise ValueError(f"Operatorul {op} nu se aplica pe campul text {key}")
+
+        present = ~np.isnan(column)
+        if op == "$eq":
+            return column == value
+        if op == "$ne":
+            return (column != value) & present
+        if op == "$gt":
+            return column > value
+        if op == "$gte":
+            return column >= value
+        if op == "$lt":
+            return column < value
+        if op == "$lte":
+            return column <= value
+        if op == "$in":
+            return np.isin(column, value)
+        if op == "$nin":
+            return ~np.isin(column, value) & present
+        raise ValueError(f"Operator necunoscut: {op}")
+
+    def where_mask(self, where):
+        """Masca booleana a randurilor care respecta clauza where (None = toate)."""
+        if not where:
+            return None
+        if "$and" in where:
+            mask = np.ones(self.n_rows, dtype=bool)
+            for sub in where["$and"]:
+                sub_mask = self.where_mask(sub)
+                if sub_mask is not None:
+                    mask &= sub_mask
+            return mask
+        if "$or" in where:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            for sub in where["$or"]:
+                sub_mask = self.where_mask(sub)
+                mask |= True if sub_mask is None else sub_mask
+            return mask
+
+        mask = np.ones(self.n_rows, dtype=bool)
+        for key, condition in where.items():
+            mask &= self._condition_mask(key, condition)
+        return mask
+
+    # CAUTARE
+
+    def _top_n(self, scores, n):
+        # argpartition + sortare doar pentru primele n (ordine stabila la egalitate)
+        if scores.shape[-1] > n:
+            part = np.argpartition(-scores, n - 1, axis=-1)[..., :n]
+        else:
+            part = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+        part_scores = np.take_along_axis(scores, part, axis=-1)
+        order = np.lexsort((part, -part_scores), axis=-1)
+        return np.take_along_axis(part, order, axis=-1)
+
+    def _search_exact(self, queries, rows, n):
+        """Cautare exacta; rows = randurile candidate (None = toata matricea)."""
+        n_total = self.n_rows if rows is None else len(rows)
+        n = min(n, n_total)
+        if n == 0:
+            return [np.zeros(0, dtype=np.int64) for _ in queries], [np.zeros(0, dtype=np.float32) for _ in queries]
+        if self.storage != "float32":
+            return self._search_exact_decoded(queries, rows, n, n_total)
+
+        matrix = self.matrix if rows is None else self.matrix[rows]
+
+        block = max(1, SCORE_BLOCK // max(len(matrix), 1))
+        top_rows, top_scores = [], []
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ matrix.T
+            top = self._top_n(scores, n)
+            top_scores.extend(np.take_along_axis(scores, top, axis=-1))
+            top_rows.extend(top if rows is None else rows[top])
+        return top_rows, top_scores
+
+    def _search_exact_decoded(self, queries, rows, n, n_total):
+        # Matrice cuantizata: o decodam pe bucati de randuri, pastram top-n din fiecare
+        # bucata si alegem la final top-n din candidatii pastrati
+        step = max(n, min(DECODE_ROWS, SCORE_BLOCK // max(len(queries), 1)))
+        cand_rows, cand_scores = [], []
+        for start in range(0, n_total, step):
+            if rows is None:
+                part = np.arange(start, min(start + step, n_total))
+                scores = queries @ self.decode(slice(start, start + step)).T
+            else:
+                part = rows[start:start + step]
+                scores = queries @ self.decode(part).T
+            top = self._top_n(scores, min(n, scores.shape[1]))
+            cand_rows.append(part[top])
+            cand_scores.append(np.take_along_axis(scores, top, axis=-1))
+
+        cand_rows = np.concatenate(cand_rows, axis=1)
+        cand_scores = np.concatenate(cand_scores, axis=1)
+        top = self._top_n(cand_scores, n)
+        return list(np.take_along_axis(cand_rows, top, axis=-1)), list(np.take_along_axis(cand_scores, top, axis=-1))
+
+    def _search_ivf(self, queries, mask, n):
+        n_lists = len(self.centroids)
+        nprobe = min(self.nprobe, n_lists)
+        probes = self._top_n(queries @ self.centroids.T, nprobe)
+
+        top_rows, top_scores = [], []
+        for query, lists in zip(queries, probes):
+            rows = np.concatenate([self.ivf_order[self.ivf_offsets[l]:self.ivf_offsets[l + 1]] for l in lists])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) < n:
+                # Filtrul e prea selectiv pentru listele vizitate: cautare exacta pe subset
+                exact_rows = np.flatnonzero(mask) if mask is not None else None
+                r, s = self._search_exact(query[None, :], exact_rows, n)
+                top_rows.append(r[0])
+                top_scores.append(s[0])
+                continue
+            rows.sort()
+            scores = self.decode(rows) @ query
+            top = self._top_n(scores, n)
+            top_rows.append(rows[top])
+            top_scores.append(scores[top])
+        return top_rows, top_scores
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "distances"), where=None):
+        """Ca Collection.query din Chroma: rezultate per interogare, distanta = 1 - cosinus."""
+        queries = _normalize(np.atleast_2d(query_embeddings))
+        mask = self.where_mask(where)
+
+        if self.use_ivf:
+            top_rows, top_scores = self._search_ivf(queries, mask, n_results)
+        else:
+            rows = np.flatnonzero(mask) if mask is not None else None
+            top_rows, top_scores = self._search_exact(queries, rows, n_results)
+
+        results = {"ids": [self.ids[r].astype(str).tolist() for r in top_rows]}
+        if "distances" in include:
+            results["distances"] = [(1.0 - s).tolist() for s in top_scores]
+        if "embeddings" in include:
+            results["embeddings"] = [self.decode(r) for r in top_rows]
+        if "metadatas" in include:
+            results["metadatas"] = [self._metadatas(r) for r in top_rows]
+        return results
+
+    def get(self, ids=None, include=("metadatas",), limit=None, offset=None):
+        """Ca Collection.get din Chroma (fara where)."""
+        if ids is not None:
+            wanted = np.asarray(ids, dtype=np.int64)
+            rows = np.flatnonzero(np.isin(self.ids, wanted))
+        else:
+            rows = np.arange(self.n_rows)
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+
+        results = {"ids": self.ids[rows].astype(str).tolist()}
+        if "embeddings" in include:
+            results["embeddings"] = self.decode(rows)
+        if "metadatas" in include:
+            results["metadatas"] = self._metadatas(rows)
+        return results
+
+    def _metadatas(self, rows):
+        out = [{} for _ in rows]
+        for key, info in self.meta["metadata"].items():
+            values = np.asarray(self.metadata[key][rows])
+            if info["kind"] == "category":
+                categories = info["categories"]
+                for m, code in zip(out, values.tolist()):
+                    if code >= 0:
+                        m[key] = categories[code]
+            else:
+                cast = int if info["kind"] == "int" else float
+                for m, value in zip(out, values.tolist()):
+                    if value == value:
+                        m[key] = cast(value)
+        return out